@@ -0,0 +1,315 @@
+'''
+Benchmarks for the analysis, the transformers, the file inputs and the outputs, without a device
+
+    eegbench --output results.json
+    eegbench --baseline results.json --tolerance 0.25
+
+every stage is driven with synthetic frames as fast as it takes them, the
+outputs write to local sinks ( a temp file, an OSC server and an http stub on
+the loopback interface ).  Results are stored as json, and compared against a
+baseline the run exits with 1 when anything got slower than the tolerance allows.
+'''
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from statistics import median
+
+import numpy as np
+
+from eegstreamer.data import EEGFrame, deliver
+from eegstreamer.eeg_analysis import EEGAnalyzer, analyzeEEG
+from eegstreamer.inputs import BinaryFileInputStreamer, CSVFileInputStreamer, JSONFileInputStreamer
+from eegstreamer.offline import Recording, analyze_recording
+from eegstreamer.outputs import BinaryFileOutputStreamer, CSVFileOutputStreamer, HttpPostEEGOutputStreamer, \
+    JSONFileOutputStreamer, OscOutputStreamer
+from eegstreamer.transforms import ConstantFactorEEGTransformer, DownSampleEEGTransformer, \
+    PowerCoherenceEEGTransformer, StreamingFilterTransformer
+
+SAMPLE_RATE = 256
+MUSE_CHANNELS = ("TP9", "AF7", "AF8", "TP10")
+
+LOWER = 'lower'
+HIGHER = 'higher'
+
+
+def _result(value: float, unit: str, better: str) -> dict:
+    return {'value': value, 'unit': unit, 'better': better}
+
+
+def _frames(seconds: float, block_size: int, channels=MUSE_CHANNELS):
+    samples = np.random.rand(int(seconds * SAMPLE_RATE), len(channels)) * 1000 + 200
+    timestamps = time.time_ns() + (np.arange(samples.shape[0]) * 1e9 / SAMPLE_RATE).astype(np.int64)
+    return [EEGFrame(samples[i:i + block_size], channels, timestamps[i:i + block_size], SAMPLE_RATE)
+            for i in range(0, samples.shape[0], block_size)]
+
+
+class NullOutputStreamer:
+
+    accepts_frames = True
+
+    async def receive(self, data) -> None:
+        pass
+
+    def close(self):
+        pass
+
+
+def _time_call(function, *args, repeats: int = 5) -> float:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+    return median(times)
+
+
+def benchmark_analysis(quick: bool = False) -> dict:
+    results = {}
+    windows = (2, 5) if quick else (1, 2, 5, 10)
+    channel_counts = (4,) if quick else (4, 8, 32)
+    repeats = 3 if quick else 7
+    for window in windows:
+        for channel_count in channel_counts:
+            data = np.random.rand(window * SAMPLE_RATE, channel_count) * 1000
+            channels = MUSE_CHANNELS if channel_count == 4 else tuple(f"channel{i}" for i in range(channel_count))
+            analyzer = EEGAnalyzer(SAMPLE_RATE, window, channels)
+            key = f"{window}s x {channel_count}ch"
+            results[f"analysis/analyzeEEG {key}"] = _result(
+                _time_call(analyzeEEG, data, 'muse', SAMPLE_RATE, channels, repeats=repeats) * 1e3, 'ms/call', LOWER)
+            results[f"analysis/EEGAnalyzer {key}"] = _result(
+                _time_call(analyzer.analyze, data, repeats=repeats) * 1e3, 'ms/call', LOWER)
+            # band power and coherence of every pair of channels
+            results[f"analysis/connectivity {key}"] = _result(
+                _time_call(analyzer.connectivity, data, repeats=repeats) * 1e3, 'ms/call', LOWER)
+
+    # every window of a recording a hop apart, as PowerCoherenceEEGTransformer would analyze them
+    minutes = 2 if quick else 10
+    samples = np.random.rand(minutes * 60 * SAMPLE_RATE, len(MUSE_CHANNELS)) * 1000
+    recording = Recording(np.arange(samples.shape[0], dtype=np.int64), samples, MUSE_CHANNELS, SAMPLE_RATE)
+    results[f"analysis/offline {minutes} min recording"] = _result(
+        _time_call(analyze_recording, recording, repeats=3), 's/recording', LOWER)
+    return results
+
+
+async def _drive(stage, frames) -> float:
+    start = time.perf_counter()
+    for frame in frames:
+        await deliver(stage, frame)
+    if hasattr(stage, 'join'):
+        await stage.join()
+    return time.perf_counter() - start
+
+
+async def benchmark_transforms(quick: bool = False) -> dict:
+    transformers = {
+        'ConstantFactor': lambda: ConstantFactorEEGTransformer(factor=2),
+        'StreamingFilter': lambda: StreamingFilterTransformer(SAMPLE_RATE, bandpass=(1, 40), notch=60),
+        'DownSample': lambda: DownSampleEEGTransformer(),
+        'DownSample to 32Hz': lambda: DownSampleEEGTransformer(sample_rate=32),
+        'PowerCoherence': lambda: PowerCoherenceEEGTransformer(SAMPLE_RATE),
+        'PowerCoherence streaming filter': lambda: PowerCoherenceEEGTransformer(SAMPLE_RATE, streaming_filter=True),
+        'PowerCoherence incremental': lambda: PowerCoherenceEEGTransformer(SAMPLE_RATE, incremental=True),
+    }
+    seconds = 10 if quick else 60
+    results = {}
+    for block_size in (1, 12, 256):
+        frames = _frames(seconds, block_size)
+        sample_count = sum(len(frame) for frame in frames)
+        for name, create in transformers.items():
+            transformer = create()
+            transformer.connect(NullOutputStreamer())
+            # the first block allocates buffers and settles filters, leave it out
+            await deliver(transformer, frames[0])
+            elapsed = await _drive(transformer, frames[1:])
+            results[f"transforms/{name} block {block_size}"] = _result(
+                elapsed / (sample_count - len(frames[0])) * 1e6, 'us/sample', LOWER)
+    return results
+
+
+class _DatagramCounter(asyncio.DatagramProtocol):
+
+    def __init__(self):
+        self.datagrams = 0
+
+    def datagram_received(self, data, address):
+        self.datagrams += 1
+
+
+async def _http_stub(port: int):
+    from aiohttp import web
+
+    async def ingest(request):
+        await request.read()
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post('/samples', ingest)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    return runner
+
+
+async def benchmark_outputs(quick: bool = False, osc_port: int = 47310, http_port: int = 47311) -> dict:
+    loop = asyncio.get_running_loop()
+    osc_server, _ = await loop.create_datagram_endpoint(_DatagramCounter, local_addr=('127.0.0.1', osc_port))
+    http_server = await _http_stub(http_port)
+    directory = tempfile.mkdtemp(prefix='eegbench')
+
+    outputs = {
+        'JSONFile': lambda: JSONFileOutputStreamer(os.path.join(directory, 'bench.json')),
+        'CSVFile': lambda: CSVFileOutputStreamer(os.path.join(directory, 'bench.csv')),
+        'BinaryFile': lambda: BinaryFileOutputStreamer(os.path.join(directory, 'bench.eegb')),
+        'Osc': lambda: OscOutputStreamer(port=osc_port),
+        'Osc bundle': lambda: OscOutputStreamer(port=osc_port, bundle=True),
+        'HttpPost': lambda: HttpPostEEGOutputStreamer(f"http://127.0.0.1:{http_port}/samples"),
+    }
+    seconds = 10 if quick else 60
+    results = {}
+    try:
+        for block_size in (12, 256):
+            frames = _frames(seconds, block_size)
+            sample_count = sum(len(frame) for frame in frames)
+            for name, create in outputs.items():
+                output = create()
+                start = time.perf_counter()
+                for frame in frames:
+                    await deliver(output, frame)
+                    # as a paced input would, give the loop a turn between blocks
+                    await asyncio.sleep(0)
+                # sustained means written out, close waits for anything still buffered
+                await output.close()
+                elapsed = time.perf_counter() - start
+                for filename in os.listdir(directory):
+                    os.remove(os.path.join(directory, filename))
+                results[f"outputs/{name} block {block_size}"] = _result(sample_count / elapsed, 'samples/s', HIGHER)
+    finally:
+        osc_server.close()
+        await http_server.cleanup()
+        os.rmdir(directory)
+    return results
+
+
+async def benchmark_inputs(quick: bool = False) -> dict:
+    '''
+    replays recordings written by the file outputs as fast as they can be read
+    '''
+    directory = tempfile.mkdtemp(prefix='eegbench')
+    formats = {
+        'JSONFile': (JSONFileOutputStreamer, JSONFileInputStreamer, 'bench.json'),
+        'CSVFile': (CSVFileOutputStreamer, CSVFileInputStreamer, 'bench.csv'),
+        'BinaryFile': (BinaryFileOutputStreamer, BinaryFileInputStreamer, 'bench.eegb'),
+    }
+    frames = _frames(60 if quick else 600, 4096)
+    sample_count = sum(len(frame) for frame in frames)
+    results = {}
+    try:
+        for name, (output_type, input_type, filename) in formats.items():
+            filename = os.path.join(directory, filename)
+            output = output_type(filename)
+            for frame in frames:
+                await deliver(output, frame)
+            await output.close()
+
+            replay = input_type(filename, speed=None)
+            replay.connect(NullOutputStreamer())
+            start = time.perf_counter()
+            await replay.start()
+            elapsed = time.perf_counter() - start
+            await replay.close()
+            os.remove(filename)
+            results[f"inputs/{name} replay"] = _result(sample_count / elapsed, 'samples/s', HIGHER)
+    finally:
+        os.rmdir(directory)
+    return results
+
+
+async def run_benchmarks(suites=('analysis', 'transforms', 'inputs', 'outputs'), quick: bool = False) -> dict:
+    results = {}
+    if 'analysis' in suites:
+        results.update(benchmark_analysis(quick))
+    if 'transforms' in suites:
+        results.update(await benchmark_transforms(quick))
+    if 'inputs' in suites:
+        results.update(await benchmark_inputs(quick))
+    if 'outputs' in suites:
+        results.update(await benchmark_outputs(quick))
+    return {
+        'meta': {
+            'time': time.time(),
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'quick': quick,
+        },
+        'results': results,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.25) -> list:
+    '''
+    ( name, baseline value, value, relative change ) of every benchmark that
+    got worse than the baseline by more than `tolerance`
+    '''
+    regressions = []
+    for name, result in results['results'].items():
+        reference = baseline['results'].get(name)
+        if not reference or not reference['value']:
+            continue
+        change = (result['value'] - reference['value']) / reference['value']
+        worse = change > tolerance if result['better'] == LOWER else change < -tolerance
+        if worse:
+            regressions.append((name, reference['value'], result['value'], change))
+    return regressions
+
+
+def print_results(results: dict, baseline: dict = None) -> None:
+    for name, result in results['results'].items():
+        line = f"{name:<56} {result['value']:>14.3f} {result['unit']}"
+        reference = baseline['results'].get(name) if baseline else None
+        if reference and reference['value']:
+            line += f"  ({(result['value'] - reference['value']) / reference['value']:+.1%})"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='benchmark the analysis, transformers, file inputs and outputs with synthetic data',
+    )
+    parser.add_argument('-o', '--output', type=str, help="file to store the results in, as json")
+    parser.add_argument('-b', '--baseline', type=str, help="results to compare against")
+    parser.add_argument('-t', '--tolerance', type=float, default=0.25,
+                        help="relative slow down that counts as a regression (default: 0.25)")
+    parser.add_argument('-s', '--suite', action='append', choices=('analysis', 'transforms', 'inputs', 'outputs'),
+                        help="only run this suite, can be given more than once")
+    parser.add_argument('-q', '--quick', action='store_true', help="fewer sizes and shorter runs")
+
+    args = parser.parse_args()
+
+    results = asyncio.run(run_benchmarks(args.suite or ('analysis', 'transforms', 'inputs', 'outputs'), args.quick))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        for name, before, after, change in regressions:
+            print(f"regression: {name} {before:.3f} -> {after:.3f} ({change:+.1%})")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+from eegstreamer.graph import Graph, GraphConfigError, load_config
+from eegstreamer.supervisor import Supervisor, format_health
+
+
+def run(args) -> None:
+    try:
+        graph = Graph.load(args.graph)
+    except GraphConfigError as e:
+        print(f"{args.graph}: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    print(graph.describe())
+    if args.check:
+        return
+
+    try:
+        asyncio.run(graph.run(args.duration))
+    except KeyboardInterrupt:
+        pass
+
+
+def supervise(args) -> None:
+    try:
+        supervisor = Supervisor.from_config(load_config(args.config))
+    except GraphConfigError as e:
+        print(f"{args.config}: {e}", file=sys.stderr)
+        sys.exit(2)
+    if args.workers:
+        supervisor.workers = min(args.workers, len(supervisor.devices))
+
+    print(supervisor.describe())
+    if args.check:
+        return
+
+    health = supervisor.run(args.duration, on_report=lambda report: print(format_health(report)))
+    print()
+    for report in health.values():
+        print(format_health(report))
+
+
+def analyze(args) -> None:
+    # the analysis, pandas and scipy are only imported for offline analysis
+    from eegstreamer.offline import analyze_recording, read_recording, write_features
+
+    output = args.output or os.path.splitext(args.recording)[0] + '.features.csv'
+    start = time.perf_counter()
+    try:
+        recording = read_recording(args.recording, args.sample_rate, args.format, args.timestamp_unit)
+        table = analyze_recording(recording, hop=args.hop, streaming_filter=args.streaming_filter)
+        write_features(table, output)
+    except (OSError, ValueError, ImportError) as e:
+        print(f"{args.recording}: {e}", file=sys.stderr)
+        sys.exit(2)
+    print(f"{len(table)} windows of {args.recording} analyzed in {time.perf_counter() - start:.2f} s, "
+          f"written to {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='eegstreamer',
+        description='run eeg pipelines',
+    )
+    parser.add_argument('-v', '--verbose', action='store_true', help="log what the stages are doing")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="run the pipeline described in a json or yaml graph file")
+    run_parser.add_argument('graph', type=str, help="graph description, .json, .yaml or .yml")
+    run_parser.add_argument('-d', '--duration', type=float,
+                            help="seconds to stream for, 0 for as long as the inputs run (default: from the graph)")
+    run_parser.add_argument('-c', '--check', action='store_true',
+                            help="only check the graph and print the resolved topology")
+    run_parser.set_defaults(handler=run)
+
+    supervise_parser = commands.add_parser('supervise', help="run a pipeline for every one of many devices, "
+                                                              "spread over worker processes")
+    supervise_parser.add_argument('config', type=str, help="devices and pipeline, .json, .yaml or .yml")
+    supervise_parser.add_argument('-w', '--workers', type=int, help="worker processes (default: from the config)")
+    supervise_parser.add_argument('-d', '--duration', type=float,
+                                  help="seconds to stream for, 0 for as long as the devices stream "
+                                       "(default: from the config)")
+    supervise_parser.add_argument('-c', '--check', action='store_true',
+                                  help="only check the config and print how devices are sharded")
+    supervise_parser.set_defaults(handler=supervise)
+
+    analyze_parser = commands.add_parser('analyze', help="work out the PowerCoherence features of every window "
+                                                          "of a recording, without replaying it")
+    analyze_parser.add_argument('recording', type=str, help="json lines, csv or binary (.eegb) recording")
+    analyze_parser.add_argument('-o', '--output', type=str,
+                                help="feature table, .csv or .parquet (default: the recording's name .features.csv)")
+    analyze_parser.add_argument('--hop', type=float, default=0.25, help="seconds between windows (default: 0.25)")
+    analyze_parser.add_argument('--sample-rate', type=float, default=256,
+                                help="of json and csv recordings, binary ones carry their own (default: 256)")
+    analyze_parser.add_argument('--format', choices=['json', 'csv', 'binary'],
+                                help="of the recording (default: from its extension)")
+    analyze_parser.add_argument('--timestamp-unit', choices=['s', 'ms', 'us', 'ns'],
+                                help="of json and csv recordings' timestamps (default: from their magnitude)")
+    analyze_parser.add_argument('--streaming-filter', action='store_true',
+                                help="filter the whole recording once, instead of detrending and filtering every "
+                                     "window on its own")
+    analyze_parser.set_defaults(handler=analyze)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,3 +9,6 @@ class DeviceConnectionFailure(Exception):
 
 class DataStreamInterrupted(Exception):
     pass
+
+class HttpPostFailure(Exception):
+    pass
@@ -11,9 +11,6 @@ from eegstreamer.outputs import ScreenEEGOutputStreamer, CSVFileOutputStreamer,
 from eegstreamer.transforms import PowerCoherenceEEGTransformer, DownSampleEEGTransformer
 import asyncio
 from colorama import Fore
-from muselsl import list_muses
-
-event_loop = asyncio.get_event_loop()
 
 
 
@@ -77,7 +74,7 @@ async def muse_streamer(sample_rate=None, mac_address=None, name=None, interface
         upstreams.append(terminal_stream)
 
     # create the input stream
-    input_stream = MuseInputStreamer(mac_address, name, interface, event_loop=event_loop)
+    input_stream = MuseInputStreamer(mac_address, name, interface, event_loop=asyncio.get_running_loop())
 
     # tell the input stream where to send its data
     for stream in upstreams:
@@ -111,6 +108,9 @@ def find_interface():
 
 
 def find_device(interface):
+    # muselsl takes a while to import, only searching for a device needs it here
+    from muselsl import list_muses
+
     muses = list_muses(backend='bgapi', interface=interface)
     return muses
 
@@ -157,6 +157,8 @@ def main():
         if not args.address or not args.device_name or not args.interface:
             print("`--address`, `--device-name` and `--interface` must be specified")
             return
+    event_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(event_loop)
     try:
         event_loop.run_until_complete(
             muse_streamer(args.sample_rate,
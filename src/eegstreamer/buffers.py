@@ -0,0 +1,83 @@
+import numpy as np
+
+
+class RingBuffer:
+    '''
+    Fixed size, multi-channel circular buffer of samples
+
+    Every sample is written twice, once at its slot and once `capacity` rows
+    further on, so the most recent `capacity` samples are always laid out
+    contiguously in memory and `view()` never has to copy or re-assemble
+    the window.
+
+        push( block )   O(1) per sample, no allocation
+        view( n )       zero-copy (n x channels) view of the n most recent samples
+    '''
+
+    def __init__(self, capacity: int, channels: int, dtype=np.float64, fill=None):
+        '''
+        Parameters
+        ----------
+            capacity : int
+                number of samples held before the oldest are overwritten
+            channels : int
+                number of columns per sample
+            fill : array-like
+                optional initial (capacity x channels) contents, treated as already pushed
+        '''
+        self.capacity = int(capacity)
+        self.channels = int(channels)
+        self._data = np.zeros((2 * self.capacity, self.channels), dtype=dtype)
+        self._position = 0
+        self.size = 0
+        self.count = 0
+
+        if fill is not None:
+            self.push(np.broadcast_to(fill, (self.capacity, self.channels)))
+
+    def __len__(self):
+        return self.size
+
+    def push(self, block) -> None:
+        '''
+        appends a single sample (channels, ) or a block (n x channels)
+        '''
+        block = np.asarray(block)
+        if block.ndim == 1:
+            block = block.reshape(1, -1)
+        n = block.shape[0]
+        self.count += n
+        if n >= self.capacity:
+            block = block[-self.capacity:]
+            n = self.capacity
+
+        start = self._position
+        first = min(n, self.capacity - start)
+        self._write(start, block[:first])
+        if first < n:
+            self._write(0, block[first:])
+
+        self._position = (start + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    def _write(self, start, block):
+        stop = start + block.shape[0]
+        self._data[start:stop] = block
+        self._data[start + self.capacity:stop + self.capacity] = block
+
+    def view(self, n: int = None) -> np.ndarray:
+        '''
+        returns the `n` most recent samples, oldest first, without copying
+
+        the view is only valid until the next `push`, copy it if it has to outlive that
+        '''
+        if n is None:
+            n = self.size
+        if n > self.size:
+            raise ValueError(f"only {self.size} samples buffered, {n} requested")
+        end = self._position + self.capacity
+        return self._data[end - n:end]
+
+    def clear(self) -> None:
+        self._position = 0
+        self.size = 0
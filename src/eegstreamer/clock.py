@@ -0,0 +1,106 @@
+'''
+Mapping device timestamps onto the host clock
+
+A device stamps samples with its own clock ( or, like muselsl, with a clock
+estimated from the first packets ) while the pipeline measures latency against
+the host's.  The two drift apart by tens of parts per million, and the time a
+block arrives over bluetooth jitters by tens of milliseconds, so neither the
+device timestamps nor the arrival times can be used as they are.
+
+`ClockCorrector` maps device time onto host time = offset + rate * device time.
+The rate comes from an exponentially weighted least squares fit of arrival time
+on device time, forgetting observations with a half life of `half_life` seconds
+of device time so it follows slow drift, and is pulled towards 1 by
+`prior_weight` until enough data has come in to estimate it.  Transport only
+ever delays a block, so the offset is fitted to the lower envelope of the
+arrival times instead of their mean: the smallest host - rate * device time
+of the last `window` seconds, the block that got through fastest.  Corrected
+timestamps then follow the time samples were taken, plus only the smallest
+transport delay, and not the time they were delivered.
+
+    corrector = ClockCorrector()
+    corrector.update(device_timestamps[-1], arrival_time)
+    timestamps = corrector(device_timestamps)
+'''
+from collections import deque
+
+import numpy as np
+
+
+class ClockCorrector:
+
+    def __init__(self, half_life: float = 60.0, prior_weight: float = 1.0, window: float = 10.0):
+        '''
+        Parameters
+        ----------
+            half_life : float
+                seconds of device time after which an observation counts half as much
+            prior_weight : float
+                weight, in seconds squared of device time, of the prior that both clocks run at the same rate
+            window : float
+                seconds of device time over which the fastest delivery sets the offset
+        '''
+        self.half_life = half_life
+        self.prior_weight = prior_weight
+        self.window = window
+        # both clocks are kept relative to their first observation, so the sums stay well conditioned
+        self.device_origin = None
+        self.host_origin = None
+        self.last_device_time = None
+        self.observations = 0
+        self._weight = 0.0
+        self._x = 0.0
+        self._y = 0.0
+        self._xx = 0.0
+        self._xy = 0.0
+        # ( device, host ) times of the observations in the window
+        self._recent = deque()
+        self.offset = 0.0
+        self.rate = 1.0
+
+    def update(self, device_time: float, host_time: float) -> None:
+        '''
+        adds one observation, the device time of a sample and the host time it arrived at, both in seconds
+        '''
+        if self.device_origin is None:
+            self.device_origin = device_time
+            self.host_origin = host_time
+            self.last_device_time = device_time
+        x = device_time - self.device_origin
+        y = host_time - self.host_origin
+
+        decay = 0.5 ** (max(device_time - self.last_device_time, 0.0) / self.half_life)
+        self.last_device_time = device_time
+        self._weight = self._weight * decay + 1.0
+        self._x = self._x * decay + x
+        self._y = self._y * decay + y
+        self._xx = self._xx * decay + x * x
+        self._xy = self._xy * decay + x * y
+        self.observations += 1
+
+        mean_x = self._x / self._weight
+        mean_y = self._y / self._weight
+        variance = self._xx - self._weight * mean_x * mean_x
+        covariance = self._xy - self._weight * mean_x * mean_y
+        self.rate = (covariance + self.prior_weight) / (variance + self.prior_weight)
+
+        self._recent.append((x, y))
+        while x - self._recent[0][0] > self.window:
+            self._recent.popleft()
+        self.offset = min(recent_y - self.rate * recent_x for recent_x, recent_y in self._recent)
+
+    @property
+    def drift(self) -> float:
+        '''
+        how much faster the host clock runs than the device's, in parts per million
+        '''
+        return (self.rate - 1.0) * 1e6
+
+    def __call__(self, device_times):
+        '''
+        host times, in seconds, of `device_times`, unchanged until there has been an observation
+        '''
+        device_times = np.asarray(device_times, dtype=np.float64)
+        if self.device_origin is None:
+            return device_times
+        return self.host_origin + self.offset + self.rate * (device_times - self.device_origin)
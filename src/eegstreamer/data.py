@@ -2,14 +2,17 @@ import json
 import time
 from math import floor
 
+import numpy as np
 from numpy import ndarray
 
+from eegstreamer import metrics
+
 
 class EEGData(dict):
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, timestamp: int = None, **kwargs):
         super().__init__(*args, **kwargs)
-        self._timestamp = time.time_ns()
+        self._timestamp = time.time_ns() if timestamp is None else int(timestamp)
 
     # return timestamp in milliseconds
     @property
@@ -32,3 +35,167 @@ class EEGData(dict):
             'timestamp': self.timestamp,
             'data': serialized
         })
+
+
+class EEGFrame:
+    '''
+    A block of consecutive samples stored column-wise, so that a stage can
+    handle a whole block with a single call instead of one `EEGData` per sample
+
+        samples    : (n_samples x n_channels) array of values
+        timestamps : (n_samples, ) int64 array in nanoseconds
+        channels   : channel names, one per column
+    '''
+
+    __slots__ = ('samples', 'timestamps', 'channels', 'sample_rate')
+
+    def __init__(self, samples, channels, timestamps=None, sample_rate: float = None):
+        samples = np.asarray(samples, dtype=np.float64)
+        if samples.ndim == 1:
+            samples = samples.reshape(1, -1)
+        self.samples = samples
+        self.channels = tuple(channels)
+        self.sample_rate = sample_rate
+
+        if len(self.channels) != samples.shape[1]:
+            raise ValueError(f"{len(self.channels)} channel names given for {samples.shape[1]} columns")
+
+        if timestamps is None:
+            # without device timestamps, the newest sample is stamped now and
+            # the rest are spaced back by the sample period (when it is known)
+            timestamps = np.full(samples.shape[0], time.time_ns(), dtype=np.int64)
+            if sample_rate:
+                period = 1e9 / sample_rate
+                timestamps -= (np.arange(samples.shape[0])[::-1] * period).astype(np.int64)
+        self.timestamps = np.asarray(timestamps, dtype=np.int64)
+
+    def __len__(self):
+        return self.samples.shape[0]
+
+    def __getitem__(self, key):
+        if key == 'packet':
+            return self.samples
+        return self.samples[:, self.channels.index(key)]
+
+    # timestamp of the first sample in milliseconds
+    @property
+    def timestamp(self):
+        return floor(self.timestamps[0]/1e6)
+
+    def __str__(self):
+        return "EEGFrame({} x {}) @ {}".format(len(self), len(self.channels), self.timestamp)
+
+    def to_samples(self):
+        '''
+        yields one `EEGData` per row, for stages that only understand single samples
+        '''
+        channels = self.channels
+        for row, timestamp in zip(self.samples, self.timestamps.tolist()):
+            data = dict(zip(channels, row))
+            data['packet'] = row
+            yield EEGData(data, timestamp=timestamp)
+
+    @classmethod
+    def from_sample(cls, data: EEGData, sample_rate: float = None):
+        packet = np.asarray(data['packet'], dtype=np.float64)
+        channels = [k for k in data.keys() if k != 'packet']
+        if len(channels) != packet.shape[-1]:
+            channels = [f"channel{i}" for i in range(packet.shape[-1])]
+        timestamp = getattr(data, '_timestamp', None)
+        return cls(packet, channels, None if timestamp is None else [timestamp], sample_rate)
+
+    @classmethod
+    def concatenate(cls, frames):
+        frames = list(frames)
+        if len(frames) == 1:
+            return frames[0]
+        return cls(np.concatenate([f.samples for f in frames]),
+                   frames[0].channels,
+                   np.concatenate([f.timestamps for f in frames]),
+                   frames[0].sample_rate)
+
+    @classmethod
+    def of(cls, data, sample_rate: float = None):
+        '''
+        returns `data` as a frame, wrapping a single `EEGData` sample if needed
+        '''
+        if isinstance(data, EEGFrame):
+            return data
+        return cls.from_sample(data, sample_rate)
+
+
+# nanoseconds in each unit timestamps can be given in
+TIMESTAMP_UNITS = {'s': 1_000_000_000, 'ms': 1_000_000, 'us': 1_000, 'ns': 1}
+
+
+def guess_timestamp_unit(timestamps) -> str:
+    '''
+    the unit of epoch timestamps, told apart by their magnitude, which only works for
+    times since 1970: relative ones ( ie. milliseconds since a recording started ) look
+    like epoch seconds
+    '''
+    timestamps = np.asarray(timestamps)
+    magnitude = np.abs(timestamps).max() if timestamps.size else 0
+    for limit, unit in ((1e11, 's'), (1e14, 'ms'), (1e17, 'us')):
+        if magnitude < limit:
+            return unit
+    return 'ns'
+
+
+def to_nanoseconds(timestamps, unit: str = None) -> np.ndarray:
+    '''
+    converts timestamps in `unit` ( 's', 'ms', 'us' or 'ns' ) to nanoseconds, guessing the
+    unit of epoch timestamps from their magnitude when it isn't given
+    '''
+    timestamps = np.asarray(timestamps)
+    if unit is None:
+        unit = guess_timestamp_unit(timestamps)
+    elif unit not in TIMESTAMP_UNITS:
+        raise ValueError(f"unknown timestamp unit '{unit}', expected one of {tuple(TIMESTAMP_UNITS)}")
+    if unit == 'ns':
+        return timestamps.astype(np.int64)
+    return (timestamps * TIMESTAMP_UNITS[unit]).astype(np.int64)
+
+
+def iter_samples(data):
+    '''
+    yields single-sample `EEGData` from either an `EEGData` or an `EEGFrame`
+    '''
+    if isinstance(data, EEGFrame):
+        yield from data.to_samples()
+    else:
+        yield data
+
+
+async def deliver(stage, data) -> None:
+    '''
+    hands `data` to a downstream stage
+
+    stages that declare `accepts_frames` get frames as they are,
+    anything else gets the frame split into single `EEGData` samples
+    '''
+    if not metrics.registry.enabled:
+        await _deliver(stage, data)
+        return
+
+    stage_metrics = metrics.stage_metrics(stage)
+    is_frame = isinstance(data, EEGFrame)
+    stage_metrics.samples_in.mark(len(data) if is_frame else 1)
+    downstream = stage_metrics.downstream
+    start = time.perf_counter()
+    await _deliver(stage, data)
+    elapsed = time.perf_counter() - start - (stage_metrics.downstream - downstream)
+    stage_metrics.processing.record(max(elapsed, 0.0))
+
+    if not hasattr(stage, 'send'):
+        # an output, the end of the line for this data
+        newest = int(data.timestamps[-1]) if is_frame else data._timestamp
+        stage_metrics.latency.record(max(time.time_ns() - newest, 0) / 1e9)
+
+
+async def _deliver(stage, data) -> None:
+    if isinstance(data, EEGFrame) and not getattr(stage, 'accepts_frames', False):
+        for sample in data.to_samples():
+            await stage.receive(sample)
+    else:
+        await stage.receive(data)
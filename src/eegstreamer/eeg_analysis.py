@@ -1,7 +1,6 @@
 import os, csv, json
 from logging import getLogger
 
-import pandas as pd
 import numpy as np
 # import mne, sklearn
 # not needed yet
@@ -12,7 +11,7 @@ from scipy import signal
 from scipy.signal import butter, sosfilt
 from scipy.integrate import simps
 from pprint import pprint as pp
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
 
 logger = getLogger(__name__)
 
@@ -139,7 +138,7 @@ def bandpower_complex( data , sample_rate=256 , band=[0,40] , window_sec=None ,
     return bp
 
 
-def analyzeEEG( data=np.random.rand(2560,5)*1000 , device='muse', sample_rate = 256):
+def analyzeEEG( data=np.random.rand(2560,5)*1000 , device='muse', sample_rate = 256, electrodes=None):
     '''
     Parameters
     -----------
@@ -147,11 +146,14 @@ def analyzeEEG( data=np.random.rand(2560,5)*1000 , device='muse', sample_rate =
         the data packet of incoming raw EEG.  
         If it's not defined, then throw out a random chunk of 'voltages'
     device
-        which EEG device is being used.  
-        This will have implications for how the analyses get run, but for now, assume Muse 2
+        which EEG device is being used, picks the electrode layout when `electrodes` isn't given.
+        Devices without a known layout use every column of the data
     sample_rate
         the sampling rate in Hz of the device being used.  
         256Hz is the standard
+    electrodes
+        names of the data columns, in order.  Frontal coherence is computed between
+        AF7 and AF8 when the layout has them, otherwise between the first two columns
     
     analyzeEEG runs the core analyses on the incoming data.
     It outputs a dictionary with all the various PSD, coherences, and a few ratios for the time chunk
@@ -159,21 +161,23 @@ def analyzeEEG( data=np.random.rand(2560,5)*1000 , device='muse', sample_rate =
     Once we have a good training dataset for meditation states,
     we can incorporate a classification step in here based on a trained model (done elsewhere) with model.fit()
     '''
-    if device=='muse':
-        electrodes = ["TP9",  "AF7", "AF8" , "TP10"]
+    if electrodes is None:
+        electrodes = DEVICE_ELECTRODES.get( device ) or [ f"channel{i}" for i in range( data.shape[1] ) ]
+    electrodes  = list( electrodes )
+    left, right = default_frontal_pair( electrodes )
     
     # first detrend the data
     window_len  = data.shape[0] / sample_rate
-    detrended   = scipy.signal.detrend( data )
+    detrended   = scipy.signal.detrend( data , axis=0 )
     
     # now filter the data from .1 - 40 Hz using a butterworth bandpass filter 
     low         = 1  / ( sample_rate / 2 )
     high        = 40 / ( sample_rate / 2 )
     order       = 12      # 12dB / octave
     sos         = butter(order, [low, high], btype='bandpass', output='sos')
-    filtered    = sosfilt(sos, detrended)
+    filtered    = sosfilt(sos, detrended, axis=0)
     # now calculate frontal coherence for the relevant frequencies (i.e. 0.1 - 40 Hz)
-    f, frontal_coherence    = scipy.signal.coherence(filtered[:,1], filtered[:,2], fs=sample_rate, nperseg=sample_rate*1, window='hann', detrend=False)    
+    f, frontal_coherence    = scipy.signal.coherence(filtered[:,left], filtered[:,right], fs=sample_rate, nperseg=sample_rate*1, window='hann', detrend=False)    
     # now calculate average coherence for each f
     # calculate average frontal coherence for each frequency band relative to all coherence values 
     eeg_bands = {'Delta': (1, 4),
@@ -211,10 +215,10 @@ def analyzeEEG( data=np.random.rand(2560,5)*1000 , device='muse', sample_rate =
     for band in eeg_bands:
         total_power[band] = 0
     
-    # 5 electrodes i guess ?
+    # averaged over the electrodes
     for electrode in electrodes: 
         for band in eeg_bands:
-            total_power[band] += ( power[electrode][band] / 5 )
+            total_power[band] += ( power[electrode][band] / len( electrodes ) )
     
     # now normalize to octave width because each band is different 
     # is this necessary ? 
@@ -265,4 +269,274 @@ def analyzeEEG( data=np.random.rand(2560,5)*1000 , device='muse', sample_rate =
     'Power Band'        : power_band,
     'Coherence Frequency': int(coherence_freq)  # pyosc doesn't recognize numpy's int64
     }
-    return analysis
\ No newline at end of file
+    return analysis
+
+EEG_BANDS = OrderedDict([('Delta', (1, 4)),
+                         ('Theta', (4, 8)),
+                         ('Alpha', (8, 12)),
+                         ('Beta' , (12, 24)),
+                         ('Gamma', (24, 48))])
+
+# normalize to octave width because each band is different
+OCTAVES = {'Delta': 4, 'Theta': 1, 'Alpha': .5, 'Beta': 1, 'Gamma': 1}
+
+MUSE_ELECTRODES = ["TP9", "AF7", "AF8", "TP10"]
+CROWN_ELECTRODES = ["CP3", "C3", "F5", "PO3", "PO4", "F6", "C4", "CP4"]
+DEVICE_ELECTRODES = {'muse': MUSE_ELECTRODES, 'crown': CROWN_ELECTRODES}
+
+FRONTAL_ELECTRODES = ("AF7", "AF8")
+
+
+def default_frontal_pair( electrodes ):
+    '''
+    column indices of the electrodes frontal coherence is computed between,
+    AF7 and AF8 when the layout has them, otherwise the first two columns
+    '''
+    electrodes = list( electrodes )
+    if len( electrodes ) < 2:
+        raise ValueError( f"coherence needs at least 2 channels, the layout has {len(electrodes)}" )
+    if all( electrode in electrodes for electrode in FRONTAL_ELECTRODES ):
+        return tuple( electrodes.index( electrode ) for electrode in FRONTAL_ELECTRODES )
+    return ( 0, 1 )
+
+
+# band power ( ... x bands x channels x channels ) and coherence ( ... x bands x channels x channels )
+# of every pair of channels, see EEGAnalyzer.connectivity
+Connectivity = namedtuple( 'Connectivity', [ 'band_power', 'coherence' ] )
+
+
+class EEGAnalyzer:
+    '''
+    The same analysis as analyzeEEG, for windows of a fixed size
+
+    Everything that only depends on the sample rate, the window length and
+    the channel layout ( filter coefficients, the coherence window, the
+    band integration weights ) is worked out once when the analyzer is built.
+    Every window is then analyzed with a handful of batched numpy calls:
+    one FFT over all channels for the band powers, one over all coherence
+    segments, and matrix products to reduce all bands at once.
+
+    Arrays with extra leading dimensions, ie. ( windows x samples x channels ),
+    are analyzed in one pass by `features`.
+
+    Any channel layout can be analyzed.  `connectivity` works out the band power
+    and coherence of every pair of channels from one cross spectral density,
+    so its cost grows with the number of FFTs ( one per channel and segment )
+    rather than with a call per pair.
+    '''
+
+    def __init__(self, sample_rate: int = 256, window_length: float = 5, electrodes=MUSE_ELECTRODES,
+                 frontal_pair=None):
+        '''
+        Parameters
+        -----------
+        sample_rate
+            the sampling rate in Hz of the device being used
+        window_length
+            length in seconds of the windows that will be analyzed
+        electrodes
+            names of the data columns, in order
+        frontal_pair
+            column indices of the two electrodes the frontal coherence is computed between,
+            AF7 and AF8 by default when the layout has them, otherwise the first two columns
+        '''
+        self.sample_rate    = sample_rate
+        self.window_length  = window_length
+        self.window_size    = int( sample_rate * window_length )
+        self.electrodes     = list( electrodes )
+        self.frontal_pair   = list( default_frontal_pair( self.electrodes ) if frontal_pair is None else frontal_pair )
+        self.bands          = list( EEG_BANDS )
+
+        # butterworth bandpass, 1 - 40 Hz
+        nyquist     = sample_rate / 2
+        self.sos    = butter(12, [1 / nyquist, 40 / nyquist], btype='bandpass', output='sos')
+
+        # band power : one-sided periodogram of the whole window, integrated
+        # with the trapezoidal rule over the same bins bandpower_simple picks
+        self.freqs  = np.fft.rfftfreq( self.window_size , 1 / sample_rate )
+        scale       = np.full( self.freqs.shape , 2 / ( sample_rate * self.window_size ) )
+        scale[0]    = 1 / ( sample_rate * self.window_size )
+        if self.window_size % 2 == 0:
+            scale[-1] = 1 / ( sample_rate * self.window_size )
+        self.band_weights = self.integration_weights( self.freqs ) * scale[:, None]
+        self._psd_weights = {}
+        self.octaves    = np.array( [ OCTAVES[band] for band in self.bands ] )
+
+        # coherence : welch with 1 second hann segments, half overlapping
+        self.nperseg    = int( sample_rate )
+        self.step       = self.nperseg - self.nperseg // 2
+        self.segment_window = signal.get_window( 'hann' , self.nperseg )[:, None]
+        starts          = np.arange( ( self.window_size - self.nperseg ) // self.step + 1 ) * self.step
+        self.segment_index  = starts[:, None] + np.arange( self.nperseg )
+        self.coherence_freqs = np.fft.rfftfreq( self.nperseg , 1 / sample_rate )
+        # bins are averaged by index, one bin per Hz for 1 second segments
+        self.band_bins  = np.zeros( ( self.coherence_freqs.shape[0], len(self.bands) ) )
+        for b, band in enumerate(self.bands):
+            bins = range( *EEG_BANDS[band] )
+            self.band_bins[list(bins), b] = 1 / len(bins)
+        # band power from the welch cross spectra, density scaled and integrated like band_power
+        scale           = np.full( self.coherence_freqs.shape , 2 / ( sample_rate * np.sum( self.segment_window ** 2 ) ) )
+        scale[0]        = scale[0] / 2
+        if self.nperseg % 2 == 0:
+            scale[-1]   = scale[-1] / 2
+        cross_weights   = self.integration_weights( self.coherence_freqs ) * scale[:, None]
+        # cross spectra are only worked out over the bins some band uses
+        used            = np.flatnonzero( self.band_bins.any( axis=1 ) | cross_weights.any( axis=1 ) )
+        self.band_slice = slice( used[0] , used[-1] + 1 )
+        self.cross_weights = cross_weights[ self.band_slice ]
+        self.cross_bins = self.band_bins[ self.band_slice ]
+
+    def integration_weights(self, freqs):
+        '''
+        ( frequencies x bands ) matrix that integrates a spectrum over every band
+        with the trapezoidal rule, over the same bins bandpower_simple picks
+        '''
+        weights = np.zeros( ( freqs.shape[0], len(self.bands) ) )
+        for b, band in enumerate(self.bands):
+            fmin, fmax  = EEG_BANDS[band]
+            ind_min     = np.argmax(freqs > fmin) - 1
+            ind_max     = np.argmax(freqs > fmax) - 1
+            weights[ind_min:ind_max, b] = np.trapz( np.eye( ind_max - ind_min ) , freqs[ind_min:ind_max] )
+        return weights
+
+    def band_power_from_psd(self, freqs, psd):
+        '''
+        absolute band power of every channel from a ( ... x frequencies x channels )
+        power spectral density, ie. the running estimate of a SlidingWelch
+        '''
+        if freqs.shape[0] not in self._psd_weights:
+            self._psd_weights[freqs.shape[0]] = self.integration_weights( freqs )
+        return np.swapaxes( psd , -1 , -2 ) @ self._psd_weights[freqs.shape[0]]
+
+    def band_power(self, data):
+        '''
+        absolute band power of every channel, ( ... x channels x bands )
+        '''
+        centered = data - data.mean( axis=-2 , keepdims=True )
+        spectrum = np.fft.rfft( centered , axis=-2 )
+        power    = spectrum.real ** 2 + spectrum.imag ** 2
+        return np.swapaxes( power , -1 , -2 ) @ self.band_weights
+
+    def filter(self, data):
+        '''
+        detrended and bandpass filtered copy of the window(s)
+        '''
+        detrended = signal.detrend( data , axis=-2 )
+        return sosfilt( self.sos , detrended , axis=-2 )
+
+    def frontal_coherence(self, filtered):
+        '''
+        magnitude squared coherence between the frontal pair, ( ... x frequencies )
+        '''
+        segments = filtered[ ..., self.segment_index, : ][ ..., self.frontal_pair ] * self.segment_window
+        spectrum = np.fft.rfft( segments , axis=-2 )
+        x, y     = spectrum[ ..., 0 ], spectrum[ ..., 1 ]
+        pxx      = np.mean( x.real ** 2 + x.imag ** 2 , axis=-2 )
+        pyy      = np.mean( y.real ** 2 + y.imag ** 2 , axis=-2 )
+        pxy      = np.mean( np.conj( x ) * y , axis=-2 )
+        return ( pxy.real ** 2 + pxy.imag ** 2 ) / pxx / pyy
+
+    def cross_spectra(self, filtered):
+        '''
+        welch cross spectral density of every pair of channels, ( ... x frequencies x channels x channels ),
+        unscaled and over the frequencies `coherence_freqs[band_slice]` the bands cover.  Every segment of
+        every channel is transformed once, and the FFTs are shared by all pairs
+        '''
+        segments = filtered[ ..., self.segment_index, : ] * self.segment_window
+        spectrum = np.fft.rfft( segments , axis=-2 )[ ..., self.band_slice, : ]
+        # ( ... x frequencies x channels x segments ) @ ( ... x frequencies x segments x channels )
+        spectrum = np.ascontiguousarray( np.moveaxis( spectrum , -3 , -2 ) )
+        return ( np.swapaxes( spectrum.conj() , -1 , -2 ) @ spectrum ) / spectrum.shape[-2]
+
+    def coherence(self, csd):
+        '''
+        magnitude squared coherence of every pair of channels, from their cross spectral density
+        '''
+        power = np.diagonal( csd , axis1=-2 , axis2=-1 ).real
+        return ( csd.real ** 2 + csd.imag ** 2 ) / ( power[ ..., :, None ] * power[ ..., None, : ] )
+
+    def connectivity(self, data, filtered=None):
+        '''
+        band power and coherence of every pair of channels in one or more windows, each
+        ( ... x bands x channels x channels ), from the welch cross spectra of the filtered
+        window(s).  The band power matrix holds the cross power of every pair, with the
+        band power of every channel on its diagonal, and coherence is averaged over the
+        same bins as the band coherence features
+        '''
+        data = np.asarray( data , dtype=np.float64 )[ ..., :len(self.electrodes) ]
+        if filtered is None:
+            filtered = self.filter( data )
+        csd = self.cross_spectra( filtered )
+        return Connectivity( self._reduce_bands( csd.real , self.cross_weights ) ,
+                             self._reduce_bands( self.coherence( csd ) , self.cross_bins ) )
+
+    def _reduce_bands(self, spectra, weights):
+        # ( ... x frequencies x channels x channels ) -> ( ... x bands x channels x channels )
+        flat = spectra.reshape( spectra.shape[:-2] + ( -1 , ) )
+        return ( weights.T @ flat ).reshape( spectra.shape[:-3] + ( weights.shape[1] , ) + spectra.shape[-2:] )
+
+    def features(self, data, filtered=None):
+        '''
+        runs the analysis on one or more windows at once
+
+        returns an OrderedDict of arrays, one value per window, keyed like
+        the output of analyzeEEG.  'Power Band' and 'Coherence Band' hold
+        indices into `self.bands`
+        '''
+        data = np.asarray( data , dtype=np.float64 )[ ..., :len(self.electrodes) ]
+        if filtered is None:
+            filtered = self.filter( data )
+        return self.summarize( self.band_power( data ) , self.frontal_coherence( filtered ) )
+
+    def summarize(self, band_power, coherence):
+        '''
+        reduces the band power of every channel ( ... x channels x bands ) and
+        the frontal coherence spectrum ( ... x frequencies ) to the features
+        '''
+        low             = coherence.min( axis=-1 , keepdims=True )
+        high            = coherence.max( axis=-1 , keepdims=True )
+        band_coherence  = ( ( coherence - low ) / ( high - low ) ) @ self.band_bins
+
+        total_power     = band_power.sum( axis=-2 ) / self.octaves
+        scaled_power    = total_power / total_power.sum( axis=-1 , keepdims=True )
+
+        bands = {band: b for b, band in enumerate(self.bands)}
+        features = OrderedDict()
+        for band in self.bands:
+            features[f'{band} Power'] = scaled_power[ ..., bands[band] ]
+        for band in self.bands:
+            features[f'{band} Coherence'] = band_coherence[ ..., bands[band] ]
+        # Higher Delta / Beta suggests anxiety
+        features['Ratio Delta-Beta']    = scaled_power[ ..., bands['Delta'] ] / scaled_power[ ..., bands['Beta'] ]
+        # Higher Alpha / Gamma suggests calm / relaxed
+        features['Ratio Alpha-Gamma']   = scaled_power[ ..., bands['Alpha'] ] / scaled_power[ ..., bands['Gamma'] ]
+        features['Frontal Coherence']   = coherence.mean( axis=-1 )
+        features['Coherence Band']      = band_coherence.argmax( axis=-1 )
+        features['Coherence Frequency'] = coherence[ ..., 0:40 ].argmax( axis=-1 )
+        features['Power Band']          = scaled_power.argmax( axis=-1 )
+        return features
+
+    def analyze(self, data, filtered=None):
+        '''
+        analyzes a single ( samples x channels ) window,
+        returning the same dictionary as analyzeEEG
+        '''
+        return self.to_analysis( self.features( data , filtered ) )
+
+    def analyze_spectra(self, freqs, psd, coherence):
+        '''
+        the same dictionary as `analyze`, from a running power spectral density
+        ( frequencies x channels ) and frontal coherence ( frequencies ), ie. the
+        estimates kept by SlidingWelch
+        '''
+        return self.to_analysis( self.summarize( self.band_power_from_psd( freqs , psd ) , coherence ) )
+
+    def to_analysis(self, features):
+        '''
+        converts the features of a single window to the dictionary analyzeEEG returns
+        '''
+        analysis = {key: float( value ) for key, value in features.items()}
+        analysis['Coherence Band']      = self.bands[ int( features['Coherence Band'] ) ]
+        analysis['Power Band']          = self.bands[ int( features['Power Band'] ) ]
+        analysis['Coherence Frequency'] = int( features['Coherence Frequency'] )  # pyosc doesn't recognize numpy's int64
+        return analysis
@@ -1,9 +1,14 @@
 import json
+import struct
+from functools import lru_cache
 from json import JSONEncoder
+from typing import Union
 
+import numpy as np
 from numpy import ndarray
+from pythonosc.osc_message_builder import OscMessageBuilder
 
-from eegstreamer.data import EEGData
+from eegstreamer.data import EEGData, EEGFrame
 
 
 class EEGStreamJSONEncoder(JSONEncoder):
@@ -16,3 +21,213 @@ class EEGStreamJSONEncoder(JSONEncoder):
             json.dumps(o.tolist())
         else:
             return o.__dict__
+
+
+# batch encoders, turning a whole `EEGFrame` into text in one go
+#
+# per sample, `EEGData.json()` builds a dict, converts the packet with `tolist()`
+# and runs `json.dumps`.  for a frame the values are converted once and every line
+# is filled into a format string made for the frame's channels, floats come out
+# through `repr` exactly as the json module writes them
+
+
+@lru_cache(maxsize=32)
+def _json_line_template(channels: tuple) -> str:
+    fields = "".join(json.dumps(channel).replace('%', '%%') + ": %s, " for channel in channels)
+    packet = ", ".join("%s" for _ in channels)
+    return '{"timestamp": %d, "data": {' + fields + '"packet": [' + packet + ']}}\n'
+
+
+@lru_cache(maxsize=32)
+def _csv_row_template(channel_count: int) -> str:
+    return '"%d"' + ',"%r"' * channel_count + '\n'
+
+
+def _milliseconds(frame: EEGFrame) -> list:
+    return (frame.timestamps // 1000000).tolist()
+
+
+def encode_json_lines(data: Union[EEGData, EEGFrame]) -> str:
+    '''
+    one json line per sample, the same lines as `EEGData.json()`
+    '''
+    if not isinstance(data, EEGFrame):
+        return data.json() + "\n"
+    if not np.isfinite(data.samples).all():
+        # NaN and infinity are spelt differently by json
+        return "".join(sample.json() + "\n" for sample in data.to_samples())
+
+    # each value is formatted once, for both the named field and the packet
+    template = _json_line_template(data.channels)
+    width = len(data.channels)
+    values = list(map(repr, data.samples.ravel().tolist()))
+    return "".join([template % (timestamp, *values[i:i + width], *values[i:i + width])
+                    for timestamp, i in zip(_milliseconds(data), range(0, len(values), width))])
+
+
+def csv_header(channels) -> str:
+    return ",".join(f'"{name}"' for name in ("timestamp", *channels)) + "\n"
+
+
+def encode_csv_rows(data: Union[EEGData, EEGFrame]) -> str:
+    '''
+    one quoted csv row per sample, timestamp in milliseconds first, as the unix dialect of `csv.writer`
+    '''
+    frame = EEGFrame.of(data)
+    template = _csv_row_template(len(frame.channels))
+    return "".join([template % (timestamp, *row)
+                    for timestamp, row in zip(_milliseconds(frame), frame.samples.tolist())])
+
+
+# osc, https://opensoundcontrol.stanford.edu/spec-1_0.html
+#
+# address and type tags are the same for every message sent to an address,
+# so that part is padded and encoded once and cached, only the arguments are
+# packed per message.  for frames every value is a float, so a whole block of
+# messages is laid out in one numpy array, big-endian values written in by column
+
+_NTP_EPOCH_OFFSET = 2208988800
+_OSC_INT32 = struct.Struct('>i')
+_OSC_TIMETAG = struct.Struct('>II')
+OSC_BUNDLE_HEADER_SIZE = 16
+
+
+def osc_string(value: Union[str, bytes]) -> bytes:
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    return value + b'\0' * (4 - len(value) % 4)
+
+
+@lru_cache(maxsize=1024)
+def osc_message_prefix(address: str, typetags: str) -> bytes:
+    return osc_string(address) + osc_string(',' + typetags)
+
+
+@lru_cache(maxsize=1024)
+def _osc_arguments(typetags: str) -> struct.Struct:
+    return struct.Struct('>' + typetags.replace('h', 'q'))
+
+
+def _osc_typetag(value):
+    if isinstance(value, (bool, np.bool_)):
+        return None
+    if isinstance(value, (float, np.floating)):
+        return 'f'
+    if isinstance(value, (int, np.integer)):
+        return 'i' if -2 ** 31 <= value < 2 ** 31 else 'h'
+    if isinstance(value, str):
+        return 's'
+    return None
+
+
+def encode_osc_message(address: str, values) -> bytes:
+    '''
+    one osc message with an argument per value, typed the same way python-osc types them
+    '''
+    if isinstance(values, ndarray):
+        values = values.tolist()
+    typetags = "".join(map(_osc_typetag, values)) if all(map(_osc_typetag, values)) else None
+    if typetags is None:
+        # blobs, arrays, booleans ... left to python-osc
+        builder = OscMessageBuilder(address)
+        for value in values:
+            builder.add_arg(value)
+        return builder.build().dgram
+
+    prefix = osc_message_prefix(address, typetags)
+    if 's' not in typetags:
+        return prefix + _osc_arguments(typetags).pack(*values)
+    return prefix + b"".join(osc_string(value) if tag == 's' else _osc_arguments(tag).pack(value)
+                             for tag, value in zip(typetags, values))
+
+
+def osc_timetag(timestamp_ns: int) -> bytes:
+    seconds, nanoseconds = divmod(int(timestamp_ns), 1000000000)
+    return _OSC_TIMETAG.pack(seconds + _NTP_EPOCH_OFFSET, (nanoseconds << 32) // 1000000000)
+
+
+def encode_osc_bundle(timestamp_ns: int, elements) -> bytes:
+    '''
+    a bundle around `elements`, messages that are each already prefixed with their size
+    '''
+    return b'#bundle\0' + osc_timetag(timestamp_ns) + b"".join(elements)
+
+
+def osc_element(message: bytes) -> bytes:
+    return _OSC_INT32.pack(len(message)) + message
+
+
+class OscFrameLayout:
+    '''
+    Byte layout of the osc messages for one sample of a frame, every message prefixed with its size
+
+        multi_channel : a message per channel at `address/channel` ahead of the `address` packet
+    '''
+
+    def __init__(self, address: str, channels: tuple, multi_channel: bool = True):
+        messages = []
+        if multi_channel:
+            messages += [(osc_message_prefix(f"{address}/{channel}", 'f'), index, 1)
+                         for index, channel in enumerate(channels)]
+        messages.append((osc_message_prefix(address, 'f' * len(channels)), 0, len(channels)))
+
+        template = b""
+        # ( start, end ) of each message without its size, for sending them one at a time
+        self.messages = []
+        # ( byte offset, first channel, channel count ) of the values of each message
+        self.values = []
+        for prefix, first, count in messages:
+            message_size = len(prefix) + 4 * count
+            start = len(template) + 4
+            template += _OSC_INT32.pack(message_size) + prefix + b'\0' * (4 * count)
+            self.messages.append((start, start + message_size))
+            self.values.append((start + len(prefix), first, count))
+
+        self.template = np.frombuffer(template, dtype=np.uint8)
+        self.size = len(template)
+
+    def encode(self, samples: ndarray) -> ndarray:
+        '''
+        ( samples x size ) bytes, a row holds every message of one sample
+        '''
+        values = np.ascontiguousarray(samples, dtype='>f4').view(np.uint8).reshape(samples.shape[0], -1)
+        encoded = np.empty((samples.shape[0], self.size), dtype=np.uint8)
+        encoded[:] = self.template
+        for offset, first, count in self.values:
+            encoded[:, offset:offset + 4 * count] = values[:, 4 * first:4 * (first + count)]
+        return encoded
+
+
+@lru_cache(maxsize=64)
+def osc_frame_layout(address: str, channels: tuple, multi_channel: bool = True) -> OscFrameLayout:
+    return OscFrameLayout(address, channels, multi_channel)
+
+
+# binary sample blocks, for websocket subscribers
+#
+#     sample count    uint32
+#     channel count   uint16
+#     reserved        uint16
+#     sample rate     float64     after any decimation
+#     timestamps      int64 x samples, nanoseconds
+#     samples         float32 x samples x channels, row by row
+#
+# all little-endian, so a browser reads it with a DataView or typed arrays straight off the buffer
+
+_SAMPLE_BLOCK_HEADER = struct.Struct('<IHHd')
+
+
+def encode_sample_block(timestamps: ndarray, samples: ndarray, sample_rate: float = 0.0) -> bytes:
+    header = _SAMPLE_BLOCK_HEADER.pack(samples.shape[0], samples.shape[1], 0, sample_rate or 0.0)
+    return header + np.asarray(timestamps, dtype='<i8').tobytes() + np.asarray(samples, dtype='<f4').tobytes()
+
+
+def decode_sample_block(block: bytes) -> tuple:
+    '''
+    ( timestamps, samples, sample rate ) of an encoded sample block
+    '''
+    count, channel_count, _, sample_rate = _SAMPLE_BLOCK_HEADER.unpack_from(block)
+    offset = _SAMPLE_BLOCK_HEADER.size
+    timestamps = np.frombuffer(block, dtype='<i8', count=count, offset=offset)
+    samples = np.frombuffer(block, dtype='<f4', count=count * channel_count, offset=offset + 8 * count)
+    return timestamps, samples.reshape(count, channel_count), sample_rate
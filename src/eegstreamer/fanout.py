@@ -0,0 +1,166 @@
+import asyncio
+import time
+from logging import getLogger
+from typing import Union
+
+from eegstreamer import metrics
+from eegstreamer.data import EEGData, EEGFrame, deliver
+
+logger = getLogger(__name__)
+
+BLOCK = 'block'
+DROP_OLDEST = 'drop-oldest'
+DROP_NEWEST = 'drop-newest'
+
+OVERFLOW_POLICIES = (BLOCK, DROP_OLDEST, DROP_NEWEST)
+
+
+def _sample_count(data) -> int:
+    return len(data) if isinstance(data, EEGFrame) else 1
+
+
+class OutputBranch:
+    '''
+    One connected downstream stage
+
+    Without a queue the stage is awaited directly by `send`.  With a
+    `queue_size` the stage is driven by its own task, reading from a bounded
+    queue, so a slow stage only ever holds up itself.  When the queue is full
+    the overflow policy decides what happens:
+
+        block       : the sender waits for room ( back pressure )
+        drop-oldest : the oldest queued data is thrown away to make room
+        drop-newest : the data being sent is thrown away
+
+    Errors raised by a stage, queued or not, are logged and counted, and the
+    branch keeps going without holding up the stages next to it.
+    '''
+
+    def __init__(self, stage, queue_size: int = None, overflow: str = BLOCK):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"unknown overflow policy '{overflow}', expected one of {OVERFLOW_POLICIES}")
+        self.stage = stage
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.queue = None
+        self.task = None
+        self.delivered = 0
+        self.dropped = 0
+        self.errors = 0
+
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize() if self.queue else 0
+
+    async def put(self, data: Union[EEGData, EEGFrame]) -> None:
+        if not self.queue_size:
+            try:
+                await deliver(self.stage, data)
+                self.delivered += _sample_count(data)
+            except Exception:  # noqa
+                self.errors += 1
+                logger.exception(f"output {type(self.stage).__name__} failed")
+            return
+
+        if self.queue is None:
+            self.queue = asyncio.Queue(maxsize=self.queue_size)
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+        if self.queue.full():
+            if self.overflow == DROP_NEWEST:
+                self.dropped += _sample_count(data)
+                return
+            elif self.overflow == DROP_OLDEST:
+                self.dropped += _sample_count(self.queue.get_nowait())
+                self.queue.task_done()
+        await self.queue.put(data)
+
+    async def _run(self) -> None:
+        while True:
+            data = await self.queue.get()
+            try:
+                await deliver(self.stage, data)
+                self.delivered += _sample_count(data)
+            except Exception:  # noqa
+                self.errors += 1
+                logger.exception(f"output {type(self.stage).__name__} failed")
+            finally:
+                self.queue.task_done()
+
+    async def join(self) -> None:
+        if self.queue is not None:
+            await self.queue.join()
+
+    def cancel(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+            self.queue = None
+
+    def stats(self) -> dict:
+        return {
+            'stage': type(self.stage).__name__,
+            'queue_size': self.queue_size,
+            'overflow': self.overflow,
+            'depth': self.depth,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'errors': self.errors,
+        }
+
+
+class FanOut:
+    '''
+    Sends data on to every connected stage, shared by inputs and transformers
+    '''
+
+    def __init__(self):
+        self.outputs = []
+        self.branches = []
+
+    def connect(self, stream, queue_size: int = None, overflow: str = BLOCK):
+        '''
+        Parameters
+        ----------
+            stream : EEGTransformer or EEGOutputStreamer
+                the stage to send data to
+            queue_size : int
+                run the stage in its own task behind a queue this long,
+                instead of awaiting it on every send
+            overflow : str
+                'block', 'drop-oldest' or 'drop-newest', what to do when the queue is full
+        '''
+        self.branches.append(OutputBranch(stream, queue_size, overflow))
+        self.outputs.append(stream)
+
+    async def send(self, data: Union[EEGData, EEGFrame]) -> None:
+        if not metrics.registry.enabled:
+            for branch in self.branches:
+                await branch.put(data)
+            return
+
+        stage_metrics = metrics.stage_metrics(self)
+        stage_metrics.samples_out.mark(_sample_count(data))
+        start = time.perf_counter()
+        for branch in self.branches:
+            await branch.put(data)
+        stage_metrics.downstream += time.perf_counter() - start
+
+    async def join(self) -> None:
+        '''
+        waits until everything sent so far has been handled, all the way downstream
+        '''
+        for branch in self.branches:
+            await branch.join()
+            if hasattr(branch.stage, 'join'):
+                await branch.stage.join()
+
+    def cancel_branches(self) -> None:
+        '''
+        stops the tasks of the queued branches, whatever is still queued is thrown away
+        '''
+        for branch in self.branches:
+            branch.cancel()
+
+    def branch_stats(self) -> list:
+        return [branch.stats() for branch in self.branches]
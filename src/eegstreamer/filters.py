@@ -0,0 +1,178 @@
+from logging import getLogger
+from math import gcd
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+# scipy.signal takes longer to import than the rest of the package together,
+# it is imported where it is used so that only pipelines that filter pay for it
+
+logger = getLogger(__name__)
+
+
+def design_filter_bank(sample_rate: float, bandpass=None, highpass=None, lowpass=None, notch=None,
+                       order: int = 4, notch_quality: float = 30):
+    '''
+    Designs a cascade of filters as a single array of second-order sections
+
+    Parameters
+    ----------
+        sample_rate : float
+            in hertz
+        bandpass : (low, high)
+            pass band in hertz
+        highpass : float
+            cut off in hertz
+        lowpass : float
+            cut off in hertz
+        notch : float or list of floats
+            mains frequencies to remove, ie. 50 or 60 (or both)
+        order : int
+            butterworth order of the bandpass / highpass / lowpass filters
+        notch_quality : float
+            quality factor of the notch filters, higher is narrower
+    '''
+    from scipy import signal
+
+    sections = []
+    if bandpass is not None:
+        sections.append(signal.butter(order, bandpass, btype='bandpass', output='sos', fs=sample_rate))
+    if highpass is not None:
+        sections.append(signal.butter(order, highpass, btype='highpass', output='sos', fs=sample_rate))
+    if lowpass is not None:
+        sections.append(signal.butter(order, lowpass, btype='lowpass', output='sos', fs=sample_rate))
+    if notch is not None:
+        for frequency in np.atleast_1d(notch):
+            if frequency >= sample_rate / 2:
+                logger.warning(f"skipping {frequency}Hz notch, above nyquist for {sample_rate}Hz")
+                continue
+            b, a = signal.iirnotch(frequency, notch_quality, fs=sample_rate)
+            sections.append(signal.tf2sos(b, a))
+
+    if not sections:
+        raise ValueError("no filters were requested")
+    return np.vstack(sections)
+
+
+class StreamingFilter:
+    '''
+    Applies an IIR filter to a stream of blocks, carrying the filter state
+    ( sosfilt's `zi` ) for every channel from one block to the next
+
+    Filtering a stream block by block gives the same result as filtering
+    the whole stream at once, while each sample is only filtered one time.
+    '''
+
+    def __init__(self, sos):
+        self.sos = np.atleast_2d(sos)
+        self.zi = None
+
+    def __call__(self, block) -> np.ndarray:
+        '''
+        filters a (samples x channels) block, returning the filtered block
+        '''
+        from scipy import signal
+
+        block = np.asarray(block, dtype=np.float64)
+        if block.ndim == 1:
+            block = block.reshape(1, -1)
+        if self.zi is None or self.zi.shape[-1] != block.shape[1]:
+            # start from the steady state for the first sample so there is
+            # no step transient at the start of the stream
+            self.zi = signal.sosfilt_zi(self.sos)[:, :, None] * block[0]
+        filtered, self.zi = signal.sosfilt(self.sos, block, axis=0, zi=self.zi)
+        return filtered
+
+    def reset(self) -> None:
+        self.zi = None
+
+
+class StreamingResampler:
+    '''
+    Resamples a stream of blocks by a rational factor `up / down` with a
+    polyphase FIR, carrying the last input samples from one block to the next
+
+    The lowpass is designed like scipy's resample_poly, a kaiser windowed sinc
+    with `half_length` zero crossings either side of its centre, cutting off at
+    the lower of the two nyquist frequencies.  Output sample `m` lines up with
+    input sample `m * down / up` and is emitted as soon as that sample arrives,
+    so the signal comes out delayed by the group delay of the filter,
+    `half_length * max(up, down) / up` input samples.
+
+        resampler = StreamingResampler(1, 8)        # 256Hz -> 32Hz
+        for block in blocks:
+            out, positions = resampler(block)
+    '''
+
+    def __init__(self, up: int, down: int, half_length: int = 10, beta: float = 5.0):
+        from scipy import signal
+
+        divisor = gcd(int(up), int(down))
+        self.up = int(up) // divisor
+        self.down = int(down) // divisor
+        taps = 2 * half_length * max(self.up, self.down) + 1
+        h = signal.firwin(taps, 1 / max(self.up, self.down), window=('kaiser', beta)) * self.up
+        # h[phase + i * up] is tap i of polyphase branch `phase`
+        self.taps_per_phase = -(-taps // self.up)
+        h = np.concatenate([h, np.zeros(self.taps_per_phase * self.up - taps)])
+        self.phases = h.reshape(self.taps_per_phase, self.up).T[:, ::-1].copy()
+        # the inputs still needed, the oldest `taps_per_phase - 1` followed by the newest block,
+        # in a buffer that only has to be shifted down once it fills up
+        self.buffer = None
+        self.windows = None
+        self.length = 0
+        # index of the next input sample and of the next output sample, from the start of the stream
+        self.received = 0
+        self.emitted = 0
+
+    def _allocate(self, length: int, channels: int) -> None:
+        self.buffer = np.empty((length, channels))
+        # every run of `taps_per_phase` consecutive rows, without copying
+        shape = (length - self.taps_per_phase + 1, self.taps_per_phase, channels)
+        self.windows = as_strided(self.buffer, shape=shape, strides=(self.buffer.strides[0],) + self.buffer.strides,
+                                  writeable=False)
+
+    def _append(self, block) -> None:
+        keep = self.taps_per_phase - 1
+        if self.buffer is None or self.buffer.shape[1] != block.shape[1]:
+            # as if the stream had always been at its first value, so there is no step transient
+            self._allocate(2 * keep + max(block.shape[0], 256), block.shape[1])
+            self.buffer[:keep] = block[0]
+            self.length = keep
+        elif self.length + block.shape[0] > self.buffer.shape[0]:
+            tail = self.buffer[self.length - keep:self.length].copy()
+            if keep + block.shape[0] > self.buffer.shape[0]:
+                self._allocate(2 * keep + block.shape[0], block.shape[1])
+            self.buffer[:keep] = tail
+            self.length = keep
+        self.buffer[self.length:self.length + block.shape[0]] = block
+        self.length += block.shape[0]
+
+    def __call__(self, block):
+        '''
+        resamples a (samples x channels) block, returning the ( outputs x channels ) samples that are
+        due, and for each the index into `block` of the newest input sample it depends on
+        '''
+        block = np.asarray(block, dtype=np.float64)
+        if block.ndim == 1:
+            block = block.reshape(1, -1)
+        self._append(block)
+
+        first = self.received
+        self.received += block.shape[0]
+        count = max(0, ((self.received - 1) * self.up + self.up - 1) // self.down - self.emitted + 1)
+        newest, phases = np.divmod(np.arange(self.emitted, self.emitted + count) * self.down, self.up)
+        self.emitted += count
+        if not count:
+            return np.empty((0, block.shape[1])), newest
+
+        # the window of every output ends with the newest input it depends on, oldest first like the reversed taps
+        rows = newest - (self.received - self.length) - self.taps_per_phase + 1
+        out = np.matmul(self.phases[phases][:, None, :], self.windows[rows])[:, 0]
+        return out, newest - first
+
+    def reset(self) -> None:
+        self.buffer = None
+        self.length = 0
+        self.received = 0
+        self.emitted = 0
@@ -0,0 +1,358 @@
+'''
+Pipelines described as data instead of wired up by hand
+
+    stages:
+      muse:
+        type: FakeEEGDeviceInputStreamer
+        params: {device: muse}
+      power:
+        type: PowerCoherenceEEGTransformer
+        from: muse
+      prc:
+        type: OscOutputStreamer
+        params: {address: /prc, port: 9807}
+        from: power
+        queue_size: 64
+        overflow: drop-oldest
+
+`type` is the name of a stage in eegstreamer.registry, or 'module:Class' for
+anything else.  `from` names the stage(s) data comes from,
+`queue_size` and `overflow` are handed to `connect` for every edge into the stage.
+
+Transformers and outputs of the same type, with the same parameters and the same
+upstreams are merged into one shared stage, so two branches asking for the same analysis of
+the same input only run it once.  Sample rates and channel counts are followed
+along the edges and checked wherever a stage expects a particular rate, or takes
+data from more than one stage.
+'''
+import asyncio
+import inspect
+import json
+import os
+from collections import namedtuple
+from logging import getLogger
+
+from eegstreamer import inputs, registry, transforms
+from eegstreamer.fanout import FanOut
+
+logger = getLogger(__name__)
+
+# sample rate in hertz and number of channels of the data leaving a stage, None when unknown
+StreamInfo = namedtuple('StreamInfo', ['sample_rate', 'channels'])
+UNKNOWN = StreamInfo(None, None)
+
+_FAKE_DEVICE_CHANNELS = {'muse': 4, 'crown': 8}
+
+
+class GraphConfigError(ValueError):
+    pass
+
+
+def load_config(filename: str) -> dict:
+    '''
+    reads a graph description from a .json, .yaml or .yml file
+    '''
+    with open(filename) as file:
+        if os.path.splitext(filename)[1].lower() in ('.yaml', '.yml'):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("yaml graphs need pyyaml, pip install eegstreamer'[yaml]'") from None
+            return yaml.safe_load(file)
+        return json.load(file)
+
+
+def resolve_stage_type(name: str):
+    try:
+        stage_type = registry.resolve(name)
+    except LookupError:
+        raise GraphConfigError(f"unknown stage type {name}") from None
+    except ImportError as e:
+        raise GraphConfigError(f"unknown stage type {name}: {e}") from None
+    if not inspect.isclass(stage_type):
+        raise GraphConfigError(f"stage type {name} is not a class")
+    return stage_type
+
+
+class GraphNode:
+    '''
+    One stage of the graph, shared by every name that was merged into it
+    '''
+
+    def __init__(self, names, stage_type, params: dict, upstreams: list, queue_size=None, overflow='block'):
+        self.names = names
+        self.stage_type = stage_type
+        self.params = params
+        self.upstreams = upstreams
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.downstreams = []
+        self.stream = UNKNOWN
+        self.stage = None
+
+    @property
+    def name(self) -> str:
+        return self.names[0]
+
+    @property
+    def is_input(self) -> bool:
+        return issubclass(self.stage_type, inputs.EEGInputStreamer)
+
+    def arguments(self) -> dict:
+        '''
+        the parameters the stage is created with, defaults included
+        '''
+        try:
+            bound = inspect.signature(self.stage_type).bind_partial(**self.params)
+        except TypeError as e:
+            raise GraphConfigError(f"stage {self.name}: {e}") from None
+        bound.apply_defaults()
+        return bound.arguments
+
+    def build(self):
+        params = dict(self.params)
+        if 'event_loop' in inspect.signature(self.stage_type).parameters and 'event_loop' not in params:
+            # ie. the muse input, which hands data over from the bluetooth thread
+            params['event_loop'] = asyncio.get_event_loop()
+        self.stage = self.stage_type(**params)
+        return self.stage
+
+    def describe(self) -> str:
+        params = ', '.join(f"{key}={value!r}" for key, value in self.params.items())
+        line = f"{self.name}: {self.stage_type.__name__}({params})"
+        if len(self.names) > 1:
+            line += f" shared by {', '.join(self.names)}"
+        if self.upstreams:
+            line += f" <- {', '.join(upstream.name for upstream in self.upstreams)}"
+        if self.stream.sample_rate is not None or self.stream.channels is not None:
+            rate = '?' if self.stream.sample_rate is None else f"{self.stream.sample_rate:g}"
+            channels = '?' if self.stream.channels is None else self.stream.channels
+            line += f"  [{rate} Hz x {channels} channels]"
+        return line
+
+
+def _input_stream(node: GraphNode, arguments: dict) -> StreamInfo:
+    sample_rate = arguments.get('sample_rate', getattr(node.stage_type, 'SAMPLE_RATE', None))
+    if 'channel_count' in arguments:
+        channels = arguments['channel_count']
+    elif 'device' in arguments:
+        channels = _FAKE_DEVICE_CHANNELS.get(arguments['device'], 4)
+    elif hasattr(node.stage_type, 'CHANNELS'):
+        channels = len(node.stage_type.CHANNELS)
+    else:
+        channels = None
+    return StreamInfo(sample_rate, channels)
+
+
+def _downsample_stream(node: GraphNode, arguments: dict, stream: StreamInfo) -> StreamInfo:
+    _expect_rate(node, arguments['input_rate'], stream)
+    sample_rate = arguments['sample_rate'] or arguments['input_rate'] / arguments['downsample_scale']
+    return stream._replace(sample_rate=sample_rate)
+
+
+def _power_coherence_stream(node: GraphNode, arguments: dict, stream: StreamInfo) -> StreamInfo:
+    executor = arguments['executor']
+    if isinstance(executor, str) and executor not in transforms.EXECUTORS:
+        raise GraphConfigError(f"stage {node.name} has an unknown executor '{executor}', "
+                               f"expected one of {', '.join(transforms.EXECUTORS)}")
+    _expect_rate(node, arguments['sample_rate'], stream)
+    if stream.channels is not None and stream.channels < 2:
+        raise GraphConfigError(f"stage {node.name} needs at least 2 channels for the coherence, "
+                               f"gets {stream.channels}")
+    # one analysis a hop, sent on as a single sample of features
+    return StreamInfo(1 / arguments['hop'], None)
+
+
+def _filter_stream(node: GraphNode, arguments: dict, stream: StreamInfo) -> StreamInfo:
+    # the filters are designed for `sample_rate`, defaulted or not
+    _expect_rate(node, arguments['sample_rate'], stream)
+    return stream
+
+
+# stages that expect a rate, or change the rate or layout of what passes through them,
+# everything else passes the stream on as it is
+_STREAM_RULES = {
+    transforms.DownSampleEEGTransformer: _downsample_stream,
+    transforms.PowerCoherenceEEGTransformer: _power_coherence_stream,
+    transforms.StreamingFilterTransformer: _filter_stream,
+}
+
+
+def _expect_rate(node: GraphNode, sample_rate, stream: StreamInfo) -> None:
+    if sample_rate is not None and stream.sample_rate is not None and sample_rate != stream.sample_rate:
+        raise GraphConfigError(f"stage {node.name} expects {sample_rate:g} Hz, "
+                               f"{', '.join(upstream.name for upstream in node.upstreams)} "
+                               f"sends {stream.sample_rate:g} Hz")
+
+
+def _merge_upstreams(node: GraphNode) -> StreamInfo:
+    rates = {upstream.stream.sample_rate for upstream in node.upstreams} - {None}
+    channels = {upstream.stream.channels for upstream in node.upstreams} - {None}
+    if len(rates) > 1:
+        raise GraphConfigError(f"stage {node.name} takes data at different rates, "
+                               f"{' and '.join(f'{rate:g} Hz' for rate in sorted(rates))}")
+    if len(channels) > 1:
+        raise GraphConfigError(f"stage {node.name} takes data with different channel counts, "
+                               f"{' and '.join(str(count) for count in sorted(channels))}")
+    return StreamInfo(rates.pop() if rates else None, channels.pop() if channels else None)
+
+
+class Graph:
+    '''
+    A pipeline built from a graph description
+
+        graph = Graph.load('graph.yaml')
+        print(graph.describe())
+        await graph.run(duration=60)
+    '''
+
+    def __init__(self, config: dict):
+        if not isinstance(config, dict) or not isinstance(config.get('stages'), dict) or not config['stages']:
+            raise GraphConfigError("a graph needs a 'stages' mapping of stage names to stages")
+        self.config = config
+        self.duration = config.get('duration', 0)
+        # stage name -> node, names merged into a shared node all point at it
+        self.names = {}
+        self.nodes = []
+        self._resolve(config['stages'])
+        self._validate()
+
+    @classmethod
+    def load(cls, filename: str) -> 'Graph':
+        return cls(load_config(filename))
+
+    def _resolve(self, stages: dict) -> None:
+        nodes_by_key = {}
+        resolving = set()
+
+        def resolve(name):
+            if name in self.names:
+                return self.names[name]
+            if name not in stages:
+                raise GraphConfigError(f"unknown stage {name}")
+            if name in resolving:
+                raise GraphConfigError(f"stage {name} is part of a cycle")
+            resolving.add(name)
+
+            spec = stages[name]
+            if not isinstance(spec, dict) or 'type' not in spec:
+                raise GraphConfigError(f"stage {name} needs a type")
+            unknown = set(spec) - {'type', 'params', 'from', 'queue_size', 'overflow'}
+            if unknown:
+                raise GraphConfigError(f"stage {name} has unknown settings {', '.join(sorted(unknown))}")
+            stage_type = resolve_stage_type(spec['type'])
+            params = spec.get('params') or {}
+            sources = spec.get('from') or []
+            if isinstance(sources, str):
+                sources = [sources]
+
+            upstreams = []
+            for source in sources:
+                upstream = resolve(source)
+                if upstream not in upstreams:
+                    upstreams.append(upstream)
+
+            is_input = issubclass(stage_type, inputs.EEGInputStreamer)
+            if is_input and upstreams:
+                raise GraphConfigError(f"stage {name} is an input and can't take data from other stages")
+            if not is_input and not upstreams:
+                raise GraphConfigError(f"stage {name} doesn't take data from any stage")
+            if upstreams and any(not hasattr(upstream.stage_type, 'connect') for upstream in upstreams):
+                raise GraphConfigError(f"stage {name} takes data from an output")
+
+            queue_size = spec.get('queue_size')
+            overflow = spec.get('overflow', 'block')
+            # inputs are never merged, two devices configured alike are still two sources
+            key = None if is_input else (stage_type, json.dumps(params, sort_keys=True, default=repr),
+                                         tuple(sorted(id(upstream) for upstream in upstreams)), queue_size,
+                                         overflow)
+            node = nodes_by_key.get(key)
+            if node is None:
+                node = GraphNode([name], stage_type, params, upstreams, queue_size, overflow)
+                if key is not None:
+                    nodes_by_key[key] = node
+                # upstreams are always resolved first, so this is a topological order
+                self.nodes.append(node)
+                for upstream in upstreams:
+                    upstream.downstreams.append(node)
+            else:
+                logger.info(f"stage {name} is the same as {node.name}, sharing it")
+                node.names.append(name)
+
+            resolving.discard(name)
+            self.names[name] = node
+            return node
+
+        for name in stages:
+            resolve(name)
+
+    def _validate(self) -> None:
+        for node in self.nodes:
+            arguments = node.arguments()
+            if node.is_input:
+                node.stream = _input_stream(node, arguments)
+                continue
+            stream = _merge_upstreams(node)
+            rule = _STREAM_RULES.get(node.stage_type)
+            if rule is not None:
+                node.stream = rule(node, arguments, stream)
+            else:
+                # a `sample_rate` set for any other transformer is the rate it expects to be sent,
+                # outputs only fall back on theirs for data that doesn't carry its own
+                if hasattr(node.stage_type, 'connect'):
+                    _expect_rate(node, node.params.get('sample_rate'), stream)
+                node.stream = stream
+
+    @property
+    def inputs(self) -> list:
+        return [node for node in self.nodes if node.is_input]
+
+    def describe(self) -> str:
+        '''
+        the resolved topology, one stage a line in the order data flows
+        '''
+        return '\n'.join(node.describe() for node in self.nodes)
+
+    def build(self) -> None:
+        '''
+        creates every stage and connects them
+        '''
+        for node in self.nodes:
+            node.build()
+        for node in self.nodes:
+            for downstream in node.downstreams:
+                node.stage.connect(downstream.stage, queue_size=downstream.queue_size, overflow=downstream.overflow)
+
+    def stage(self, name: str):
+        return self.names[name].stage
+
+    async def run(self, duration: float = None) -> None:
+        '''
+        streams for `duration` seconds ( the graph's own duration by default, 0 for as long as the inputs run ),
+        then waits for everything sent to be handled and closes every stage
+        '''
+        if self.nodes[0].stage is None:
+            self.build()
+        if duration is None:
+            duration = self.duration
+        try:
+            await asyncio.gather(*(node.stage.start(duration) for node in self.inputs))
+            for node in self.inputs:
+                await node.stage.join()
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        for node in self.nodes:
+            close = getattr(node.stage, 'close', None)
+            if close is None:
+                continue
+            try:
+                result = close()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:  # noqa
+                logger.exception(f"could not close stage {node.name}")
+            finally:
+                if isinstance(node.stage, FanOut):
+                    node.stage.cancel_branches()
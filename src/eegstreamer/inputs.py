@@ -1,39 +1,35 @@
 import csv
+import io
 import json
 import os
 from abc import ABC, abstractmethod
 import asyncio
-import random
-import traceback
+from itertools import islice
+import queue
 from logging import getLogger
 from typing import Union
-from muselsl.muse import Muse
 
 from eegstreamer import DeviceConnectionFailure, DataStreamInterrupted
-from eegstreamer.data import EEGData
+from eegstreamer.clock import ClockCorrector
+from eegstreamer.data import EEGData, EEGFrame, TIMESTAMP_UNITS, guess_timestamp_unit, to_nanoseconds
+from eegstreamer.fanout import FanOut
+from eegstreamer.filters import StreamingFilter
+from eegstreamer.pacing import Pacer
+from eegstreamer.recording import BinaryRecording
+from eegstreamer.ring import SharedRing
 from eegstreamer.outputs import EEGOutputStreamer
 from eegstreamer.transforms import EEGTransformer
 
 import numpy as np
-from scipy import signal
 from time import time
 
 logger = getLogger(__name__)
 
 
-class EEGInputStreamer(ABC):
+class EEGInputStreamer(FanOut, ABC):
 
     def __init__(self):
-
-        self.outputs = []
-
-    def connect(self, stream: Union[EEGTransformer, EEGOutputStreamer]):
-        self.outputs.append(stream)
-
-    async def send(self, data) -> None:
-        # TODO : if one of the outputs raises an exception, should all outputs halt?
-        for output in self.outputs:
-            await output.receive(data)
+        super().__init__()
 
     @abstractmethod
     async def start(self, duration: int = 0):
@@ -50,113 +46,382 @@ class EEGInputStreamer(ABC):
 
 class RandomEEGInputStream(EEGInputStreamer):
 
-    def __init__(self, sample_rate: int = 10, channel_count=2):
+    def __init__(self, sample_rate: int = 10, channel_count=2, block_size: int = 1, speed: float = 1.0):
         super().__init__()
         self._sample_rate = sample_rate
         self._channel_count = channel_count
+        self._channels = [f"channel{channel}" for channel in range(0, channel_count)]
+        self.pacer = Pacer(sample_rate, block_size=block_size, speed=speed)
 
     async def close(self):
-        pass
+        self.cancel_branches()
 
     async def stop(self):
         pass
 
     async def start(self, duration: int = 0):
-        sample_count = self._sample_rate * duration
-
-        samples = 0
-        while not sample_count or samples < sample_count:
-            sample_data = dict()
-            packet = list()
-            for channel in range(0, self._channel_count):
-                value = random.randint(-10, 10)
-                sample_data[f"channel{channel}"] = value
-                packet.append(value)
+        sample_count = int(self._sample_rate * duration)
 
-            sample_data['packet'] = packet
-
-            await self.send(EEGData(sample_data))
-            samples += 1
-            await asyncio.sleep(1 / self._sample_rate)
+        async for first, count in self.pacer.blocks(sample_count):
+            values = np.random.randint(-10, 11, size=(count, self._channel_count))
+            await self.send(EEGFrame(values, self._channels, self.pacer.timestamps(first, count), self._sample_rate))
 
 
 class FileEEGInputStreamer(EEGInputStreamer, ABC):
-
-    def __init__(self, filename, sample_rate: int = 256):
+    '''
+    Replays a recording, parsing it in chunks of `chunk_size` rows straight
+    into numpy arrays and sending them on in blocks
+
+        speed      : multiple of real time, None or 0 for as fast as possible
+        start      : offset into the recording in seconds
+        block_size : samples per block, defaults to 1 when paced and to
+                     `chunk_size` when not
+        restamp    : stamp samples with the time they are replayed, instead
+                     of the time they were recorded
+        timestamp_unit : 's', 'ms', 'us' or 'ns', the unit of the recorded
+                     timestamps.  By default it is guessed from the magnitude of
+                     the first chunk's, which only works for epoch timestamps
+    '''
+
+    def __init__(self, filename, sample_rate: int = 256, block_size: int = None, speed: float = 1.0,
+                 start: float = 0, chunk_size: int = 65536, restamp: bool = False, timestamp_unit: str = None):
         super().__init__()
+        if timestamp_unit is not None and timestamp_unit not in TIMESTAMP_UNITS:
+            raise ValueError(f"unknown timestamp unit '{timestamp_unit}', expected one of {tuple(TIMESTAMP_UNITS)}")
         self.sample_rate = sample_rate
+        self.restamp = restamp
+        self.timestamp_unit = timestamp_unit
         if not os.path.exists(filename):
             raise FileNotFoundError(f"Could not find: {filename}")
         self.filename = filename
         self.file_handle = None
+        self.channels = None
+        self.offset = int(start * sample_rate)
+        self.chunk_size = chunk_size
+        if block_size is None:
+            block_size = 1 if speed else chunk_size
+        self.pacer = Pacer(sample_rate, block_size=block_size, speed=speed)
 
     def get_file_handle(self):
         return open(self.filename, mode='r')
 
+    def to_nanoseconds(self, timestamps) -> np.ndarray:
+        # guessed once, so every chunk of a recording is read in the same unit
+        if self.timestamp_unit is None:
+            self.timestamp_unit = guess_timestamp_unit(timestamps)
+        return to_nanoseconds(timestamps, self.timestamp_unit)
+
+    @abstractmethod
+    def read_chunks(self):
+        '''
+        yields ( timestamps in nanoseconds, samples x channels array ) for
+        consecutive chunks of the recording, starting at `offset`
+        '''
+        pass
+
+    async def start(self, duration: int = 0):
+        sample_count = int(self.sample_rate * duration)
+        chunks = self.read_chunks()
+        chunk = np.empty((0, 0))
+        chunk_timestamps = None
+        position = 0
+        sent = 0
+
+        async for first, count in self.pacer.blocks(sample_count):
+            pieces = []
+            timestamps = []
+            needed = count
+            while needed:
+                if position >= chunk.shape[0]:
+                    chunk_timestamps, chunk = next(chunks, (None, None))
+                    position = 0
+                    if chunk is None:
+                        break
+                piece = chunk[position:position + needed]
+                timestamps.append(chunk_timestamps[position:position + needed])
+                position += piece.shape[0]
+                needed -= piece.shape[0]
+                pieces.append(piece)
+            if pieces:
+                samples = pieces[0] if len(pieces) == 1 else np.concatenate(pieces)
+                if self.restamp:
+                    timestamps = self.pacer.timestamps(first, samples.shape[0])
+                else:
+                    timestamps = timestamps[0] if len(timestamps) == 1 else np.concatenate(timestamps)
+                await self.send(EEGFrame(samples, self.channels, timestamps, self.sample_rate))
+                sent += samples.shape[0]
+            if chunk is None:
+                break
+
+        logger.debug(f"done with all rows: {sent}")
+
     async def stop(self):
         pass
 
     async def close(self):
-        self.file_handle.close()
+        if self.file_handle:
+            self.file_handle.close()
+        self.cancel_branches()
         await asyncio.sleep(0)
 
 
+# json punctuation read as csv delimiters, see JSONFileInputStreamer
+_JSON_DELIMITERS = bytes.maketrans(b'[]{}:', b',,,,,')
+
+
 class JSONFileInputStreamer(FileEEGInputStreamer):
+    '''
+    Replays json lines, `{"timestamp": ..., "data": {"TP9": ..., "packet": [...]}}` a sample
 
-    async def start(self, duration: int = 0):
+    Lines laid out like the first one ( as every line this package writes is ) are read
+    as csv, with the json punctuation turned into delimiters, by pandas' C parser: only
+    the timestamp and the packet are converted, and the first named channel to check the
+    packet against.  Chunks that don't fit the layout are parsed as json.
+    '''
 
-        if not self.file_handle:
-            self.file_handle = self.get_file_handle()
+    def get_file_handle(self):
+        # lines are handed to the parsers as bytes, without decoding and encoding them again
+        return open(self.filename, mode='rb')
 
-        for line in self.file_handle:
-            eeg_data = json.loads(line)
-            await self.send(EEGData(eeg_data['data']))
-            await asyncio.sleep(1/self.sample_rate)
+    def read_chunks(self):
+        self.file_handle = self.get_file_handle()
+        # peek at the first record for the channel layout
+        first_line = self.file_handle.readline()
+        if not first_line:
+            return
+        self.channels = EEGFrame.from_sample(EEGData(json.loads(first_line)['data'])).channels
+        columns = self._columns(first_line)
+        self.file_handle.seek(0)
+        for _ in islice(self.file_handle, self.offset):
+            pass
+
+        while True:
+            lines = list(islice(self.file_handle, self.chunk_size))
+            if not lines:
+                return
+            text = b''.join(lines)
+            chunk = None if columns is None else self._read_fields(text, columns)
+            yield chunk if chunk is not None else self._read_records(text)
+
+    def _columns(self, line: bytes):
+        '''
+        positions of the timestamp, the first named channel and the packet among the fields
+        of a line once it is read as csv, None when the line has no such layout
+        '''
+        fields = [field.strip() for field in line.translate(_JSON_DELIMITERS).decode('utf-8').split(',')]
+        try:
+            timestamp = fields.index('"timestamp"') + 1
+            # the packet's values follow its key and the empty field left by the bracket
+            packet = fields.index('"packet"') + 2
+            named = fields.index(json.dumps(self.channels[0])) + 1
+        except ValueError:
+            return None
+        return timestamp, named, list(range(packet, packet + len(self.channels))), packet + len(self.channels)
+
+    def _read_fields(self, text: bytes, columns):
+        import pandas as pd
+
+        timestamp, named, packet, after = columns
+        try:
+            fields = pd.read_csv(io.BytesIO(text.translate(_JSON_DELIMITERS)), header=None, quoting=csv.QUOTE_NONE,
+                                 usecols=[timestamp, named, *packet, after],
+                                 dtype={column: np.float64 for column in (named, *packet, after)})
+        except (ValueError, pd.errors.ParserError):
+            return None
+        samples = fields[packet].to_numpy()
+        # a line laid out differently shows up as a packet that isn't its named values,
+        # or doesn't end where the first one did
+        if (not np.array_equal(fields[named].to_numpy(), samples[:, 0], equal_nan=True)
+                or not fields[after].isna().all() or fields[timestamp].dtype == object):
+            return None
+        return self.to_nanoseconds(fields[timestamp].to_numpy()), samples
+
+    def _read_records(self, text: bytes):
+        import pandas as pd
+
+        chunk = pd.read_json(io.BytesIO(text), lines=True, convert_dates=False, dtype=False)
+        records = pd.DataFrame.from_records(chunk['data'].tolist(), columns=list(self.channels))
+        return self.to_nanoseconds(chunk['timestamp'].to_numpy()), records.to_numpy(dtype=np.float64)
 
 
 class CSVFileInputStreamer(FileEEGInputStreamer):
 
-    def __init__(self, filename, sample_rate: int = 256):
-        super().__init__(filename, sample_rate)
-        self.csvreader = None
-
-    async def start(self, duration: int = 0):
+    def read_chunks(self):
         logger.info("starting csv file reader")
         self.file_handle = self.get_file_handle()
-        self.csvreader = csv.reader(self.file_handle)
-        keys = None
-        row_count = 0
-        for row in self.csvreader:
-            if not keys:
-                keys = row
-                keys.pop(0)
-            else:
+        keys = next(csv.reader([self.file_handle.readline()]))
+        self.channels = keys[1:]
+        for _ in islice(self.file_handle, self.offset):
+            pass
+
+        import pandas as pd
+
+        for chunk in pd.read_csv(self.file_handle, names=keys, header=None, chunksize=self.chunk_size,
+                                 dtype=np.float64):
+            values = chunk.to_numpy()
+            yield self.to_nanoseconds(values[:, 0]), values[:, 1:]
+
+
+class BinaryFileInputStreamer(FileEEGInputStreamer):
+    '''
+    Replays a binary recording through a memory map, nothing is parsed and
+    seeking to `start` costs the same wherever it lands
+
+    the sample rate comes from the recording's header
+    '''
+
+    def __init__(self, filename, block_size: int = None, speed: float = 1.0, start: float = 0,
+                 chunk_size: int = 65536, restamp: bool = False):
+        if not os.path.exists(filename):
+            raise FileNotFoundError(f"Could not find: {filename}")
+        self.recording = BinaryRecording(filename)
+        super().__init__(filename, self.recording.sample_rate, block_size, speed, start, chunk_size, restamp)
+        self.channels = self.recording.channels
+
+    def read_chunks(self):
+        timestamps, samples = self.recording.timestamps, self.recording.samples
+        for first in range(self.offset, len(self.recording), self.chunk_size):
+            yield timestamps[first:first + self.chunk_size], samples[first:first + self.chunk_size]
 
-                floats = [float(c) for c in row[1:]]
-                data = dict(zip(keys, floats))
-                data['packet'] = np.array(floats)
-                await self.send(EEGData(data))
-                await asyncio.sleep(1 / self.sample_rate)
-                row_count += 1
+    async def close(self):
+        self.recording.close()
+        await super().close()
+
+
+class SharedMemoryInputStreamer(EEGInputStreamer):
+    '''
+    Reads the ring a `SharedMemoryOutputStreamer` writes, in this or any other process
+    on the same machine, starting from the newest sample when it attaches
+
+    Frames are views into the shared memory, nothing is copied or parsed.  The writer
+    never waits for its readers, so a frame can be overwritten once the reader is
+    `capacity` samples behind: samples lost before they were read ( or copied ) are counted
+    in `dropped_samples`, frames the writer caught up with while they were being handled in
+    `overwritten_frames`.  Stages that hold on to frames past `receive` ( queued branches,
+    outputs that batch ) should be fed with `copy=True`.
+    '''
+
+    def __init__(self, name: str = 'eegstreamer', block_size: int = 4096, poll_interval: float = 0.005,
+                 attach_timeout: float = 10.0, copy: bool = False):
+        """
+        Parameters
+        ----------
+            name : str
+                of the shared memory segment the writer created
+            block_size : int
+                most samples sent on in a frame
+            poll_interval : float
+                seconds between looks at the write sequence when there is nothing new
+            attach_timeout : float
+                seconds to wait for the writer to create the ring
+            copy : bool
+                send copies of the samples instead of views into the ring
+        """
+        super().__init__()
+        self.name = name
+        self.block_size = block_size
+        self.poll_interval = poll_interval
+        self.attach_timeout = attach_timeout
+        self.copy = copy
+        self.ring = None
+        self.position = None
+        self.dropped_samples = 0
+        self.overwritten_frames = 0
+
+    async def attach(self) -> None:
+        '''
+        waits for the writer's ring, reading starts from the samples written after this
+        '''
+        if self.ring is not None:
+            return
+        waited = 0.0
+        while self.ring is None:
+            try:
+                self.ring = SharedRing.attach(self.name)
+            except FileNotFoundError:
+                if waited >= self.attach_timeout:
+                    raise DataStreamInterrupted(f"no shared memory ring named {self.name}") from None
+                await asyncio.sleep(self.poll_interval)
+                waited += self.poll_interval
+        self.position = self.ring.write_sequence
+
+    @property
+    def sample_rate(self):
+        return None if self.ring is None else self.ring.sample_rate
+
+    @property
+    def lag(self) -> int:
+        '''
+        samples written that this reader has not read yet
+        '''
+        return 0 if self.ring is None else self.ring.write_sequence - self.position
+
+    async def start(self, duration: int = 0):
+        await self.attach()
+        ring = self.ring
+        sample_count = int(ring.sample_rate * duration)
+        sent = 0
+        while not sample_count or sent < sample_count:
+            written = ring.write_sequence
+            if written == self.position:
+                if ring.closed:
+                    break
+                await asyncio.sleep(self.poll_interval)
+                continue
+            if written - self.position > ring.capacity:
+                # overwritten before this reader got to them
+                self.dropped_samples += written - ring.capacity - self.position
+                self.position = written - ring.capacity
+
+            count = min(written - self.position, self.block_size)
+            if sample_count:
+                count = min(count, sample_count - sent)
+            timestamps, samples = ring.read(self.position, count)
+            if self.copy:
+                timestamps, samples = timestamps.copy(), samples.copy()
+            if ring.writing_sequence - ring.capacity > self.position:
+                # the writer wrapped around onto the samples while they were read or copied,
+                # or is in the middle of it, they are lost rather than sent as a torn frame
+                self.dropped_samples += len(timestamps)
+                self.position += len(timestamps)
+                continue
+            await self.send(EEGFrame(samples, ring.channels, timestamps, ring.sample_rate))
+            if not self.copy and ring.writing_sequence - ring.capacity > self.position:
+                # the writer wrapped around onto the frame while it was being handled
+                self.overwritten_frames += 1
+            self.position += len(timestamps)
+            sent += len(timestamps)
+
+    async def stop(self):
+        pass
 
-        logger.debug(f"done with all rows: {row_count}")
+    async def close(self):
+        self.cancel_branches()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
 
 
 class FakeEEGDeviceInputStreamer(EEGInputStreamer):
 
-    def __init__(self, sample_rate: int = 256, device:str = None):
+    def __init__(self, sample_rate: int = 256, device:str = None, block_size: int = 1, speed: float = 1.0):
         """
         Parameters
         ----------
             sample_rate : int
                 in hertz
+            block_size : int
+                samples sent together, ie. 12 like the Muse sends over bluetooth
+            speed : float
+                multiple of real time, None or 0 to send as fast as possible
         """
         super().__init__()
         self._sample_rate = sample_rate
         self._device = device
-    
+        self.pacer = Pacer(sample_rate, block_size=block_size, speed=speed)
+
     async def start(self, duration: int = 0):
-        sample_count = self._sample_rate * duration
+        sample_count = int(self._sample_rate * duration)
 
         if self._device == 'muse':
             channels = ["TP9",  "AF7", "AF8" , "TP10"]
@@ -165,30 +430,21 @@ class FakeEEGDeviceInputStreamer(EEGInputStreamer):
         else:
             channels = ["TP9", "AF7", "AF8", "TP10"]
 
-        # prep filters
+        from scipy import signal
+
+        # prep filters, carrying their state from one block to the next
         sos = signal.butter(2, [.01, 100], 'bandpass', output='sos', fs=self._sample_rate)
+        streaming_filter = StreamingFilter(sos)
+
+        # run one second of data through the filter so subsequent data starts from a settled state
+        streaming_filter(( np.random.rand( self._sample_rate , len(channels) ) * 1000 ) + 200)
+        async for first, count in self.pacer.blocks(sample_count):
+            batch = (np.random.rand( count , len(channels) ) * 1000) + 200
+            y_sos = streaming_filter(batch)
+            await self.send(EEGFrame(y_sos, channels, self.pacer.timestamps(first, count), self._sample_rate))
 
-        # init one second of data for filtering purposes and filter it to match subsequent data
-        last_second = ( np.random.rand( 256 , len(channels) ) * 1000 ) + 200
-        last_second = signal.sosfilt(sos, last_second)
-        samples = 0
-        while not sample_count or samples < sample_count:
-            batch = (np.random.rand( 1 , len(channels) ) * 1000) + 200
-            # last_second = np.delete(last_second, [0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15], 0)
-            last_second = np.delete(last_second, [0], 0)
-            last_second = np.append(last_second, batch, 0)
-            y_sos = signal.sosfilt(sos, last_second)
-
-            data = dict(zip(channels, np.array(y_sos[255, :])))
-            data['packet'] = np.array(y_sos[255, :])
-
-            data = EEGData(data)
-            await self.send(data)
-            samples += 1
-            await asyncio.sleep(1/self._sample_rate)
-      
     async def close(self):
-        pass
+        self.cancel_branches()
 
     async def stop(self):
         pass
@@ -197,43 +453,141 @@ class FakeEEGDeviceInputStreamer(EEGInputStreamer):
 class MuseInputStreamer(EEGInputStreamer):
 
     CHANNELS = ["TP9",  "AF7" , "AF8" , "TP10"]
+    SAMPLE_RATE = 256
 
-    def __init__(self, mac_address, name, interface, event_loop=None, backend='bgapi', disconnect_delay=10):
+    def __init__(self, mac_address, name, interface, event_loop=None, backend='bgapi', disconnect_delay=10,
+                 max_pending: int = 256, max_batch: int = 32, correct_clock: bool = True):
+        """
+        Parameters
+        ----------
+            event_loop : asyncio.AbstractEventLoop
+                the loop data is sent on from, the running loop by default
+            disconnect_delay : float
+                seconds without data before the stream counts as interrupted
+            max_pending : int
+                blocks ( 12 samples each ) waiting for the loop, blocks arriving when it is full are dropped
+            max_batch : int
+                most blocks sent on together as one frame
+            correct_clock : bool
+                map the muse's timestamps onto the host clock with a `ClockCorrector`,
+                fitted against the time each block arrives
+        """
         super().__init__()
         self.event_loop = event_loop
         self._disconnect_delay = disconnect_delay
+        self.blocks = queue.Queue(maxsize=max_pending)
+        self.max_batch = max_batch
+        self.clock = ClockCorrector() if correct_clock else None
+        self.received_blocks = 0
+        self.dropped_blocks = 0
+        self.send_errors = 0
+        self._reported_drops = 0
+        self._wakeup = None
+        self._wakeup_scheduled = False
+        self._stopping = False
+        self._pump_task = None
 
         def push_eeg(data, timestamps):
-            for ii in range(data.shape[1]):
-                packet = data[:, ii]
-                d = dict(zip(self.CHANNELS, packet))
-                d['packet'] = packet[0:4] # the muse comes back with 5 values, even through there are only 4 sensors
-                task = asyncio.run_coroutine_threadsafe(self.send(EEGData(d)), loop=event_loop)
-                # if the outputs downstream have an issue, bubble up through error message
-                # ( raising the exception will cause the muse streamer thread to exit )
+            # called from the bluetooth thread, which must never wait on the pipeline:
+            # the block is only queued here, and sent on from the event loop by `_pump`.
+            # the muse comes back with 5 values, even through there are only 4 sensors
+            self.received_blocks += 1
+            try:
+                self.blocks.put_nowait((np.array(data[0:len(self.CHANNELS), :].T), np.array(timestamps), time()))
+            except queue.Full:
+                self.dropped_blocks += 1
+                return
+            if self._wakeup is not None and not self._wakeup_scheduled:
+                # one wake up for however many blocks arrive before the pump gets to run
+                self._wakeup_scheduled = True
                 try:
-                    r = task.result()
-                except:  # noqa
-                    e = task.exception()
-                    logger.error("".join(traceback.TracebackException.from_exception(e).format()))
+                    self.event_loop.call_soon_threadsafe(self._wake)
+                except RuntimeError:
+                    # the loop has been closed
+                    pass
+
+        # muselsl pulls in pylsl, scikit-learn and more, only the muse input needs it
+        from muselsl.muse import Muse
 
         self.muse = Muse(address=mac_address, callback_eeg=push_eeg, backend=backend, interface=interface, name=name)
 
+    def _wake(self) -> None:
+        self._wakeup_scheduled = False
+        self._wakeup.set()
+
+    async def _drain(self) -> None:
+        while True:
+            blocks = []
+            try:
+                while len(blocks) < self.max_batch:
+                    blocks.append(self.blocks.get_nowait())
+            except queue.Empty:
+                pass
+            if not blocks:
+                return
+
+            if self.dropped_blocks != self._reported_drops:
+                logger.warning(f"dropped {self.dropped_blocks - self._reported_drops} blocks from the muse, "
+                               f"the pipeline is falling behind")
+                self._reported_drops = self.dropped_blocks
+
+            if self.clock is not None:
+                for _, timestamps, arrival in blocks:
+                    self.clock.update(timestamps[-1], arrival)
+            samples = np.concatenate([block for block, _, _ in blocks])
+            timestamps = np.concatenate([timestamps for _, timestamps, _ in blocks])
+            if self.clock is not None:
+                timestamps = self.clock(timestamps)
+            timestamps = to_nanoseconds(timestamps, 's')
+            try:
+                await self.send(EEGFrame(samples, self.CHANNELS, timestamps, self.SAMPLE_RATE))
+            except Exception:  # noqa
+                # the outputs downstream have an issue, the stream carries on
+                self.send_errors += 1
+                logger.exception("could not send muse data downstream")
+
+    async def _pump(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            await self._drain()
+            if self._stopping:
+                return
+
+    async def _stop_pump(self) -> None:
+        if self._pump_task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._pump_task
+        self._pump_task = None
+
     async def start(self, sample_duration: int = 0):
+        if self.event_loop is None:
+            self.event_loop = asyncio.get_running_loop()
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._pump_task = self.event_loop.create_task(self._pump())
+
         is_connected = self.muse.connect()
 
         if is_connected:
             self.muse.start()
 
-            while time() - self.muse.last_timestamp < self._disconnect_delay:
-                try:
-                    await asyncio.sleep(1)
-                except KeyboardInterrupt:
-                    await self.close()
-                    break
+            try:
+                while time() - self.muse.last_timestamp < self._disconnect_delay:
+                    try:
+                        await asyncio.sleep(1)
+                    except KeyboardInterrupt:
+                        await self.close()
+                        break
+            finally:
+                # send on whatever arrived before the stream stopped
+                await self._stop_pump()
             logger.error("no longer receiving data from muse")
             raise DataStreamInterrupted()
         else:
+            await self._stop_pump()
             raise DeviceConnectionFailure()
 
     async def stop(self):
@@ -242,3 +596,4 @@ class MuseInputStreamer(EEGInputStreamer):
     async def close(self):
         self.muse.stop()
         self.muse.disconnect()
+        self.cancel_branches()
@@ -0,0 +1,284 @@
+'''
+Pipeline metrics
+
+Every stage gets a `StageMetrics` the first time data passes through it,
+`deliver` and `FanOut.send` keep them up to date:
+
+    samples_in / samples_out : samples a second, over the last 10 seconds
+    processing               : seconds spent in `receive`, not counting the stages it sends on to
+    latency                  : seconds from the timestamp of the newest sample to it reaching an output
+
+Aggregators take a fixed amount of memory however long a session runs.
+
+    from eegstreamer import metrics
+
+    metrics.snapshot()                              # everything, as a dict
+    await MetricsHttpEndpoint(port=9100).start()    # the same, at http://127.0.0.1:9100/metrics
+'''
+import asyncio
+import bisect
+import math
+import time
+import weakref
+from logging import getLogger
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+logger = getLogger(__name__)
+
+
+class Histogram:
+    '''
+    Counts values into fixed, log spaced buckets
+
+    percentiles are read off the bucket bounds, so they are accurate to the width
+    of a bucket, 19% with the default 4 buckets an octave
+    '''
+
+    def __init__(self, low: float = 1e-6, high: float = 100.0, buckets_per_octave: int = 4):
+        count = int(math.ceil(math.log2(high / low) * buckets_per_octave)) + 1
+        self.bounds = [low * 2 ** (i / buckets_per_octave) for i in range(count)]
+        # one more bucket for anything over `high`
+        self.counts = [0] * (count + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float):
+        '''
+        upper bound of the bucket holding the q-th percentile, None when nothing was recorded
+        '''
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                bound = self.bounds[index] if index < len(self.bounds) else self.max
+                return min(max(bound, self.min), self.max)
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+        }
+
+
+class RateMeter:
+    '''
+    Events a second over the last `window` seconds, counted in a ring of one second buckets
+    '''
+
+    def __init__(self, window: int = 10, clock=time.monotonic):
+        self.window = window
+        self.clock = clock
+        self.buckets = [0] * window
+        self.seconds = [-1] * window
+        self.total = 0
+        self.started = clock()
+
+    def mark(self, count: int = 1) -> None:
+        second = int(self.clock())
+        slot = second % self.window
+        if self.seconds[slot] != second:
+            self.seconds[slot] = second
+            self.buckets[slot] = 0
+        self.buckets[slot] += count
+        self.total += count
+
+    def rate(self) -> float:
+        now = self.clock()
+        second = int(now)
+        # the whole seconds in the window plus the part of the current one gone by
+        span = min(now - self.started, self.window - 1 + now - second)
+        if span <= 0:
+            return 0.0
+        counted = sum(count for count, at in zip(self.buckets, self.seconds) if second - at < self.window)
+        return counted / span
+
+    def snapshot(self) -> dict:
+        return {'rate': self.rate(), 'total': self.total}
+
+
+class StageMetrics:
+
+    def __init__(self, name: str):
+        self.name = name
+        self.samples_in = RateMeter()
+        self.samples_out = RateMeter()
+        self.processing = Histogram()
+        self.latency = Histogram()
+        self.histograms = {}
+        # seconds spent sending on downstream, taken out of this stage's processing time
+        self.downstream = 0.0
+
+    def histogram(self, name: str) -> Histogram:
+        '''
+        a histogram of the stage's own, ie. the analysis time of a transformer
+        '''
+        if name not in self.histograms:
+            self.histograms[name] = Histogram()
+        return self.histograms[name]
+
+    def snapshot(self) -> dict:
+        snapshot = {
+            'samples_in': self.samples_in.snapshot(),
+            'samples_out': self.samples_out.snapshot(),
+            'processing': self.processing.snapshot(),
+            'latency': self.latency.snapshot(),
+        }
+        snapshot.update((name, histogram.snapshot()) for name, histogram in self.histograms.items())
+        return snapshot
+
+
+class MetricsRegistry:
+    '''
+    Keeps the `StageMetrics` of every stage for as long as the stage is around
+
+    set `enabled` to False to stop collecting altogether
+    '''
+
+    def __init__(self):
+        self.enabled = True
+        self._stages = weakref.WeakSet()
+        self._counts = {}
+
+    def stage_metrics(self, stage) -> StageMetrics:
+        try:
+            return stage._metrics
+        except AttributeError:
+            pass
+        kind = type(stage).__name__
+        self._counts[kind] = self._counts.get(kind, 0) + 1
+        stage._metrics = StageMetrics(f"{kind}-{self._counts[kind]}")
+        self._stages.add(stage)
+        return stage._metrics
+
+    def snapshot(self) -> dict:
+        stages = {}
+        for stage in list(self._stages):
+            snapshot = stage._metrics.snapshot()
+            if hasattr(stage, 'branch_stats'):
+                # queue depth and drops of every connected output
+                snapshot['branches'] = stage.branch_stats()
+            stages[stage._metrics.name] = snapshot
+        return {'time': time.time(), 'stages': stages}
+
+
+registry = MetricsRegistry()
+
+
+def stage_metrics(stage) -> StageMetrics:
+    return registry.stage_metrics(stage)
+
+
+def snapshot() -> dict:
+    return registry.snapshot()
+
+
+class MetricsHttpEndpoint:
+    '''
+    Serves the metrics snapshot as json, at http://host:port/metrics
+    '''
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 9100, metrics: MetricsRegistry = registry):
+        self.host = host
+        self.port = port
+        self.metrics = metrics
+        self._runner = None
+
+    async def _snapshot(self, request: 'web.Request') -> 'web.Response':
+        from aiohttp import web
+
+        return web.json_response(self.metrics.snapshot())
+
+    async def start(self) -> None:
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get('/metrics', self._snapshot)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+class MetricsOscReporter:
+    '''
+    Sends a summary of every stage over OSC every `interval` seconds, to `address/stage name`
+
+        [ samples in a second, samples out a second, processing p50, processing p99, latency p50 ]
+
+    times in milliseconds, -1 when nothing has been recorded yet
+    '''
+
+    def __init__(self, ip: str = '127.0.0.1', port: int = 1337, address: str = '/metrics', interval: float = 1.0,
+                 metrics: MetricsRegistry = registry):
+        self.ip = ip
+        self.port = port
+        self.address = address
+        self.interval = interval
+        self.metrics = metrics
+        self.transport = None
+        self._task = None
+
+    def report(self) -> None:
+        # encoders depend on eegstreamer.data, which depends on this module
+        from eegstreamer.encoders import encode_osc_message
+
+        def milliseconds(value):
+            return -1.0 if value is None else value * 1e3
+
+        for name, stage in self.metrics.snapshot()['stages'].items():
+            self.transport.sendto(encode_osc_message(f"{self.address}/{name}", [
+                stage['samples_in']['rate'],
+                stage['samples_out']['rate'],
+                milliseconds(stage['processing']['p50']),
+                milliseconds(stage['processing']['p99']),
+                milliseconds(stage['latency']['p50']),
+            ]))
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.report()
+            except Exception:  # noqa
+                logger.exception("could not report metrics")
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol,
+                                                                remote_addr=(self.ip, self.port))
+        self._task = loop.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
@@ -0,0 +1,157 @@
+'''
+Analyzing whole recordings at once, instead of replaying them through PowerCoherenceEEGTransformer
+
+    recording = read_recording('session.eegb')
+    table = analyze_recording(recording, hop=0.25)
+    write_features(table, 'session.parquet')
+
+Every window the transformer would analyze, `window_length` seconds ending every `hop`
+seconds, is a strided view into the recording, and the windows are analyzed `batch_size`
+at a time with EEGAnalyzer's batched features.  Like the transformer, every window is
+detrended and filtered on its own by default.  With `streaming_filter`, like the
+transformer's, the recording is bandpassed once from start to end instead, and the 1 second
+segments the frontal coherence is averaged over are shared by overlapping windows, so each
+is only transformed once.
+
+The table has a row per window, indexed by the timestamp in nanoseconds of the newest sample
+in the window ( the time the transformer stamps its analysis with ), and a column per feature,
+named like the transformer's output.  Only whole windows of the recording are analyzed, where
+the transformer starts out with a window of simulated EEG; once that has left its window ( or
+with `streaming_filter`, once its filter has settled from it, a few tens of seconds in ), both
+give the same features.
+'''
+import os
+from collections import namedtuple
+from math import gcd
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from eegstreamer.eeg_analysis import EEGAnalyzer
+from eegstreamer.filters import StreamingFilter
+from eegstreamer.inputs import CSVFileInputStreamer, JSONFileInputStreamer
+from eegstreamer.recording import BinaryRecording
+from eegstreamer.transforms import _snakecase
+
+# timestamps in nanoseconds, ( samples x channels ) samples
+Recording = namedtuple('Recording', ['timestamps', 'samples', 'channels', 'sample_rate'])
+
+# recording formats by file extension, anything else is read as json lines
+FORMATS = {'.csv': 'csv', '.eegb': 'binary'}
+
+_READERS = {'json': JSONFileInputStreamer, 'csv': CSVFileInputStreamer}
+
+
+def read_recording(filename: str, sample_rate: float = 256, format: str = None,
+                   timestamp_unit: str = None) -> Recording:
+    '''
+    reads a json lines, csv or binary recording ( by its extension unless `format` says ),
+    binary recordings are memory mapped and carry their own sample rate and nanosecond
+    timestamps, the unit of other recordings' is guessed unless `timestamp_unit` says
+    '''
+    if format is None:
+        format = FORMATS.get(os.path.splitext(filename)[1].lower(), 'json')
+    if format == 'binary':
+        recording = BinaryRecording(filename)
+        return Recording(recording.timestamps, recording.samples, recording.channels, recording.sample_rate)
+    if format not in _READERS:
+        raise ValueError(f"unknown recording format {format}, one of json, csv or binary")
+
+    # the file inputs' own readers, so samples come out exactly as they would be replayed
+    stream = _READERS[format](filename, sample_rate, speed=None, timestamp_unit=timestamp_unit)
+    try:
+        chunks = list(stream.read_chunks())
+    finally:
+        if stream.file_handle:
+            stream.file_handle.close()
+    if not chunks:
+        raise ValueError(f"{filename} has no samples")
+    timestamps = np.concatenate([timestamps for timestamps, _ in chunks])
+    samples = np.concatenate([samples for _, samples in chunks])
+    return Recording(timestamps, samples, tuple(stream.channels), sample_rate)
+
+
+def analyze_recording(recording: Recording, hop: float = 0.25, window_length: float = 5,
+                      streaming_filter: bool = False, batch_size: int = 32) -> pd.DataFrame:
+    '''
+    the features of every window of the recording, a row per window
+
+    every window is detrended and filtered on its own, like the transformer's default,
+    with `streaming_filter` the recording is bandpassed once from start to end
+    '''
+    analyzer = EEGAnalyzer(int(recording.sample_rate), window_length, recording.channels)
+    window_size = analyzer.window_size
+    hop_size = max(1, int(int(recording.sample_rate) * hop))
+    samples = np.asarray(recording.samples)
+
+    # windows end every hop, like the transformer's, and only whole ones are analyzed
+    ends = np.arange(-(-window_size // hop_size) * hop_size, samples.shape[0] + 1, hop_size)
+    if not ends.size:
+        raise ValueError(f"the recording is shorter than a window of {window_length} seconds")
+    first = ends[0] - window_size
+
+    # ( windows x samples x channels ) views into the recording
+    windows = np.swapaxes(sliding_window_view(samples, window_size, axis=0), -1, -2)[first::hop_size]
+    if streaming_filter:
+        filtered = StreamingFilter(analyzer.sos)(samples)
+        filtered_windows = np.swapaxes(sliding_window_view(filtered, window_size, axis=0), -1, -2)[first::hop_size]
+        # segments start every `stride` samples of the recording, as long as sharing them
+        # takes fewer transforms than working them out window by window
+        stride = gcd(hop_size, analyzer.step)
+        if hop_size // stride > analyzer.segment_index.shape[0]:
+            stride = None
+        frontal = filtered[:, analyzer.frontal_pair]
+
+    batches = []
+    for start in range(0, len(windows), batch_size):
+        batch = np.asarray(windows[start:start + batch_size], dtype=np.float64)
+        if not streaming_filter:
+            batches.append(analyzer.features(batch))
+            continue
+        if stride is None:
+            coherence = analyzer.frontal_coherence(filtered_windows[start:start + batch_size])
+        else:
+            coherence = _frontal_coherence(analyzer, frontal, first + hop_size * np.arange(start, start + len(batch)),
+                                           stride)
+        batches.append(analyzer.summarize(analyzer.band_power(batch), coherence))
+
+    bands = np.array(analyzer.bands)
+    columns = {}
+    for key in batches[0]:
+        values = np.concatenate([features[key] for features in batches])
+        if key in ('Coherence Band', 'Power Band'):
+            values = bands[values]
+        columns[_snakecase(key)] = values
+    return pd.DataFrame(columns, index=pd.Index(np.asarray(recording.timestamps)[ends - 1], name='timestamp'))
+
+
+def _frontal_coherence(analyzer: EEGAnalyzer, frontal, starts, stride: int):
+    '''
+    EEGAnalyzer.frontal_coherence of the windows starting at `starts`, from the spectra
+    of the segments starting every `stride` samples of the frontal pair's signals
+    '''
+    end = starts[-1] + analyzer.window_size
+    segments = sliding_window_view(frontal[starts[0]:end], analyzer.nperseg, axis=0)[::stride]
+    spectrum = np.fft.rfft(np.swapaxes(segments, -1, -2) * analyzer.segment_window, axis=-2)
+    x, y = spectrum[..., 0], spectrum[..., 1]
+    # the segments of every window, ( windows x segments )
+    index = ((starts - starts[0])[:, None] + analyzer.segment_index[:, 0]) // stride
+    pxx = np.mean((x.real ** 2 + x.imag ** 2)[index], axis=-2)
+    pyy = np.mean((y.real ** 2 + y.imag ** 2)[index], axis=-2)
+    pxy = np.mean((np.conj(x) * y)[index], axis=-2)
+    return (pxy.real ** 2 + pxy.imag ** 2) / pxx / pyy
+
+
+def write_features(table: pd.DataFrame, filename: str) -> None:
+    '''
+    writes the feature table to a .parquet file, or csv for anything else
+    '''
+    if os.path.splitext(filename)[1].lower() == '.parquet':
+        try:
+            import pyarrow  # noqa
+        except ImportError:
+            raise ImportError("parquet tables need pyarrow, pip install eegstreamer'[parquet]'") from None
+        table.to_parquet(filename)
+    else:
+        table.to_csv(filename)
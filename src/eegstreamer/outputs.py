@@ -1,26 +1,40 @@
+import gzip
 import json
 from abc import ABC, abstractmethod
 import os.path
+from typing import TYPE_CHECKING, Union
 import numpy
 
-from aiohttp import ClientSession
 import asyncio
-from pythonosc.udp_client import SimpleUDPClient
+from logging import getLogger
 from pprint import pprint as pp
 
-from eegstreamer.data import EEGData
+from eegstreamer import HttpPostFailure
+from eegstreamer.data import EEGData, EEGFrame
+from eegstreamer.encoders import csv_header, encode_csv_rows, encode_json_lines, encode_osc_bundle, \
+    encode_osc_message, encode_sample_block, osc_element, osc_frame_layout, OSC_BUNDLE_HEADER_SIZE
+from eegstreamer.recording import RecordingFormatError, encode_header, encode_records, read_header, record_dtype
+from eegstreamer.ring import RingFormatError, SharedRing
+from eegstreamer.writers import BackgroundWriter
 
-import csv
+# aiohttp is only imported by the outputs that use it, so file and osc pipelines start faster
+if TYPE_CHECKING:
+    from aiohttp import ClientSession, web
 
+logger = getLogger(__name__)
 
 
 class EEGOutputStreamer(ABC):
 
+    # outputs that set this handle `EEGFrame` blocks in `receive`,
+    # everything else is fed one `EEGData` sample at a time
+    accepts_frames = False
+
     def __init__(self):
         pass
 
     @abstractmethod
-    async def receive(self, data: dict) -> None:
+    async def receive(self, data: Union[EEGData, EEGFrame]) -> None:
         pass
 
     @abstractmethod
@@ -30,6 +44,8 @@ class EEGOutputStreamer(ABC):
 
 class ScreenEEGOutputStreamer(EEGOutputStreamer):
 
+    accepts_frames = True
+
     def __init__(self):
         super().__init__()
         self.samples_printed = 0
@@ -37,17 +53,29 @@ class ScreenEEGOutputStreamer(EEGOutputStreamer):
     def sample_count(self):
         return self.samples_printed
 
-    async def receive(self, data: EEGData) -> None:
+    async def receive(self, data: Union[EEGData, EEGFrame]) -> None:
         pp(data['packet'])
-        self.samples_printed += 1
+        self.samples_printed += len(data) if isinstance(data, EEGFrame) else 1
 
     def close(self):
         pass
 
 
 class FileOutputStreamer(EEGOutputStreamer, ABC):
+    '''
+    Writes to a file through a `BackgroundWriter`, `receive` only queues the data,
+    it is encoded and written in the writer's thread
+
+    `close` writes out everything still pending
+    '''
 
-    def __init__(self, filename: str, append: bool = False):
+    accepts_frames = True
+
+    # open the file in binary mode, `encode` returns bytes
+    binary = False
+
+    def __init__(self, filename: str, append: bool = False, max_pending: int = 1024, flush_size: int = 1 << 20,
+                 flush_interval: float = 1.0):
         super().__init__()
         self.filename = os.path.abspath(filename)
         if os.path.exists(self.filename) and not append:
@@ -57,103 +85,569 @@ class FileOutputStreamer(EEGOutputStreamer, ABC):
         if not os.path.exists(storage_dir):
             raise NotADirectoryError("'{}' does not exist for writing".format(storage_dir))
         self.file_handle = None
+        self.writer = None
+        self._writer_options = dict(max_pending=max_pending, flush_size=flush_size, flush_interval=flush_interval)
 
     def get_file_handle(self):
-        return open(self.filename, mode='a' if self.append else 'w')
+        return open(self.filename, mode=('a' if self.append else 'w') + ('b' if self.binary else ''))
+
+    def header(self, data: Union[EEGData, EEGFrame]) -> Union[str, bytes, None]:
+        '''
+        written once, ahead of the first data
+        '''
+        return None
+
+    @abstractmethod
+    def encode(self, data: Union[EEGData, EEGFrame]) -> Union[str, bytes]:
+        pass
+
+    async def receive(self, data: Union[EEGData, EEGFrame]) -> None:
+        if not self.writer:
+            self.file_handle = self.get_file_handle()
+            header = self.header(data)
+            if header:
+                self.file_handle.write(header)
+            self.writer = BackgroundWriter(self.file_handle, self.encode, **self._writer_options)
+        await self.writer.put(data)
 
     async def close(self):
-        self.file_handle.close()
+        try:
+            if self.writer:
+                await self.writer.close()
+        finally:
+            if self.file_handle:
+                self.file_handle.close()
         await asyncio.sleep(0)
 
 
 class JSONFileOutputStreamer(FileOutputStreamer):
 
-    async def receive(self, data: EEGData) -> None:
-        if not self.file_handle:
-            self.file_handle = self.get_file_handle()
-
-        self.file_handle.write(data.json())
-        self.file_handle.write("\n")
+    def encode(self, data: Union[EEGData, EEGFrame]) -> str:
+        return encode_json_lines(data)
 
 
 class CSVFileOutputStreamer(FileOutputStreamer):
 
-    def __init__(self, filename, append=False):
-        super().__init__(filename, append)
-        self.csvwriter = None
+    def header(self, data: Union[EEGData, EEGFrame]) -> str:
+        # an existing file already starts with its header
+        if self.append and os.path.exists(self.filename) and os.path.getsize(self.filename):
+            return None
+        return csv_header(EEGFrame.of(data).channels)
 
-    async def receive(self, data: EEGData) -> None:
+    def encode(self, data: Union[EEGData, EEGFrame]) -> str:
+        return encode_csv_rows(data)
 
-        if not self.csvwriter:
 
-            self.file_handle = self.get_file_handle()
-            self.csvwriter = csv.writer(self.file_handle, dialect='unix')
-            self.csvwriter.writerow(["timestamp", "TP9",  "AF7", "AF8", "TP10"])
+class BinaryFileOutputStreamer(FileOutputStreamer):
+    '''
+    Records to the fixed width binary format in `eegstreamer.recording`,
+    each frame is packed into records with a single call
 
-        csv_row = [data.timestamp, ] + data['packet'].tolist()
+    The header is written ahead of the first frame, from its channels.  When appending
+    to an existing recording the channels and dtype have to match its header.
+    '''
 
-        self.csvwriter.writerow(csv_row)
-        await asyncio.sleep(0)
+    binary = True
 
+    def __init__(self, filename: str, append: bool = False, sample_rate: float = 256, dtype: str = '<f4', **kwargs):
+        super().__init__(filename, append, **kwargs)
+        self.sample_rate = sample_rate
+        self.dtype = dtype
+        self.record_dtype = None
 
-class HttpPostEEGOutputStreamer(EEGOutputStreamer):
+    def header(self, data: Union[EEGData, EEGFrame]) -> Union[bytes, None]:
+        frame = EEGFrame.of(data, self.sample_rate)
+        self.record_dtype = record_dtype(len(frame.channels), self.dtype)
+        if self.append and os.path.exists(self.filename) and os.path.getsize(self.filename):
+            with open(self.filename, 'rb') as file_handle:
+                metadata, _ = read_header(file_handle)
+            if tuple(metadata['channels']) != frame.channels or metadata['dtype'] != numpy.dtype(self.dtype).str:
+                raise RecordingFormatError(f"cannot append {frame.channels} as {self.dtype} to '{self.filename}' "
+                                           f"recorded with {metadata['channels']} as {metadata['dtype']}")
+            return None
+        return encode_header(frame.channels, frame.sample_rate or self.sample_rate, self.dtype)
 
-    def __init__(self, endpoint):
+    def encode(self, data: Union[EEGData, EEGFrame]) -> bytes:
+        frame = EEGFrame.of(data, self.sample_rate)
+        return encode_records(frame.timestamps, frame.samples, self.record_dtype)
+
+
+class HttpPostEEGOutputStreamer(EEGOutputStreamer):
+    '''
+    Posts samples to an http endpoint in batches
+
+    Samples are gathered until `batch_size` of them are waiting, or for at most
+    `batch_interval` seconds, and each batch is posted as gzipped json lines ( the
+    lines `JSONFileOutputStreamer` writes ) from a task of its own.  At most
+    `max_in_flight` posts share a pooled connector, a failed post is retried up to
+    `max_retries` times after `backoff` seconds, doubling every time, without ever
+    holding up `receive`.  Once `max_pending` batches are waiting, new batches are
+    dropped and counted.
+
+    `close` posts whatever is left, waits for every post and raises `HttpPostFailure`
+    if any samples could not be delivered.
+    '''
+
+    accepts_frames = True
+
+    def __init__(self, endpoint, batch_size: int = 256, batch_interval: float = 1.0, max_in_flight: int = 4,
+                 max_pending: int = 64, max_retries: int = 3, backoff: float = 0.5, compress_level: int = 6,
+                 timeout: float = 10.0):
+        """
+        Parameters
+        ----------
+            endpoint : str
+                url that batches are posted to
+            batch_size : int
+                samples in a batch
+            batch_interval : float
+                longest time, in seconds, that a sample waits for its batch to fill up
+            max_in_flight : int
+                posts running at the same time
+            max_pending : int
+                batches being posted or waiting to be, before new batches are dropped
+            max_retries : int
+                attempts after the first one, for connection errors, 429 and 5xx responses
+            backoff : float
+                seconds to wait before the first retry
+            compress_level : int
+                gzip level, 0 to send the batches uncompressed
+            timeout : float
+                seconds before a single post is given up on
+        """
         super().__init__()
         self.endpoint = endpoint
-        self.session = ClientSession()
-
-    async def receive(self, data: dict) -> None:
-        response = await self.session.post(self.endpoint, data=json.dumps(data))
-        if response.status != 200:
-            raise Exception()
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.max_in_flight = max_in_flight
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.compress_level = compress_level
+        self.timeout = timeout
+        self.session = None
+        self._slots = None
+        self._batch = []
+        self._batch_samples = 0
+        self._flusher = None
+        self._posts = set()
+        self.batches_sent = 0
+        self.samples_sent = 0
+        self.retries = 0
+        self.dropped = 0
+        self.failed = 0
+        self.last_error = None
+
+    def _get_session(self) -> 'ClientSession':
+        # created on first use, inside the running loop
+        if self.session is None:
+            from aiohttp import ClientSession, ClientTimeout, TCPConnector
+            self.session = ClientSession(connector=TCPConnector(limit=self.max_in_flight),
+                                         timeout=ClientTimeout(total=self.timeout))
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+        return self.session
+
+    async def receive(self, data: Union[EEGData, EEGFrame]) -> None:
+        if self._flusher is None:
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_periodically())
+        self._batch.append(data)
+        self._batch_samples += len(data) if isinstance(data, EEGFrame) else 1
+        if self._batch_samples >= self.batch_size:
+            self._flush()
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.batch_interval)
+            self._flush()
+
+    def _flush(self) -> None:
+        batch, samples = self._batch, self._batch_samples
+        self._batch, self._batch_samples = [], 0
+        if not batch:
+            return
+        if len(self._posts) >= self.max_pending:
+            self.dropped += samples
+            logger.warning(f"{len(self._posts)} batches waiting for {self.endpoint}, dropped {samples} samples")
+            return
+        post = asyncio.get_running_loop().create_task(self._post(batch, samples))
+        self._posts.add(post)
+        post.add_done_callback(self._posts.discard)
+
+    def _encode(self, batch: list) -> bytes:
+        body = "".join(map(encode_json_lines, batch)).encode('utf-8')
+        return gzip.compress(body, self.compress_level) if self.compress_level else body
+
+    async def _post(self, batch: list, samples: int) -> None:
+        body = await asyncio.get_running_loop().run_in_executor(None, self._encode, batch)
+        headers = {'Content-Type': 'application/x-ndjson'}
+        if self.compress_level:
+            headers['Content-Encoding'] = 'gzip'
+
+        from aiohttp import ClientError
+
+        session = self._get_session()
+        async with self._slots:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    async with session.post(self.endpoint, data=body, headers=headers) as response:
+                        if response.status < 300:
+                            self.batches_sent += 1
+                            self.samples_sent += samples
+                            return
+                        error = HttpPostFailure(f"{self.endpoint} responded with {response.status}")
+                        if response.status < 500 and response.status != 429:
+                            break
+                except (ClientError, asyncio.TimeoutError) as e:
+                    error = e
+                if attempt < self.max_retries:
+                    self.retries += 1
+                    await asyncio.sleep(self.backoff * 2 ** attempt)
+
+        self.failed += samples
+        self.last_error = error
+        logger.error(f"could not post {samples} samples to {self.endpoint}: {error!r}")
 
     async def close(self):
-        await self.session.close()
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        self._flush()
+        await asyncio.gather(*self._posts)
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        if self.failed:
+            raise HttpPostFailure(f"{self.failed} samples could not be posted to {self.endpoint}") \
+                from self.last_error
+
+
+class WebsocketSubscriber:
+    '''
+    One connected websocket client, fed from its own bounded queue by its own task
+
+    when the queue is full new messages are dropped, a slow client only ever misses data.
+    A client that can't be sent to is closed and stops taking messages
+    '''
+
+    def __init__(self, socket, decimate: int = 1, channels: tuple = None, queue_size: int = 64):
+        self.socket = socket
+        self.decimate = decimate
+        self.channels = channels
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.layout = None
+        self.sent = 0
+        self.dropped = 0
+        self.closed = False
+
+    @property
+    def profile(self) -> tuple:
+        return self.decimate, self.channels
+
+    def offer(self, message: Union[str, bytes]) -> bool:
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    async def run(self) -> None:
+        while True:
+            message = await self.queue.get()
+            try:
+                if isinstance(message, str):
+                    await self.socket.send_str(message)
+                else:
+                    await self.socket.send_bytes(message)
+                self.sent += 1
+            except Exception as e:  # noqa
+                logger.warning(f"could not send to a websocket client, closing it: {e!r}")
+                self.closed = True
+                break
+            finally:
+                self.queue.task_done()
+        try:
+            await self.socket.close()
+        except Exception:  # noqa
+            pass
+
+    def stats(self) -> dict:
+        return {
+            'decimate': self.decimate,
+            'channels': self.channels,
+            'depth': self.queue.qsize(),
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'closed': self.closed,
+        }
 
 
 class WebsocketEEGOutputStreamer(EEGOutputStreamer):
+    '''
+    Broadcasts samples to any number of websocket clients, ie. browser dashboards
 
-    def __init__(self):
-        super().__init__()
+        ws://host:port/eeg?decimate=4&channels=AF7,AF8
 
-    async def receive(self, data: dict) -> None:
-        pass
+    `decimate` keeps every n-th sample, counted from the first sample the output received,
+    so every client asking for the same rate gets the same samples, `channels` picks a subset.
+    Before its first block a client is sent its layout as json text
+
+        {"channels": ["AF7", "AF8"], "sample_rate": 64.0, "decimate": 4}
+
+    then blocks of samples as binary messages ( see `encoders.encode_sample_block` ).  A block is
+    encoded once for every distinct ( decimate, channels ) asked for and shared by those clients.
+    Anything that is not a frame is sent to every client as its json text.
+
+    The server starts on the first data received, or with `start`.
+    '''
+
+    accepts_frames = True
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8765, path: str = '/eeg', queue_size: int = 64):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.path = path
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.sample_index = 0
+        self._runner = None
+        self._senders = {}
+
+    async def start(self) -> None:
+        if self._runner is not None:
+            return
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get(self.path, self._subscribe)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def _subscribe(self, request: 'web.Request') -> 'web.StreamResponse':
+        from aiohttp import web
+
+        try:
+            decimate = max(1, int(request.query.get('decimate', 1)))
+        except ValueError:
+            raise web.HTTPBadRequest(text="decimate has to be a whole number")
+        channels = tuple(channel for channel in request.query.get('channels', '').split(',') if channel) or None
+
+        socket = web.WebSocketResponse()
+        await socket.prepare(request)
+        subscriber = WebsocketSubscriber(socket, decimate, channels, self.queue_size)
+        self._add(subscriber)
+        try:
+            # clients only listen, reading just notices when they go away
+            async for _ in socket:
+                pass
+        finally:
+            self.subscribers.discard(subscriber)
+            sender = self._senders.pop(subscriber, None)
+            if sender:
+                sender.cancel()
+        return socket
+
+    def _add(self, subscriber: WebsocketSubscriber) -> None:
+        self.subscribers.add(subscriber)
+        sender = asyncio.get_running_loop().create_task(subscriber.run())
+        # a client that could not be sent to is dropped straight away, not when it disconnects
+        sender.add_done_callback(lambda _: self.subscribers.discard(subscriber))
+        self._senders[subscriber] = sender
+
+    def _encode(self, frame: EEGFrame, first_index: int, decimate: int, channels: tuple) -> tuple:
+        first = -first_index % decimate
+        if first >= len(frame):
+            return None, None
+        columns = list(range(len(frame.channels)))
+        if channels:
+            columns = [frame.channels.index(channel) for channel in channels if channel in frame.channels]
+        sample_rate = frame.sample_rate / decimate if frame.sample_rate else 0.0
+        layout = json.dumps({
+            'channels': [frame.channels[column] for column in columns],
+            'sample_rate': sample_rate,
+            'decimate': decimate,
+        })
+        block = encode_sample_block(frame.timestamps[first::decimate], frame.samples[first::decimate, columns],
+                                    sample_rate)
+        return layout, block
+
+    async def receive(self, data: Union[EEGData, EEGFrame]) -> None:
+        await self.start()
+
+        if not isinstance(data, EEGFrame):
+            message = data.json()
+            for subscriber in list(self.subscribers):
+                subscriber.offer(message)
+            return
+
+        first_index = self.sample_index
+        self.sample_index += len(data)
+        encoded = {}
+        for subscriber in list(self.subscribers):
+            profile = subscriber.profile
+            if profile not in encoded:
+                encoded[profile] = self._encode(data, first_index, *profile)
+            layout, block = encoded[profile]
+            if block is None:
+                continue
+            if subscriber.layout != layout:
+                if not subscriber.offer(layout):
+                    continue
+                subscriber.layout = layout
+            subscriber.offer(block)
+
+    def subscriber_stats(self) -> list:
+        return [subscriber.stats() for subscriber in self.subscribers]
+
+    async def close(self, timeout: float = 1.0):
+        # give every client a moment to be sent what is queued for it
+        for subscriber in list(self.subscribers):
+            try:
+                await asyncio.wait_for(subscriber.queue.join(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            await subscriber.socket.close()
+        senders = list(self._senders.values())
+        self._senders.clear()
+        for sender in senders:
+            sender.cancel()
+        await asyncio.gather(*senders, return_exceptions=True)
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+class SharedMemoryOutputStreamer(EEGOutputStreamer):
+    '''
+    Writes blocks of samples into a ring in shared memory ( see `eegstreamer.ring` ),
+    for any number of processes on the same machine to read with `SharedMemoryInputStreamer`
+
+    The ring is created with the channels of the first frame, and a block is copied
+    in with one assignment, nothing is encoded.  Readers are never waited for, one
+    that falls `capacity` samples behind finds out from the write sequence.
+    `close` marks the ring as finished and removes it.
+    '''
+
+    accepts_frames = True
+
+    def __init__(self, name: str = 'eegstreamer', capacity: int = 65536, sample_rate: float = 256,
+                 dtype: str = '<f8'):
+        """
+        Parameters
+        ----------
+            name : str
+                name of the shared memory segment, readers attach to it by this name
+            capacity : int
+                samples the ring holds, 65536 is over 4 minutes at 256 Hz
+            sample_rate : float
+                in hertz, when the frames don't say
+            dtype : str
+                of the samples in the ring, float64 by default so readers get frames without a conversion
+        """
+        super().__init__()
+        self.name = name
+        self.capacity = capacity
+        self.sample_rate = sample_rate
+        self.dtype = dtype
+        self.ring = None
+
+    async def receive(self, data: Union[EEGData, EEGFrame]) -> None:
+        frame = EEGFrame.of(data, self.sample_rate)
+        if self.ring is None:
+            self.ring = SharedRing.create(self.name, frame.channels, frame.sample_rate or self.sample_rate,
+                                          self.capacity, self.dtype)
+        elif frame.channels != self.ring.channels:
+            raise RingFormatError(f"cannot write {frame.channels} to the ring {self.name} of {self.ring.channels}")
+        self.ring.write(frame.timestamps, frame.samples)
 
     async def close(self):
-        pass
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
 
 
 class OscOutputStreamer(EEGOutputStreamer):
+    '''
+    Sends samples as OSC messages over UDP, through a non-blocking asyncio datagram transport
 
-    clients = {}
+    every sample is sent to `address` as a packet of all channels and, with `multi_channel`,
+    to `address/channel` once for each channel.  With `bundle` the messages of a whole block
+    are packed into timestamped OSC bundles of up to `max_bundle_size` bytes instead of a
+    datagram per message, the timetag of a bundle is the time of its first sample
+    '''
 
-    def __init__(self, ip='127.0.0.1', port=1337, address="/eeg", multi_channel=True):
+    accepts_frames = True
+
+    def __init__(self, ip='127.0.0.1', port=1337, address="/eeg", multi_channel=True, bundle: bool = False,
+                 max_bundle_size: int = 8192):
         super().__init__()
         self._ip = ip
         self._port = port
         self._address = address
         self._multi_channel = multi_channel
-
-        if port not in self.clients:
-            self.clients[port] = SimpleUDPClient(self._ip, self._port)  # Create client
+        self._bundle = bundle
+        self._max_bundle_size = max_bundle_size
+        self.transport = None
+        self.datagrams_sent = 0
 
     VALID_TYPES = [list, tuple, int, float, numpy.float64, numpy.ndarray, str]
 
-    async def receive(self, data: EEGData) -> None:
+    async def _get_transport(self):
+        if self.transport is None:
+            loop = asyncio.get_running_loop()
+            self.transport, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol,
+                                                                    remote_addr=(self._ip, self._port))
+        return self.transport
+
+    def _sendto(self, datagram: bytes) -> None:
+        self.transport.sendto(datagram)
+        self.datagrams_sent += 1
+
+    async def receive(self, data: Union[EEGData, EEGFrame]) -> None:
+        await self._get_transport()
+
+        if isinstance(data, EEGFrame):
+            self._send_frame(data)
+        else:
+            self._send_sample(data)
 
+        await asyncio.sleep(0)
+
+    def _send_frame(self, frame: EEGFrame):
+        layout = osc_frame_layout(self._address, frame.channels, self._multi_channel)
+        encoded = layout.encode(frame.samples)
+
+        if self._bundle:
+            per_bundle = max(1, (self._max_bundle_size - OSC_BUNDLE_HEADER_SIZE) // layout.size)
+            for first in range(0, len(frame), per_bundle):
+                self._sendto(encode_osc_bundle(frame.timestamps[first], [encoded[first:first + per_bundle].tobytes()]))
+        else:
+            for row in encoded:
+                row = row.tobytes()
+                for start, end in layout.messages:
+                    self._sendto(row[start:end])
+
+    def _send_sample(self, data: EEGData):
+        messages = []
         for key, value in data.items():
             if key == 'packet' and type(value) in self.VALID_TYPES:
-                for client in self.clients.values():
-                    client.send_message(self._address, data['packet'])
+                values = value if isinstance(value, (list, tuple, numpy.ndarray)) else [value, ]
+                messages.append(encode_osc_message(self._address, values))
             elif type(value) in self.VALID_TYPES and self._multi_channel:
-                address = f"{self._address}/{key}"
-                for client in self.clients.values():
-                    client.send_message(address, [value, ])
+                messages.append(encode_osc_message(f"{self._address}/{key}", [value, ]))
             else:
                 raise ValueError("sending an incompatible data type of '{}' for '{}'".format(type(value), key))
 
-        await asyncio.sleep(0)
+        if self._bundle:
+            self._sendto(encode_osc_bundle(data._timestamp, [osc_element(message) for message in messages]))
+        else:
+            for message in messages:
+                self._sendto(message)
 
     async def close(self):
-        pass
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+        await asyncio.sleep(0)
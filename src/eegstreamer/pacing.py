@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+import numpy as np
+
+
+class Pacer:
+    '''
+    Paces a stream of samples against absolute deadlines
+
+    Sleeping for one sample period after every send makes a stream run slow,
+    every send and every late wake-up adds to the period, and the error keeps
+    adding up over a session.  The pacer schedules sample `i` at
+    `start + i / sample_rate` instead, so time spent sending is absorbed and
+    a stream that was held up catches up with a bigger block.
+
+        pacer = Pacer(256, block_size=8)
+        async for first, count in pacer.blocks(sample_count):
+            ... send samples first to first + count
+
+    `speed` scales the rate ( 10 replays ten times faster than real time ),
+    a `speed` of None or 0 does not pace at all, for replays and load tests.
+    '''
+
+    def __init__(self, sample_rate: float, block_size: int = 1, speed: float = 1.0, max_block: int = None):
+        '''
+        Parameters
+        ----------
+            sample_rate : float
+                in hertz
+            block_size : int
+                samples emitted per wake-up when on schedule
+            speed : float
+                multiple of real time, None or 0 for as fast as possible
+            max_block : int
+                upper limit on a catch up block, defaults to one second of samples
+        '''
+        self.sample_rate = sample_rate
+        self.block_size = max(1, int(block_size))
+        self.speed = speed
+        self.max_block = max(self.block_size, int(max_block or sample_rate))
+        self.start_ns = None
+        self.emitted = 0
+
+    @property
+    def paced(self) -> bool:
+        return bool(self.speed)
+
+    async def blocks(self, sample_count: int = 0):
+        '''
+        yields ( index of the first sample, number of samples ) every time a block is due
+
+        a `sample_count` of 0 keeps going until the consumer stops iterating
+        '''
+        # durations can be fractions of a second, blocks are whole samples
+        sample_count = int(sample_count or 0)
+        loop = asyncio.get_running_loop()
+        rate = self.sample_rate * self.speed if self.paced else None
+        start = loop.time()
+        self.start_ns = time.time_ns()
+        self.emitted = 0
+
+        while not sample_count or self.emitted < sample_count:
+            if rate:
+                # a block is due once the last of its samples is
+                deadline = start + (self.emitted + self.block_size - 1) / rate
+                delay = deadline - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                due = int((loop.time() - start) * rate) + 1 - self.emitted
+                count = min(max(due, self.block_size), self.max_block)
+            else:
+                count = self.block_size
+                # let the rest of the loop run between blocks
+                await asyncio.sleep(0)
+
+            if sample_count:
+                count = min(count, sample_count - self.emitted)
+            yield self.emitted, count
+            self.emitted += count
+
+        if rate:
+            # hold until the period of the last sample is over
+            delay = start + self.emitted / rate - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    def timestamps(self, first: int, count: int):
+        '''
+        scheduled times, in nanoseconds, of samples `first` to `first + count`
+
+        None when unpaced, so frames are stamped when they are made
+        '''
+        if not self.paced or self.start_ns is None:
+            return None
+        period = 1e9 / (self.sample_rate * self.speed)
+        return self.start_ns + (np.arange(first, first + count) * period).astype(np.int64)
@@ -0,0 +1,105 @@
+'''
+Binary EEG recordings
+
+    magic           8 bytes     b'EEGSTRM\\0'
+    version         uint16
+    reserved        uint16
+    header length   uint32      bytes before the first record, a multiple of 64
+    metadata        utf-8 json  {"channels": [...], "sample_rate": 256, "dtype": "<f4"}
+    padding         zeros up to the header length
+
+followed by fixed width records, one per sample
+
+    timestamp       int64       nanoseconds
+    samples         dtype x channels
+'''
+import json
+import struct
+
+import numpy as np
+
+
+MAGIC = b'EEGSTRM\0'
+VERSION = 1
+_PREFIX = struct.Struct('<8sHHI')
+_ALIGNMENT = 64
+
+
+class RecordingFormatError(ValueError):
+    pass
+
+
+def record_dtype(channel_count: int, dtype: str = '<f4') -> np.dtype:
+    return np.dtype([('timestamp', '<i8'), ('samples', dtype, (channel_count,))])
+
+
+def encode_header(channels, sample_rate: float, dtype: str = '<f4') -> bytes:
+    metadata = json.dumps({
+        'channels': list(channels),
+        'sample_rate': sample_rate,
+        'dtype': np.dtype(dtype).str,
+    }).encode('utf-8')
+    length = _PREFIX.size + len(metadata)
+    length += -length % _ALIGNMENT
+    header = _PREFIX.pack(MAGIC, VERSION, 0, length) + metadata
+    return header + b'\0' * (length - len(header))
+
+
+def read_header(file_handle) -> tuple:
+    '''
+    reads the header at the start of an open binary file, returning ( metadata, header length )
+    '''
+    prefix = file_handle.read(_PREFIX.size)
+    if len(prefix) < _PREFIX.size:
+        raise RecordingFormatError("file is too short to be a recording")
+    magic, version, _, length = _PREFIX.unpack(prefix)
+    if magic != MAGIC:
+        raise RecordingFormatError("not an eegstreamer recording")
+    if version > VERSION:
+        raise RecordingFormatError(f"recording version {version} is newer than this reader ({VERSION})")
+    metadata = json.loads(file_handle.read(length - _PREFIX.size).rstrip(b'\0').decode('utf-8'))
+    return metadata, length
+
+
+class BinaryRecording:
+    '''
+    A binary recording, memory mapped so any sample can be reached in O(1)
+    without reading the rest of the file
+
+        recording = BinaryRecording('session.eegb')
+        recording.samples[ 256 * 60 : 256 * 61 ]   # the 2nd minute, as a view into the file
+    '''
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as file_handle:
+            metadata, self.header_length = read_header(file_handle)
+        self.channels = tuple(metadata['channels'])
+        self.sample_rate = metadata['sample_rate']
+        self.dtype = record_dtype(len(self.channels), metadata['dtype'])
+        self.records = np.memmap(filename, dtype=self.dtype, mode='r', offset=self.header_length)
+
+    def __len__(self):
+        return self.records.shape[0]
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self.records['timestamp']
+
+    @property
+    def samples(self) -> np.ndarray:
+        return self.records['samples']
+
+    def close(self) -> None:
+        # numpy unmaps the file once the last view of it is gone
+        self.records = None
+
+
+def encode_records(timestamps, samples, dtype: np.dtype) -> bytes:
+    '''
+    packs a block of samples into fixed width records in one pass
+    '''
+    records = np.empty(len(timestamps), dtype=dtype)
+    records['timestamp'] = timestamps
+    records['samples'] = samples
+    return records.tobytes()
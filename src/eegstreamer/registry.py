@@ -0,0 +1,65 @@
+'''
+Stages by name
+
+Graphs and the command line name stages rather than import them, so the
+registry only keeps where every stage lives, as 'module:Class', and a stage's
+module is imported the first time it is asked for.
+
+    from eegstreamer import registry
+
+    registry.resolve('OscOutputStreamer')               # eegstreamer.outputs is imported here
+    registry.register('MyFilter', 'mypackage.filters:MyFilter')
+    registry.resolve('mypackage.filters:MyFilter')      # anything importable works without registering
+'''
+import importlib
+
+STAGES = {
+    # inputs
+    'RandomEEGInputStream': 'eegstreamer.inputs:RandomEEGInputStream',
+    'JSONFileInputStreamer': 'eegstreamer.inputs:JSONFileInputStreamer',
+    'CSVFileInputStreamer': 'eegstreamer.inputs:CSVFileInputStreamer',
+    'BinaryFileInputStreamer': 'eegstreamer.inputs:BinaryFileInputStreamer',
+    'SharedMemoryInputStreamer': 'eegstreamer.inputs:SharedMemoryInputStreamer',
+    'FakeEEGDeviceInputStreamer': 'eegstreamer.inputs:FakeEEGDeviceInputStreamer',
+    'MuseInputStreamer': 'eegstreamer.inputs:MuseInputStreamer',
+    # transforms
+    'ConstantFactorEEGTransformer': 'eegstreamer.transforms:ConstantFactorEEGTransformer',
+    'StreamingFilterTransformer': 'eegstreamer.transforms:StreamingFilterTransformer',
+    'DownSampleEEGTransformer': 'eegstreamer.transforms:DownSampleEEGTransformer',
+    'PowerCoherenceEEGTransformer': 'eegstreamer.transforms:PowerCoherenceEEGTransformer',
+    # outputs
+    'ScreenEEGOutputStreamer': 'eegstreamer.outputs:ScreenEEGOutputStreamer',
+    'JSONFileOutputStreamer': 'eegstreamer.outputs:JSONFileOutputStreamer',
+    'CSVFileOutputStreamer': 'eegstreamer.outputs:CSVFileOutputStreamer',
+    'BinaryFileOutputStreamer': 'eegstreamer.outputs:BinaryFileOutputStreamer',
+    'HttpPostEEGOutputStreamer': 'eegstreamer.outputs:HttpPostEEGOutputStreamer',
+    'WebsocketEEGOutputStreamer': 'eegstreamer.outputs:WebsocketEEGOutputStreamer',
+    'SharedMemoryOutputStreamer': 'eegstreamer.outputs:SharedMemoryOutputStreamer',
+    'OscOutputStreamer': 'eegstreamer.outputs:OscOutputStreamer',
+}
+
+
+def register(name: str, target: str) -> None:
+    '''
+    makes the stage `target`, 'module:Class', available as `name`
+    '''
+    if ':' not in target:
+        raise ValueError(f"stages are registered as 'module:Class', not {target}")
+    STAGES[name] = target
+
+
+def resolve(name: str):
+    '''
+    the class of a registered stage, or of 'module:Class', importing its module if need be
+
+    raises LookupError for names that are not registered, and ImportError when
+    the module or the class can't be imported
+    '''
+    target = name if ':' in name else STAGES.get(name)
+    if target is None:
+        raise LookupError(f"no stage is registered as {name}")
+    module, _, attribute = target.partition(':')
+    try:
+        return getattr(importlib.import_module(module), attribute)
+    except AttributeError:
+        raise ImportError(f"{module} has no {attribute}") from None
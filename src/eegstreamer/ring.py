@@ -0,0 +1,200 @@
+'''
+Rings of EEG samples in shared memory
+
+One process writes blocks of samples into a ring in shared memory and any number
+of processes on the same machine read them straight out of it, without anything
+being serialized or sent over a socket
+
+    magic           8 bytes     b'EEGRING\\0'
+    version         uint16
+    reserved        uint16
+    header length   uint32      bytes before the timestamps, a multiple of 64
+    capacity        int64       samples the ring holds
+    write sequence  int64       samples written so far
+    closed          int64       1 once the writer is done
+    writing up to   int64       samples written so far, with the block being written ( version 2 on )
+    metadata        utf-8 json  {"channels": [...], "sample_rate": 256, "dtype": "<f8"}
+    padding         zeros up to the header length
+
+followed by `capacity` int64 timestamps in nanoseconds, then `capacity` x channels
+samples, with sample n of the stream kept at n % capacity.
+
+The writer moves `writing up to` on, copies a block in and only then moves the write
+sequence on, so readers never see samples that are not there yet.  Readers keep their
+own position and never hold the writer up: one that falls more than `capacity` samples
+behind has lost the oldest of them, and knows how many from the write sequence.  Like a
+seqlock, a reader checks `writing up to` once it has what it read: if the writer has
+started on the slots since, what it read may be torn.
+'''
+import json
+import struct
+from logging import getLogger
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+logger = getLogger(__name__)
+
+MAGIC = b'EEGRING\0'
+VERSION = 2
+_PREFIX = struct.Struct('<8sHHIqqqq')
+# before the `writing up to` counter
+_PREFIX_V1 = struct.Struct('<8sHHIqqq')
+_COUNTERS = 16
+_ALIGNMENT = 64
+
+
+# rings created by this process, which the resource tracker has to keep unlinking if the writer dies
+_created = set()
+
+
+class RingFormatError(ValueError):
+    pass
+
+
+class SharedRing:
+    '''
+    A ring of samples in a named shared memory segment
+
+        ring = SharedRing.create('eegstreamer', channels, sample_rate=256, capacity=65536)
+        ring.write(timestamps, samples)
+
+        ring = SharedRing.attach('eegstreamer')
+        timestamps, samples = ring.read(position, count)    # views into the shared memory
+    '''
+
+    def __init__(self, memory: shared_memory.SharedMemory, owner: bool):
+        self.memory = memory
+        self.owner = owner
+        magic, version, _, self.header_length, self.capacity, _, _ = _PREFIX_V1.unpack_from(memory.buf)
+        if magic != MAGIC:
+            raise RingFormatError(f"{memory.name} is not an eegstreamer ring")
+        if version > VERSION:
+            raise RingFormatError(f"ring version {version} is newer than this reader ({VERSION})")
+        prefix = _PREFIX if version >= 2 else _PREFIX_V1
+        metadata = json.loads(bytes(memory.buf[prefix.size:self.header_length]).rstrip(b'\0').decode('utf-8'))
+        self.channels = tuple(metadata['channels'])
+        self.sample_rate = metadata['sample_rate']
+        self.dtype = np.dtype(metadata['dtype'])
+
+        # capacity, write sequence, closed and writing up to, which version 1 rings don't have
+        self._counters = np.ndarray((4 if version >= 2 else 3,), dtype='<i8', buffer=memory.buf, offset=_COUNTERS)
+        self._writing = 3 if version >= 2 else 1
+        self.timestamps = np.ndarray((self.capacity,), dtype='<i8', buffer=memory.buf, offset=self.header_length)
+        self.samples = np.ndarray((self.capacity, len(self.channels)), dtype=self.dtype, buffer=memory.buf,
+                                  offset=self.header_length + _aligned(8 * self.capacity))
+
+    @classmethod
+    def create(cls, name: str, channels, sample_rate: float, capacity: int = 65536,
+               dtype: str = '<f8') -> 'SharedRing':
+        metadata = json.dumps({
+            'channels': list(channels),
+            'sample_rate': sample_rate,
+            'dtype': np.dtype(dtype).str,
+        }).encode('utf-8')
+        header_length = _aligned(_PREFIX.size + len(metadata))
+        size = header_length + _aligned(8 * capacity) + capacity * len(channels) * np.dtype(dtype).itemsize
+        try:
+            memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # left behind by a writer that did not get to close
+            logger.warning(f"replacing the shared memory ring {name} left by an earlier writer")
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _PREFIX.pack_into(memory.buf, 0, MAGIC, VERSION, 0, header_length, capacity, 0, 0, 0)
+        _created.add(memory._name)
+        memory.buf[_PREFIX.size:_PREFIX.size + len(metadata)] = metadata
+        return cls(memory, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> 'SharedRing':
+        '''
+        opens the ring another process created, raises FileNotFoundError when there is none yet
+        '''
+        return cls(_open_untracked(name), owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+    @property
+    def write_sequence(self) -> int:
+        return int(self._counters[1])
+
+    @property
+    def writing_sequence(self) -> int:
+        '''
+        the write sequence the block being written will move it to, samples from
+        `writing_sequence - capacity` on may already have been overwritten
+        '''
+        return int(self._counters[self._writing])
+
+    @property
+    def closed(self) -> bool:
+        return bool(self._counters[2])
+
+    def write(self, timestamps, samples) -> None:
+        '''
+        appends a block, only the newest `capacity` samples of a larger block are kept
+        '''
+        count = len(timestamps)
+        sequence = int(self._counters[1])
+        # announced before any slot is touched, so readers can tell their copy may be torn
+        self._counters[3] = sequence + count
+        if count > self.capacity:
+            timestamps, samples = timestamps[-self.capacity:], samples[-self.capacity:]
+        start = (sequence + count - len(timestamps)) % self.capacity
+        first = min(len(timestamps), self.capacity - start)
+        self.timestamps[start:start + first] = timestamps[:first]
+        self.samples[start:start + first] = samples[:first]
+        if first < len(timestamps):
+            self.timestamps[:len(timestamps) - first] = timestamps[first:]
+            self.samples[:len(timestamps) - first] = samples[first:]
+        # published only once the samples are in place
+        self._counters[1] = sequence + count
+
+    def read(self, position: int, count: int) -> tuple:
+        '''
+        views of the timestamps and samples from `position` in the stream, at most `count`
+        of them and never past the end of the ring, so read again for the rest
+        '''
+        start = position % self.capacity
+        end = start + min(count, self.capacity - start)
+        return self.timestamps[start:end], self.samples[start:end]
+
+    def close(self) -> None:
+        '''
+        the writer marks the ring as finished and removes it, readers attached to it keep
+        their mapping until they close
+        '''
+        if self.owner:
+            self._counters[2] = 1
+        self._counters = self.timestamps = self.samples = None
+        try:
+            self.memory.close()
+        except BufferError:
+            # frames still being held on to are views into the ring, the mapping
+            # goes away with them
+            logger.debug(f"frames from the shared memory ring {self.name} are still in use")
+        if self.owner:
+            self.memory.unlink()
+            _created.discard(self.memory._name)
+
+
+def _open_untracked(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    # before python 3.13 every segment opened is registered with the resource tracker,
+    # which unlinks it from under the writer when the reader exits
+    memory = shared_memory.SharedMemory(name=name)
+    if memory._name not in _created:
+        resource_tracker.unregister(memory._name, 'shared_memory')
+    return memory
+
+
+def _aligned(size: int) -> int:
+    return size + -size % _ALIGNMENT
@@ -0,0 +1,157 @@
+import numpy as np
+
+from eegstreamer.buffers import RingBuffer
+
+
+class SlidingWelch:
+    '''
+    Welch estimate of the power and cross spectra over a sliding window,
+    updated incrementally as samples arrive
+
+    The window is cut into segments of `nperseg` samples, `step` samples
+    apart.  The FFT of each segment is taken once, when the segment is
+    complete, and its auto ( and cross ) spectra are kept in a ring of
+    `n_segments` entries with a running sum.  Pushing a hop of data only
+    transforms the segments that hop completes and retires the ones that
+    fell out of the window, so the cost of an update no longer depends on
+    the window length.
+
+        estimator = SlidingWelch( 256, window_size=1280, nperseg=256, step=64, channels=4, pairs=[(1, 2)] )
+        estimator.push( block )
+        estimator.psd(), estimator.coherence()
+    '''
+
+    def __init__(self, sample_rate: float, window_size: int, nperseg: int, step: int, channels: int,
+                 pairs=(), window='hann', detrend: bool = False):
+        '''
+        Parameters
+        ----------
+            sample_rate : float
+                in hertz
+            window_size : int
+                number of samples the estimate covers
+            nperseg : int
+                samples per segment
+            step : int
+                samples between the starts of consecutive segments
+            channels : int
+                number of columns in the pushed data
+            pairs : list of (int, int)
+                column pairs to keep cross spectra for
+            window : str
+                scipy window applied to every segment
+            detrend : bool
+                remove the mean of every segment before the FFT
+        '''
+        from scipy import signal
+
+        if nperseg > window_size:
+            raise ValueError(f"segments of {nperseg} samples do not fit a window of {window_size}")
+        self.sample_rate = sample_rate
+        self.nperseg = int(nperseg)
+        self.step = int(step)
+        self.channels = int(channels)
+        self.pairs = [tuple(pair) for pair in pairs]
+        # columns of the first and second channel of every pair, so all cross spectra are one product
+        self._left = np.array([i for i, _ in self.pairs], dtype=np.intp)
+        self._right = np.array([j for _, j in self.pairs], dtype=np.intp)
+        self.detrend = detrend
+        self.n_segments = (int(window_size) - self.nperseg) // self.step + 1
+
+        self.window = signal.get_window(window, self.nperseg)[:, None]
+        self.freqs = np.fft.rfftfreq(self.nperseg, 1 / sample_rate)
+        # density scaling of a one-sided spectrum
+        self.scale = np.full(self.freqs.shape, 2 / (sample_rate * np.sum(self.window ** 2)))
+        self.scale[0] /= 2
+        if self.nperseg % 2 == 0:
+            self.scale[-1] /= 2
+
+        n_freqs = self.freqs.shape[0]
+        self._auto = np.zeros((self.n_segments, n_freqs, self.channels))
+        self._cross = np.zeros((self.n_segments, n_freqs, len(self.pairs)), dtype=np.complex128)
+        self._auto_sum = np.zeros((n_freqs, self.channels))
+        self._cross_sum = np.zeros((n_freqs, len(self.pairs)), dtype=np.complex128)
+        self._next = 0
+        self._updates = 0
+        self.segments = 0
+
+        # the samples a segment that is not complete yet will need
+        self._history = RingBuffer(self.nperseg, self.channels)
+        self.count = 0
+
+    def push(self, block) -> int:
+        '''
+        adds a (samples x channels) block, returning how many segments it completed
+        '''
+        block = np.asarray(block, dtype=np.float64)
+        if block.ndim == 1:
+            block = block.reshape(1, -1)
+        before = self.count
+        after = before + block.shape[0]
+
+        # segment k covers samples [ k * step, k * step + nperseg )
+        first = max(0, -(-(before + 1 - self.nperseg) // self.step))
+        last = (after - self.nperseg) // self.step
+        completed = 0
+        if last >= first:
+            history = self._history.view()
+            data = np.concatenate((history, block)) if len(history) else block
+            origin = before - len(history)
+            # only the segments still inside the window are worth transforming
+            first = max(first, last - self.n_segments + 1)
+            starts = np.arange(first, last + 1) * self.step - origin
+            segments = data[starts[:, None] + np.arange(self.nperseg)]
+            self._add(segments)
+            completed = last - first + 1
+
+        self._history.push(block)
+        self.count = after
+        return completed
+
+    def _add(self, segments) -> None:
+        if self.detrend:
+            segments = segments - segments.mean(axis=1, keepdims=True)
+        spectrum = np.fft.rfft(segments * self.window, axis=1)
+        auto = spectrum.real ** 2 + spectrum.imag ** 2
+        cross = np.conj(spectrum[..., self._left]) * spectrum[..., self._right]
+
+        for index in range(segments.shape[0]):
+            slot = self._next
+            if self.segments == self.n_segments:
+                # retire the segment that slid out of the window
+                self._auto_sum -= self._auto[slot]
+                self._cross_sum -= self._cross[slot]
+            else:
+                self.segments += 1
+            self._auto[slot] = auto[index]
+            self._cross[slot] = cross[index]
+            self._auto_sum += auto[index]
+            self._cross_sum += cross[index]
+            self._next = (slot + 1) % self.n_segments
+
+        # keep rounding errors of the running sums from accumulating
+        self._updates += segments.shape[0]
+        if self._updates >= 16 * self.n_segments:
+            self._auto_sum = self._auto.sum(axis=0)
+            self._cross_sum = self._cross.sum(axis=0)
+            self._updates = 0
+
+    def psd(self) -> np.ndarray:
+        '''
+        power spectral density of every channel, (frequencies x channels)
+        '''
+        return self._auto_sum / max(self.segments, 1) * self.scale[:, None]
+
+    def csd(self) -> np.ndarray:
+        '''
+        cross spectral density of every pair, (frequencies x pairs)
+        '''
+        return self._cross_sum / max(self.segments, 1) * self.scale[:, None]
+
+    def coherence(self) -> np.ndarray:
+        '''
+        magnitude squared coherence of every pair, (frequencies x pairs)
+        '''
+        psd = self._auto_sum
+        cross = self._cross_sum
+        return (cross.real ** 2 + cross.imag ** 2) / psd[:, self._left] / psd[:, self._right]
@@ -0,0 +1,274 @@
+'''
+Running many headsets at once
+
+    workers: 4                  # processes, defaults to one a core
+    duration: 0
+    devices:
+      - name: alice
+        type: MuseInputStreamer
+        params: {mac_address: 00:55:DA:B0:00:01, name: Muse-0001, interface: /dev/tty.usbmodem1}
+      - name: bob
+        type: FakeEEGDeviceInputStreamer
+        params: {device: muse}
+    pipeline:
+      power: {type: PowerCoherenceEEGTransformer, from: device}
+      prc: {type: OscOutputStreamer, params: {address: "/{device}/prc", port: 9807}, from: power}
+      raw: {type: CSVFileOutputStreamer, params: {filename: "{device}.csv"}, from: device}
+
+Every device gets its own copy of `pipeline` ( a graph, see eegstreamer.graph )
+with the device as the stage named `device`, and `{device}` replaced by its name
+in every parameter, so OSC addresses and file names are kept apart.  Devices are
+dealt out round robin to worker processes, each running the pipelines of its
+devices on its own event loop, and every worker reports the health of its
+devices back to the supervisor every `report_interval` seconds.
+'''
+import asyncio
+import multiprocessing
+import os
+import queue
+import time
+from logging import getLogger
+
+from eegstreamer import metrics
+from eegstreamer.graph import Graph, GraphConfigError
+
+logger = getLogger(__name__)
+
+DEVICE_STAGE = 'device'
+
+STARTING = 'starting'
+RUNNING = 'running'
+FINISHED = 'finished'
+FAILED = 'failed'
+
+_EXIT = 'exit'
+
+
+def _substitute(value, name: str):
+    if isinstance(value, str):
+        return value.replace('{device}', name)
+    if isinstance(value, list):
+        return [_substitute(item, name) for item in value]
+    if isinstance(value, dict):
+        return {key: _substitute(item, name) for key, item in value.items()}
+    return value
+
+
+def device_graph_config(device: dict, pipeline: dict, duration: float = 0) -> dict:
+    '''
+    the graph of a single device, its own copy of `pipeline` fed by the device
+    '''
+    if DEVICE_STAGE in pipeline:
+        raise GraphConfigError(f"the pipeline can't have a stage named {DEVICE_STAGE}, that is the device")
+    stages = {DEVICE_STAGE: {'type': device['type'], 'params': device.get('params') or {}}}
+    stages.update(_substitute(pipeline, device['name']))
+    return {'duration': duration, 'stages': stages}
+
+
+def _stage_health(graph: Graph) -> dict:
+    device = graph.stage(DEVICE_STAGE)
+    sent = metrics.stage_metrics(device).samples_out
+    latencies = []
+    dropped = getattr(device, 'dropped_blocks', 0)
+    errors = getattr(device, 'send_errors', 0)
+    for node in graph.nodes:
+        for branch in getattr(node.stage, 'branch_stats', lambda: [])():
+            dropped += branch['dropped']
+            errors += branch['errors']
+        if not hasattr(node.stage, 'send'):
+            latency = metrics.stage_metrics(node.stage).latency.percentile(50)
+            if latency is not None:
+                latencies.append(latency)
+    return {
+        'samples': sent.total,
+        'rate': sent.rate(),
+        'dropped': dropped,
+        'errors': errors,
+        'latency': max(latencies) if latencies else None,
+    }
+
+
+async def _run_device(name: str, graph: Graph, health: dict) -> None:
+    health[name]['state'] = RUNNING
+    try:
+        await graph.run()
+        health[name]['state'] = FINISHED
+    except Exception as e:  # noqa
+        logger.exception(f"device {name} failed")
+        health[name]['state'] = FAILED
+        health[name]['error'] = f"{type(e).__name__}: {e}"
+
+
+async def _run_shard(shard: int, devices: list, pipeline: dict, duration: float, reports, report_interval: float):
+    graphs = {}
+    health = {}
+    for device in devices:
+        graphs[device['name']] = Graph(device_graph_config(device, pipeline, duration))
+        health[device['name']] = {'device': device['name'], 'shard': shard, 'pid': os.getpid(), 'state': STARTING,
+                                  'error': None}
+
+    def report():
+        for name, graph in graphs.items():
+            if graph.nodes[0].stage is not None:
+                health[name].update(_stage_health(graph))
+            health[name]['time'] = time.time()
+            reports.put(dict(health[name]))
+
+    tasks = []
+    for name, graph in graphs.items():
+        try:
+            graph.build()
+        except Exception as e:  # noqa
+            logger.exception(f"could not start device {name}")
+            health[name].update(state=FAILED, error=f"{type(e).__name__}: {e}")
+            continue
+        tasks.append(asyncio.create_task(_run_device(name, graph, health)))
+
+    running = asyncio.gather(*tasks)
+    try:
+        while True:
+            await asyncio.wait([running], timeout=report_interval)
+            if running.done():
+                break
+            report()
+    finally:
+        if not running.done():
+            running.cancel()
+        report()
+
+
+def _worker(shard: int, devices: list, pipeline: dict, duration: float, reports, report_interval: float) -> None:
+    try:
+        asyncio.run(_run_shard(shard, devices, pipeline, duration, reports, report_interval))
+    except KeyboardInterrupt:
+        pass
+    except Exception:  # noqa
+        logger.exception(f"worker {shard} failed")
+    finally:
+        reports.put((_EXIT, shard))
+
+
+class Supervisor:
+    '''
+    Runs the pipelines of many devices, sharded across worker processes
+
+        supervisor = Supervisor(devices, pipeline, workers=4)
+        supervisor.run(duration=60, on_report=print)
+        supervisor.health['alice']
+
+    health is kept per device: state ( starting, running, finished or failed ),
+    samples sent and samples a second, samples dropped and errors downstream,
+    the median latency of the slowest output and the worker it runs in
+    '''
+
+    def __init__(self, devices: list, pipeline: dict, workers: int = None, duration: float = 0,
+                 report_interval: float = 1.0):
+        '''
+        Parameters
+        ----------
+            devices : list
+                {'name': ..., 'type': ..., 'params': {...}} for every device
+            pipeline : dict
+                graph stages run for every device, fed from the stage named 'device'
+            workers : int
+                worker processes, one a core by default and never more than there are devices
+            duration : float
+                seconds to stream for, 0 for as long as the devices stream
+            report_interval : float
+                seconds between health reports
+        '''
+        names = [device.get('name') for device in devices]
+        if not devices or None in names:
+            raise GraphConfigError("every device needs a name")
+        if len(set(names)) != len(names):
+            raise GraphConfigError("device names have to be unique")
+        self.devices = devices
+        self.pipeline = pipeline
+        self.workers = max(1, min(workers or os.cpu_count() or 1, len(devices)))
+        self.duration = duration
+        self.report_interval = report_interval
+        self.health = {}
+        # every device's graph is checked here, before any process is started
+        self.graphs = {device['name']: Graph(device_graph_config(device, pipeline)) for device in devices}
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'Supervisor':
+        if not isinstance(config, dict) or 'devices' not in config or 'pipeline' not in config:
+            raise GraphConfigError("a supervisor needs a list of 'devices' and a 'pipeline'")
+        return cls(config['devices'], config['pipeline'], config.get('workers'), config.get('duration', 0),
+                   config.get('report_interval', 1.0))
+
+    def shards(self) -> list:
+        return [self.devices[shard::self.workers] for shard in range(self.workers)]
+
+    def describe(self) -> str:
+        lines = []
+        for shard, devices in enumerate(self.shards()):
+            lines.append(f"worker {shard}: {', '.join(device['name'] for device in devices)}")
+        name = self.devices[0]['name']
+        lines.append(f"pipeline of {name}:")
+        lines.extend(f"  {line}" for line in self.graphs[name].describe().splitlines())
+        return '\n'.join(lines)
+
+    def run(self, duration: float = None, on_report=None) -> dict:
+        '''
+        runs every device for `duration` seconds ( 0 for as long as they stream ) and returns their health
+
+        `on_report` is called with the health of a device every time it is reported
+        '''
+        if duration is None:
+            duration = self.duration
+        context = multiprocessing.get_context('spawn')
+        reports = context.Queue()
+        processes = {}
+        for shard, devices in enumerate(self.shards()):
+            for device in devices:
+                self.health[device['name']] = {'device': device['name'], 'shard': shard, 'state': STARTING,
+                                               'error': None}
+            process = context.Process(target=_worker, name=f"eegstreamer worker {shard}",
+                                      args=(shard, devices, self.pipeline, duration, reports, self.report_interval))
+            process.start()
+            processes[shard] = process
+
+        running = set(processes)
+        try:
+            while running:
+                try:
+                    report = reports.get(timeout=self.report_interval)
+                except queue.Empty:
+                    for shard in list(running):
+                        if not processes[shard].is_alive():
+                            # gone without saying so, killed or crashed
+                            running.discard(shard)
+                            self._failed(shard, f"worker exited with {processes[shard].exitcode}")
+                    continue
+                if isinstance(report, tuple) and report[0] == _EXIT:
+                    running.discard(report[1])
+                    continue
+                self.health[report['device']] = report
+                if on_report is not None:
+                    on_report(report)
+        except KeyboardInterrupt:
+            # the workers get the interrupt too, and close their pipelines
+            pass
+        finally:
+            for process in processes.values():
+                process.join(timeout=10)
+                if process.is_alive():
+                    process.terminate()
+        return self.health
+
+    def _failed(self, shard: int, error: str) -> None:
+        for health in self.health.values():
+            if health['shard'] == shard and health['state'] in (STARTING, RUNNING):
+                health.update(state=FAILED, error=error)
+
+
+def format_health(health: dict) -> str:
+    latency = '-' if health.get('latency') is None else f"{health['latency'] * 1e3:.1f} ms"
+    line = (f"{health['device']:<16} {health['state']:<9} {health.get('samples', 0):>10} samples "
+            f"{health.get('rate', 0.0):>8.1f}/s  dropped {health.get('dropped', 0)}  "
+            f"errors {health.get('errors', 0)}  latency {latency}")
+    if health.get('error'):
+        line += f"  {health['error']}"
+    return line
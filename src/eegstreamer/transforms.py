@@ -1,87 +1,131 @@
+import asyncio
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from fractions import Fraction
+from functools import lru_cache
 from logging import getLogger
 from typing import Union
 
 from stringcase import snakecase
 
-from eegstreamer import PowerCoherenceException
-from eegstreamer.data import EEGData
+from eegstreamer import PowerCoherenceException, metrics
+from eegstreamer.buffers import RingBuffer
+from eegstreamer.data import EEGData, EEGFrame
+from eegstreamer.fanout import FanOut
+from eegstreamer.filters import StreamingFilter, StreamingResampler, design_filter_bank
+from eegstreamer.spectral import SlidingWelch
 from eegstreamer.outputs import EEGOutputStreamer
 
-import eegstreamer.eeg_analysis as eeg
-
 import numpy as np
 import time
 
 logger = getLogger(__name__)
 
+# executors PowerCoherenceEEGTransformer can make for itself
+EXECUTORS = ('thread', 'process')
 
 
-class EEGTransformer(ABC):
+@lru_cache(maxsize=None)
+def _snakecase(key: str) -> str:
+    return snakecase(key)
 
-    def __init__(self):
-        self.outputs = []
 
-    def connect(self, stream: Union[EEGOutputStreamer]):
-        self.outputs.append(stream)
+class EEGTransformer(FanOut, ABC):
+
+    # transformers that set this handle `EEGFrame` blocks in `receive`,
+    # everything else is fed one `EEGData` sample at a time
+    accepts_frames = False
 
-    async def send(self, data) -> None:
-        for output in self.outputs:
-            await output.receive(data)
+    def __init__(self):
+        super().__init__()
 
     @abstractmethod
-    async def receive(self, data: EEGData) -> None:
+    async def receive(self, data: Union[EEGData, EEGFrame]) -> None:
         pass
 
 
 class ConstantFactorEEGTransformer(EEGTransformer):
 
+    accepts_frames = True
+
     def __init__(self, factor: int):
         super().__init__()
         self.factor = factor
 
-    async def receive(self, data: EEGData) -> None:
+    async def receive(self, data: Union[EEGData, EEGFrame]) -> None:
 
-        packet = data['packet']
-        new_packet = []
-        for v in packet:
-            new_packet.append(v * self.factor)
-        await self.send(data)
+        frame = EEGFrame.of(data)
+        await self.send(EEGFrame(frame.samples * self.factor, frame.channels, frame.timestamps, frame.sample_rate))
 
 
-class DownSampleEEGTransformer(EEGTransformer):
+class StreamingFilterTransformer(EEGTransformer):
     '''
-    Simply cuts incoming data from 256Hz to 1Hz
+    Filters the stream through a bank of IIR filters designed once,
+    carrying the filter state of each channel across blocks
+
+        StreamingFilterTransformer(bandpass=(1, 40), notch=60)
     '''
-    def __init__(self, downsample_scale: int = 256, sample_rate: int = 256):
+
+    accepts_frames = True
+
+    def __init__(self, sample_rate: int = 256, bandpass=(1, 40), highpass=None, lowpass=None, notch=None,
+                 order: int = 4):
         super().__init__()
-        self.downsample_scale = downsample_scale
         self.sample_rate = sample_rate
-        # TODO: number of channels needs to be configurable based on device
-        self.packet_buffer = np.zeros((1, 4))
-        self.channel_buffer = {}
+        self.sos = design_filter_bank(sample_rate, bandpass=bandpass, highpass=highpass, lowpass=lowpass,
+                                      notch=notch, order=order)
+        self.filter = StreamingFilter(self.sos)
 
-    async def receive(self,  data: EEGData) -> None:
+    async def receive(self, data: Union[EEGData, EEGFrame]) -> None:
+        frame = EEGFrame.of(data)
+        await self.send(EEGFrame(self.filter(frame.samples), frame.channels, frame.timestamps, frame.sample_rate))
 
-        # accrue y samples of data for analysis
-        if self.packet_buffer.shape[0] < self.sample_rate:
-            for channel, value in data.items():
-                if channel == 'packet':
-                    self.packet_buffer = np.append(self.packet_buffer, [value], axis=0)
-                else:
-                    if channel not in self.channel_buffer:
-                        self.channel_buffer[channel] = []
-                    self.channel_buffer[channel].append(value)
-        elif self.packet_buffer.shape[0] >= self.sample_rate:
-            out_data = {channel: sum(values)/len(values) for channel, values in self.channel_buffer.items()}
-            out_data['packet'] = np.average(self.packet_buffer, axis=0)
 
-            # TODO: number of channels needs to be configurable based on device
-            self.packet_buffer = np.zeros((1, 4))
-            self.channel_buffer = {}
-            
-            await self.send(EEGData(out_data))
+class DownSampleEEGTransformer(EEGTransformer):
+    '''
+    Resamples the stream to `sample_rate`, through an anti-aliasing polyphase
+    FIR filter that carries its state from one block to the next
+
+        DownSampleEEGTransformer(sample_rate=32)        # 256Hz -> 32Hz
+        DownSampleEEGTransformer(sample_rate=100)       # 256Hz -> 100Hz
+        DownSampleEEGTransformer(downsample_scale=256)  # 256Hz -> 1Hz
 
+    every output sample is stamped with the time of the newest input sample it
+    depends on, the filter delays the signal by `half_length` output samples
+    '''
+
+    accepts_frames = True
+
+    def __init__(self, downsample_scale: int = 256, sample_rate: float = None, input_rate: float = 256,
+                 half_length: int = 10):
+        '''
+        Parameters
+        ----------
+            downsample_scale : int
+                input samples to every output sample, when `sample_rate` is not given
+            sample_rate : float
+                output rate in hertz, any rational fraction of `input_rate`
+            input_rate : float
+                rate of the incoming stream in hertz
+            half_length : int
+                zero crossings of the filter either side of its centre, longer is sharper but lags more
+        '''
+        super().__init__()
+        self.input_rate = input_rate
+        self.downsample_scale = downsample_scale
+        self.sample_rate = sample_rate if sample_rate else input_rate / downsample_scale
+        ratio = (Fraction(self.sample_rate) / Fraction(input_rate)).limit_denominator(10000)
+        self.resampler = StreamingResampler(ratio.numerator, ratio.denominator, half_length)
+        self.channels = None
+
+    async def receive(self, data: Union[EEGData, EEGFrame]) -> None:
+        frame = EEGFrame.of(data)
+        if self.channels is None:
+            self.channels = frame.channels
+        samples, newest = self.resampler(frame.samples)
+        if len(samples):
+            await self.send(EEGFrame(samples, self.channels, frame.timestamps[newest], self.sample_rate))
 
 
 class PowerCoherenceEEGTransformer( EEGTransformer ):
@@ -103,61 +147,194 @@ class PowerCoherenceEEGTransformer( EEGTransformer ):
     then analyze the long_buffer data (tentatively, 10 seconds)
     then combine the two so that the user can 'move the needle'
     '''
-    
-    def __init__(self, sample_rate: int = 256, *args, **kwargs):
+
+    accepts_frames = True
+
+    def __init__(self, sample_rate: int = 256, streaming_filter: bool = False, hop: float = 0.25,
+                 incremental: bool = False, executor: Union[str, Executor] = None, max_in_flight: int = 1,
+                 *args, **kwargs):
         '''
-        initial data is a [0,0,0,0,0] for short_buffer
-        and 10 seconds of simulated EEG for the long_buffer 
-        assumes that device is Muse (i.e. 5 channels, 256Hz etc)
+        the long_buffer starts out as 5 seconds of simulated EEG so the first
+        analysis can run after a single hop, it is allocated with the channel
+        count of the first sample received
+
+        by default every window is detrended and bandpassed on its own, as
+        analyzeEEG does.  With `streaming_filter` each sample is bandpassed
+        once as it arrives and kept in a second window, instead of the analysis
+        re-filtering the whole window on every hop.  That is cheaper, but the
+        features differ: the causal filter runs on without a detrend, and takes
+        a few tens of seconds to settle from the simulated EEG it starts with
+
+        `hop` is the time in seconds between analyses.  With `incremental` the
+        spectra are kept up to date by SlidingWelch estimators, so a hop only
+        transforms the newest segments instead of the whole window.  Band power
+        then comes from the Welch PSD (1 Hz bins) rather than a periodogram of
+        the whole window.
+
+        `executor` ( 'thread', 'process' or a concurrent.futures.Executor ) runs
+        the analysis off the event loop, with at most `max_in_flight` windows
+        being analyzed at once.  When the analysis falls behind, windows that
+        were never started are dropped in favor of the newest one and counted
+        in `dropped_windows`; results are always sent in window order.
         '''
+        if isinstance( executor, str ) and executor not in EXECUTORS:
+            raise ValueError(f"unknown executor '{executor}', expected one of {EXECUTORS}")
         super().__init__()
         self.sample_rate        = int( sample_rate )
         self.window_length      = 5
-        self.short_buffer_size  = int( self.sample_rate / 4 )
+        self.short_buffer_size  = max( 1, int( self.sample_rate * hop ) )
         self.long_buffer_size   = self.sample_rate * self.window_length
-        self.short_buffer       = np.random.rand( 1 , 4) * 1000
-        self.long_buffer        = np.random.rand( int( self.sample_rate * self.window_length) , 4 ) * 1000
-        # for counting times of loops...collection slows down over time
+        self.long_buffer        = None
+        self.filtered_buffer    = None
+        self.streaming_filter   = streaming_filter or incremental
+        self.incremental        = incremental
+        self.filter             = None
+        self.analyzer           = None
+        self.power_estimator    = None
+        self.coherence_estimator = None
+        # the analysis and the rest of scipy are imported with the stage, not on the event loop
+        # when the first frame arrives
+        import eegstreamer.eeg_analysis as eeg
+        self._eeg               = eeg
+        self.max_in_flight      = max( 1, int( max_in_flight ) )
+        self._owns_executor     = isinstance( executor, str )
+        if executor == 'thread':
+            executor = ThreadPoolExecutor( max_workers=self.max_in_flight )
+        elif executor == 'process':
+            executor = ProcessPoolExecutor( max_workers=self.max_in_flight )
+        self.executor           = executor
+        self._in_flight         = deque()
+        self._stale             = None
+        self._emitter           = None
+        self.dropped_windows    = 0
+        # samples received since the last analysis
+        self.pending            = 0
+        # the time taken by each analysis goes to the 'analysis' histogram of the stage's metrics
         self.start_time         = time.time()
         self.num_analyses       = 0
+        # average time between analyses
         self.average_time       = 0
-        self.time_elapsed       = [0.25]
-        self.latest             = time.time()
-        self.last               = 0
-
-    async def receive(self,  data: EEGData) -> None:
-        
-        # accrue 1 second of data for analysis
-        packet = data['packet']
-        if  self.short_buffer.shape[0] < ( self.short_buffer_size ): 
-            #accrue data for x amount of time (1 second currently)
-            self.short_buffer = np.vstack( ( self.short_buffer , [packet] ) )
-            
-        elif  self.short_buffer.shape[0] >= ( self.short_buffer_size ) :
-            if self.num_analyses == 0 :
-                self.start_time = time.time()
-                self.latest = time.time() - self.start_time
-            else:
-                self.latest = ( time.time() - self.start_time ) / self.num_analyses
-                self.time_elapsed.append( self.latest )
-                self.average_time = np.mean( self.time_elapsed )
-                logger.debug(str(self.average_time))
-            
-            self.num_analyses += 1
-            
-            # clear earliest X samples from long_buffer, then tack on latest X samples
-            # so that we have shifted the window but maintained the length
-            self.long_buffer = self.long_buffer[ self.short_buffer_size: , : ]
-            self.long_buffer = np.vstack( (self.long_buffer, self.short_buffer) )
-            analysis   = eeg.analyzeEEG( data=self.long_buffer  , device='muse', sample_rate = self.sample_rate)
-            
-            self.short_buffer = self.short_buffer[255:,:] # np.array( [packet] )
-                
-            # sum the analyses and scale ? or can do later on
-            out_data = {snakecase(k): v for k, v in analysis.items()}
-            out_data['packet'] = list(analysis.values())
-            output = EEGData(out_data)
-            # reset short_buffer
-            await self.send( output )
-         
-    
\ No newline at end of file
+
+    async def receive(self, data: Union[EEGData, EEGFrame]) -> None:
+        frame = EEGFrame.of(data)
+        if self.analyzer is None:
+            self._allocate(frame.channels)
+
+        filtered = self.filter(frame.samples) if self.filter else None
+        offset = 0
+        while offset < len(frame):
+            # accrue a hop of data, shifting the window but maintaining its length
+            take = min(self.short_buffer_size - self.pending, len(frame) - offset)
+            self._push(frame.samples[offset:offset + take],
+                       None if filtered is None else filtered[offset:offset + take])
+            self.pending += take
+            offset += take
+            if self.pending >= self.short_buffer_size:
+                self.pending = 0
+                # the analysis is stamped with the time of the newest sample in its window
+                await self._analyze( int( frame.timestamps[offset - 1] ) )
+
+    def _allocate(self, channels) -> None:
+        self.analyzer = self._eeg.EEGAnalyzer(self.sample_rate, self.window_length, channels)
+        if self.streaming_filter:
+            self.filter = StreamingFilter(self.analyzer.sos)
+
+        if self.incremental:
+            nperseg = self.analyzer.nperseg
+            step = min(self.short_buffer_size, nperseg // 2)
+            self.power_estimator = SlidingWelch(self.sample_rate, self.long_buffer_size, nperseg, step,
+                                                len(channels), detrend=True)
+            self.coherence_estimator = SlidingWelch(self.sample_rate, self.long_buffer_size, nperseg, step,
+                                                    len(channels), pairs=[self.analyzer.frontal_pair])
+        else:
+            self.long_buffer = RingBuffer(self.long_buffer_size, len(channels))
+            if self.filter:
+                self.filtered_buffer = RingBuffer(self.long_buffer_size, len(channels))
+
+        fill = np.random.rand(self.long_buffer_size, len(channels)) * 1000
+        self._push(fill, self.filter(fill) if self.filter else None)
+
+    def _push(self, samples, filtered) -> None:
+        if self.incremental:
+            self.power_estimator.push(samples)
+            self.coherence_estimator.push(filtered)
+        else:
+            self.long_buffer.push(samples)
+            if filtered is not None:
+                self.filtered_buffer.push(filtered)
+
+    async def _analyze(self, timestamp: int) -> None:
+        if self.num_analyses == 0 :
+            self.start_time = time.time()
+        else:
+            self.average_time = ( time.time() - self.start_time ) / self.num_analyses
+
+        self.num_analyses += 1
+
+        if self.incremental:
+            job = ( self.analyzer.analyze_spectra , self.power_estimator.freqs ,
+                    self.power_estimator.psd() , self.coherence_estimator.coherence()[:, 0] )
+        else:
+            filtered   = self.filtered_buffer.view() if self.filtered_buffer else None
+            job = ( self.analyzer.analyze , self.long_buffer.view() , filtered )
+
+        if self.executor is None:
+            start = time.perf_counter()
+            analysis = job[0]( *job[1:] )
+            metrics.stage_metrics( self ).histogram( 'analysis' ).record( time.perf_counter() - start )
+            await self._emit( analysis, timestamp )
+            return
+
+        # the window views are overwritten by the next hop, the executor gets its own copy
+        job = job[:1] + tuple( None if a is None else a.copy() for a in job[1:] )
+        if len( self._in_flight ) >= self.max_in_flight:
+            # analysis is falling behind, only the newest window waits for a free slot
+            if self._stale is not None:
+                self.dropped_windows += 1
+            self._stale = ( job , timestamp )
+            return
+        self._submit( job , timestamp )
+
+    def _submit(self, job, timestamp: int) -> None:
+        loop = asyncio.get_running_loop()
+        self._in_flight.append( ( loop.run_in_executor( self.executor , *job ) , time.perf_counter() , timestamp ) )
+        if self._emitter is None or self._emitter.done():
+            self._emitter = loop.create_task( self._emit_in_order() )
+
+    async def _emit_in_order(self) -> None:
+        while self._in_flight:
+            future, submitted, timestamp = self._in_flight[0]
+            try:
+                analysis = await future
+                # in an executor this includes any wait for a free worker
+                metrics.stage_metrics( self ).histogram( 'analysis' ).record( time.perf_counter() - submitted )
+            except Exception:  # noqa
+                logger.exception( "analysis failed" )
+                analysis = None
+            self._in_flight.popleft()
+            if self._stale is not None:
+                ( job , stale_timestamp ), self._stale = self._stale, None
+                self._submit( job , stale_timestamp )
+            if analysis is not None:
+                await self._emit( analysis, timestamp )
+
+    async def _emit(self, analysis: dict, timestamp: int) -> None:
+        # sum the analyses and scale ? or can do later on
+        out_data = {_snakecase(k): v for k, v in analysis.items()}
+        out_data['packet'] = list(analysis.values())
+        output = EEGData(out_data, timestamp=timestamp)
+        await self.send( output )
+
+    async def join(self) -> None:
+        '''
+        waits for the analyses still running in the executor to be sent on
+        '''
+        while self._emitter is not None and not self._emitter.done():
+            await self._emitter
+        await super().join()
+
+    async def close(self) -> None:
+        await self.join()
+        self.cancel_branches()
+        if self._owns_executor:
+            self.executor.shutdown()
@@ -0,0 +1,115 @@
+import asyncio
+import queue
+import threading
+import time
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+_CLOSE = object()
+
+
+class BackgroundWriter:
+    '''
+    Writes to a file from its own thread, so a slow disk never holds up the event loop
+
+    `put` only hands data over through a bounded queue, encoding and writing
+    happen in the writer thread.  Encoded chunks are gathered and written
+    together once `flush_size` characters ( or bytes ) are pending, or
+    `flush_interval` seconds after the last write, whichever comes first.
+    When the queue is full `put` waits for room in an executor, which holds
+    up the sender but not the loop.
+
+        writer = BackgroundWriter(open('session.eeg', 'w'), encode_json_lines)
+        await writer.put(frame)
+        ...
+        await writer.close()    # writes everything that is still pending
+    '''
+
+    def __init__(self, file_handle, encode, max_pending: int = 1024, flush_size: int = 1 << 20,
+                 flush_interval: float = 1.0):
+        '''
+        Parameters
+        ----------
+            file_handle : file
+                open for writing, text or binary to match what `encode` returns
+            encode : callable
+                turns one item handed to `put` into a str or bytes chunk
+            max_pending : int
+                items waiting to be encoded before `put` has to wait
+            flush_size : int
+                pending characters or bytes that trigger a write
+            flush_interval : float
+                longest time, in seconds, that anything waits to be written
+        '''
+        self.file_handle = file_handle
+        self.encode = encode
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.error = None
+        self.writes = 0
+        self.thread = threading.Thread(target=self._run, name=f"writer {getattr(file_handle, 'name', '')}",
+                                       daemon=True)
+        self.thread.start()
+
+    async def put(self, data) -> None:
+        self._raise_error()
+        try:
+            self.queue.put_nowait(data)
+        except queue.Full:
+            await asyncio.get_running_loop().run_in_executor(None, self.queue.put, data)
+
+    async def close(self) -> None:
+        if self.thread.is_alive():
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.queue.put, _CLOSE)
+            await loop.run_in_executor(None, self.thread.join)
+        self._raise_error()
+
+    def _raise_error(self) -> None:
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def _run(self) -> None:
+        pending = []
+        pending_size = 0
+        deadline = time.monotonic() + self.flush_interval
+
+        while True:
+            try:
+                item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+
+            if item is _CLOSE:
+                self._write(pending)
+                return
+
+            if item is not None and self.error is None:
+                try:
+                    chunk = self.encode(item)
+                    pending.append(chunk)
+                    pending_size += len(chunk)
+                except Exception as e:  # noqa
+                    logger.exception(f"could not encode data for {self.file_handle}")
+                    self.error = e
+
+            if pending_size >= self.flush_size or time.monotonic() >= deadline:
+                self._write(pending)
+                pending = []
+                pending_size = 0
+                deadline = time.monotonic() + self.flush_interval
+
+    def _write(self, pending: list) -> None:
+        if not pending or self.error is not None:
+            return
+        try:
+            self.file_handle.write(pending[0][:0].join(pending))
+            self.file_handle.flush()
+            self.writes += 1
+        except Exception as e:  # noqa
+            # anything sent from here on is thrown away, the error is raised on the next put or close
+            logger.exception(f"could not write to {self.file_handle}")
+            self.error = e
@@ -3,6 +3,7 @@ import os
 import time
 from behave import use_step_matcher
 from behave.api.async_step import async_run_until_complete
+from aiohttp import web
 from pythonosc.dispatcher import Dispatcher
 from pythonosc.osc_server import AsyncIOOSCUDPServer
 
@@ -48,10 +49,35 @@ async def before_scenario(context, feature):
         context.osc_server = AsyncIOOSCUDPServer(('127.0.0.1', 1337), dispatcher, asyncio.get_event_loop())
         context.transport, context.protocol = await context.osc_server.create_serve_endpoint()
 
+    if 'http' in feature.tags:
+        # a stand in for an ingestion api, counting the samples posted to it
+        context.http_samples = list()
+        context.http_requests = 0
+        context.http_failures = 0
+
+        async def ingest(request):
+            context.http_requests += 1
+            if context.http_failures:
+                context.http_failures -= 1
+                return web.Response(status=503)
+            # aiohttp undoes the gzip content encoding
+            context.http_samples.extend((await request.text()).splitlines())
+            return web.Response()
+
+        app = web.Application()
+        app.router.add_post('/samples', ingest)
+        context.http_runner = web.AppRunner(app)
+        await context.http_runner.setup()
+        await web.TCPSite(context.http_runner, '127.0.0.1', 8089).start()
+
     await asyncio.sleep(0)
 
 
-def after_scenario(context, feature):
+@async_run_until_complete
+async def after_scenario(context, feature):
 
     if 'osc' in feature.tags:
         context.transport.close()
+
+    if 'http' in feature.tags:
+        await context.http_runner.cleanup()
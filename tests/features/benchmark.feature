@@ -0,0 +1,6 @@
+Feature: Benchmarks
+
+  Scenario: Benchmark results are compared against a baseline
+    Given a quick run of the analysis benchmarks
+    Then the benchmarks show no regression against themselves
+      And every benchmark is a regression against a baseline twice as fast
@@ -0,0 +1,12 @@
+Feature: Correcting device timestamps onto the host clock
+
+  Scenario: Drift and bluetooth jitter are taken out of the timestamps
+    Given a device clock running 100 ppm slow whose blocks arrive with 10 ms of jitter
+    When 5 minutes of blocks are fitted against the time they arrive
+    Then the drift is estimated to within 10 ppm
+      And the corrected timestamps follow the host clock to within 2 ms apart from the transport delay
+
+  Scenario: Timestamps follow acquisition, not the average delivery
+    Given a device clock running 100 ppm slow whose blocks arrive with 10 ms of jitter
+    When 5 minutes of blocks are fitted against the time they arrive
+    Then the corrected timestamps are late by no more than the fastest delivery, to within 1 ms
@@ -0,0 +1,45 @@
+Feature: Analyzing windows of EEG data
+
+  @analysis
+  Scenario: The analysis engine agrees with analyzeEEG
+    Given a window of 5 seconds of random eeg data with 4 channels
+    When the window is analyzed by analyzeEEG and by the analysis engine
+    Then both analyses have the same results
+
+  @analysis
+  Scenario: The analysis engine handles shorter windows
+    Given a window of 2 seconds of random eeg data with 4 channels
+    When the window is analyzed by analyzeEEG and by the analysis engine
+    Then both analyses have the same results
+
+  @analysis
+  Scenario: Filtering a stream block by block matches filtering it all at once
+    Given a window of 5 seconds of random eeg data with 4 channels
+    When the window is filtered in blocks of 64 samples and all at once
+    Then both filtered signals are the same
+
+  @analysis
+  Scenario: The sliding spectral estimator agrees with scipy
+    Given a window of 5 seconds of random eeg data with 4 channels
+    When the window is streamed through a sliding estimator in blocks of 37 samples
+    Then the estimated spectra match scipy's welch and coherence
+
+  @analysis
+  Scenario: Resampling removes what the lower rate can't represent
+    Given a 10 second 256 HZ signal of a 2 HZ and a 40 HZ sine wave on 4 channels
+    When the signal is resampled to 32 HZ in blocks of 12 samples
+    Then the 2 HZ wave comes through to within 1 percent
+      And the 40 HZ wave is at least 40 dB down
+      And resampling in blocks gives the same result as resampling all at once
+
+  @analysis
+  Scenario: The analysis engine agrees with analyzeEEG for a layout without AF7 and AF8
+    Given a window of 5 seconds of random eeg data with 8 channels
+    When the window is analyzed as crown data by analyzeEEG and by the analysis engine
+    Then both analyses have the same results
+
+  @analysis
+  Scenario: Band power and coherence of every pair of channels
+    Given a window of 5 seconds of random eeg data with 8 channels
+    When the connectivity of the window is worked out
+    Then the band power and coherence of every pair match scipy's cross spectra and coherence
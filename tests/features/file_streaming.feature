@@ -41,4 +41,68 @@ Feature: Streaming to file
       Given an input csv file having a name of muse_csv_data.eeg
         And the output is sent via OSC
       When the stream runs for 0 seconds
-      Then 1280 samples are received via OSC
\ No newline at end of file
+      Then 1280 samples are received via OSC
+
+    @file
+    Scenario: Replay a csv file as fast as possible
+      Given a csv recording named muse_csv_data.eeg is replayed as fast as possible from 1 second in
+        And the output json file has a name of csv_replay.eeg
+      When the stream runs for 0 seconds
+      Then the file has 1024 lines
+        And 0 seconds have elapsed
+
+    @file
+    Scenario: Replay a json file as fast as possible
+      Given a json recording named muse_json_data.eeg is replayed as fast as possible from 0 seconds in
+        And the output json file has a name of json_replay.eeg
+      When the stream runs for 0 seconds
+      Then the file has 1280 lines
+        And 0 seconds have elapsed
+
+    @file
+    Scenario: Muse emulator to binary file
+     Given a Muse device sends a simulated stream of data
+      And the output binary file has a name of muse_to_file.eegb
+    When the stream runs for 5 seconds
+    Then the recording has 1280 samples of 4 channels
+
+    @file
+    Scenario: Replay a binary file as fast as possible
+      Given a binary recording named muse_binary_data.eegb is replayed as fast as possible from 1 second in
+        And the output json file has a name of binary_replay.eeg
+      When the stream runs for 0 seconds
+      Then the file has 1024 lines
+        And 0 seconds have elapsed
+
+    @file
+    Scenario: Replayed samples keep the time they were recorded
+      Given a binary recording named muse_binary_data.eegb is replayed as fast as possible from 1 second in
+        And the output json file has a name of binary_replay_timestamps.eeg
+      When the stream runs for 0 seconds
+      Then the file has the timestamps of the recording from 1 second in
+
+    @file
+    Scenario: Pending writes are flushed when the output closes
+      Given a random eeg input stream of 100HZ with 3 channels
+        And the output csv file named random_to_file_csv.eeg is only flushed every 60 seconds
+      When the stream runs for 3 seconds
+      Then the file has 301 lines
+        And the csv header is timestamp, channel0, channel1, channel2
+
+    @file
+    Scenario: Json lines laid out unlike the first line are still read
+      Given a json recording of 10 samples where every other line has its keys in another order
+      When the recording is read in chunks of 3 lines
+      Then every sample is read with its timestamp
+
+    @file
+    Scenario Outline: Replaying a <file_type> recording stamped relative to its start
+      Given a <file_type> recording of 600 samples stamped in milliseconds since it started is replayed as fast as possible with timestamps in ms
+        And the timestamps sent by the input are recorded
+      When the stream runs for 0 seconds
+      Then the input sends every sample with its timestamp in nanoseconds
+
+      Examples:
+        | file_type |
+        | json      |
+        | csv       |
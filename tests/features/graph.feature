@@ -0,0 +1,109 @@
+Feature: Pipelines from a graph description
+
+  Scenario: Identical stages over the same input are merged and run once
+    Given a graph description
+      """
+      {
+        "stages": {
+          "muse": {"type": "FakeEEGDeviceInputStreamer", "params": {"device": "muse", "block_size": 12, "speed": 0}},
+          "power": {"type": "PowerCoherenceEEGTransformer", "from": "muse"},
+          "power_again": {"type": "PowerCoherenceEEGTransformer", "from": "muse"},
+          "power_file": {"type": "JSONFileOutputStreamer", "params": {"filename": "power.eeg"}, "from": "power"},
+          "power_again_file": {"type": "JSONFileOutputStreamer", "params": {"filename": "power_again.eeg"}, "from": "power_again"}
+        }
+      }
+      """
+    When the graph runs for 2 seconds
+    Then the graph has 4 stages
+      And stage power_again is shared with stage power
+      And the graph output power_file has written 8 lines
+      And the graph output power_again_file has written 8 lines
+
+  Scenario: Queued outputs are stopped when the graph closes
+    Given a graph description
+      """
+      {
+        "stages": {
+          "muse": {"type": "FakeEEGDeviceInputStreamer", "params": {"device": "muse", "block_size": 12, "speed": 0}},
+          "power": {"type": "PowerCoherenceEEGTransformer", "from": "muse", "queue_size": 64},
+          "raw_file": {"type": "JSONFileOutputStreamer", "params": {"filename": "queued_raw.eeg"}, "from": "muse", "queue_size": 64},
+          "power_file": {"type": "JSONFileOutputStreamer", "params": {"filename": "queued_power.eeg"}, "from": "power", "queue_size": 8}
+        }
+      }
+      """
+    When the graph runs for 2 seconds
+    Then the graph output power_file has written 8 lines
+      And no stage has a queued output still running
+
+  Scenario: Inputs configured alike are still separate sources
+    Given a graph description
+      """
+      {
+        "stages": {
+          "left": {"type": "FakeEEGDeviceInputStreamer", "params": {"device": "muse", "block_size": 12, "speed": 0}},
+          "right": {"type": "FakeEEGDeviceInputStreamer", "params": {"device": "muse", "block_size": 12, "speed": 0}},
+          "left_file": {"type": "JSONFileOutputStreamer", "params": {"filename": "left.eeg"}, "from": "left"},
+          "right_file": {"type": "JSONFileOutputStreamer", "params": {"filename": "right.eeg"}, "from": "right"}
+        }
+      }
+      """
+    When the graph runs for 1 seconds
+    Then the graph has 4 stages
+      And the graph output left_file has written 256 lines
+      And the graph output right_file has written 256 lines
+
+  Scenario: Edges with mismatched sample rates are refused
+    Given a graph description
+      """
+      {
+        "stages": {
+          "muse": {"type": "FakeEEGDeviceInputStreamer", "params": {"device": "muse", "sample_rate": 128}},
+          "power": {"type": "PowerCoherenceEEGTransformer", "params": {"sample_rate": 256}, "from": "muse"},
+          "screen": {"type": "ScreenEEGOutputStreamer", "from": "power"}
+        }
+      }
+      """
+    Then the graph is refused because stage power expects 256 Hz
+
+  Scenario: Recorders take the rate of the stream they are sent
+    Given a graph description
+      """
+      {
+        "stages": {
+          "muse": {"type": "FakeEEGDeviceInputStreamer", "params": {"device": "muse", "block_size": 12, "speed": 0}},
+          "ds": {"type": "DownSampleEEGTransformer", "params": {"sample_rate": 32}, "from": "muse"},
+          "rec": {"type": "BinaryFileOutputStreamer", "params": {"filename": "downsampled.eegb"}, "from": "ds"},
+          "power": {"type": "PowerCoherenceEEGTransformer", "from": "muse"},
+          "ring": {"type": "SharedMemoryOutputStreamer", "params": {"name": "eegstreamer-graph-test"}, "from": "power"}
+        }
+      }
+      """
+    When the graph runs for 2 seconds
+    Then the graph output rec has recorded 64 samples at 32 Hz
+
+  Scenario: A misspelt executor is refused before anything starts
+    Given a graph description
+      """
+      {
+        "stages": {
+          "muse": {"type": "FakeEEGDeviceInputStreamer", "params": {"device": "muse"}},
+          "power": {"type": "PowerCoherenceEEGTransformer", "params": {"executor": "threads"}, "from": "muse"},
+          "screen": {"type": "ScreenEEGOutputStreamer", "from": "power"}
+        }
+      }
+      """
+    Then the graph is refused because stage power has an unknown executor 'threads'
+
+  Scenario: The run command streams for the duration it is given
+    Given a graph description
+      """
+      {
+        "stages": {
+          "muse": {"type": "FakeEEGDeviceInputStreamer", "params": {"device": "muse", "block_size": 12, "speed": 0}},
+          "raw_file": {"type": "JSONFileOutputStreamer", "params": {"filename": "cli_raw.eeg"}, "from": "muse"}
+        }
+      }
+      """
+    When eegstreamer run is given the graph with --duration 2.5
+    Then the command exits with 0
+      And the file cli_raw.eeg has 640 lines
@@ -0,0 +1,16 @@
+Feature: Streaming to an http endpoint
+
+  @http
+  Scenario: Muse device stream posted in batches
+    Given a Muse device sends a simulated stream of data in blocks of 12 samples
+      And the output is posted over http in batches of 128 samples
+    When the stream runs for 2 seconds
+    Then 512 samples are posted to the endpoint in at most 6 requests
+
+  @http
+  Scenario: Failed posts are retried
+    Given a Muse device sends a simulated stream of data in blocks of 12 samples
+      And the output is posted over http in batches of 128 samples
+      And the endpoint fails the first 2 requests
+    When the stream runs for 2 seconds
+    Then 512 samples are posted to the endpoint in at most 8 requests
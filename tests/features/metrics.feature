@@ -0,0 +1,17 @@
+Feature: Pipeline metrics
+
+  Scenario: Every stage is instrumented
+    Given a Muse device sends a simulated stream of data in blocks of 12 samples
+      And the constant transformer is applied
+      And the output only accepts single samples
+    When the stream runs for 2 seconds
+    Then the metrics count 512 samples through every stage
+      And the latency of the output has been measured
+
+  Scenario: Metrics are served over http
+    Given a Muse device sends a simulated stream of data
+      And the PowerCoherence transformer is applied
+      And the output only accepts single samples
+      And the metrics are served over http
+    When the stream runs for 2 seconds
+    Then the metrics endpoint reports the analysis time of the transformer
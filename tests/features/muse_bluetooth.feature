@@ -0,0 +1,15 @@
+Feature: Handing muse data over from the bluetooth thread
+
+  Scenario: The bluetooth thread never waits for the pipeline
+    Given a simulated Muse radio sends 128 bluetooth blocks from its own thread without clock correction
+      And the output takes 5 ms for every frame
+    When the Muse stream runs until the radio goes quiet
+    Then every bluetooth block reaches the output with its device timestamps
+      And the bluetooth thread never waited on the pipeline
+
+  Scenario: Blocks the loop has no room for are dropped and counted
+    Given a simulated Muse radio sends 128 bluetooth blocks from its own thread with room for 4 blocks
+      And the output takes 50 ms for every frame
+    When the Muse stream runs until the radio goes quiet
+    Then the blocks that reached the output and the dropped blocks add up to 128
+      And the bluetooth thread never waited on the pipeline
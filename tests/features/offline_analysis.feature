@@ -0,0 +1,23 @@
+Feature: Analyzing whole recordings offline
+
+  @analysis
+  Scenario: Offline analysis matches replaying the recording through the PowerCoherence transformer
+    Given a 60 second binary recording of eeg data named offline.eegb
+    When the recording is analyzed offline
+      And the recording is replayed through the PowerCoherence transformer
+    Then there are features for 221 windows, one every 64 samples
+      And the features match the transformer's once it has run for 5 seconds
+
+  @analysis
+  Scenario: Offline analysis with the streaming filter matches the transformer's once it has settled
+    Given a 60 second binary recording of eeg data named offline_streaming.eegb
+    When the recording is analyzed offline with the streaming filter
+      And the recording is replayed through the PowerCoherence transformer with the streaming filter
+    Then there are features for 221 windows, one every 64 samples
+      And the features match the transformer's once it has run for 30 seconds
+
+  @analysis
+  Scenario: The analyze command writes a feature table
+    Given a 60 second csv recording of eeg data named offline.csv
+    When eegstreamer analyze is run on the recording with an output of offline_features.csv
+    Then the feature table has 221 rows keyed by timestamp
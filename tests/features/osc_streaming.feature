@@ -37,3 +37,12 @@ Feature: Streaming to an OSC output
     When the stream runs for 2 seconds
     Then 40 samples are received via OSC on /tmp address
       And 40 samples are received via OSC on /test address
+
+  @osc
+  Scenario: Muse device blocks sent as OSC bundles
+    Given a Muse device sends a simulated stream of data in blocks of 12 samples
+      And the output is sent via OSC in bundles
+    When the stream runs for 2 seconds
+    Then 512 samples are received via OSC
+      And OSC will receive 4 data channels
+      And at most 43 datagrams were sent
@@ -8,3 +8,28 @@ Feature: Testing scenarios for the Power Coherence Transformer
     When the stream runs for 10 seconds
     Then 10 seconds have elapsed
       And 2560 samples are received
+
+  Scenario: Power Coherence analysis off the event loop
+    Given a Muse device sends a simulated stream of data
+      And the PowerCoherence transformer is applied in a thread pool
+      And the output is the screen
+    When the stream runs for 2 seconds
+    Then the transformer has finished its analyses
+      And 8 samples are received
+
+  Scenario: Analyses carry the acquisition time of their window
+    Given a Muse device sends a simulated stream of data as fast as possible
+      And the timestamps sent by the input are recorded
+      And the PowerCoherence transformer is applied
+      And the output takes 0 ms for every frame
+    When the stream runs for 2 seconds
+    Then every analysis is stamped with the time of the newest sample in its window
+
+  Scenario: Only the executors the transformer knows how to make are accepted
+    Then the PowerCoherence transformer can't be made with the executor threads
+
+  @analysis
+  Scenario: By default every window is analyzed as analyzeEEG does
+    Given a window of 5 seconds of random eeg data with 4 channels
+    When the window is streamed through the PowerCoherence transformer with its defaults
+    Then both analyses have the same results
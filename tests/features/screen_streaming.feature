@@ -18,6 +18,26 @@ Feature: Streaming to screen
     When the stream runs for 10 seconds
     Then 2560 samples are received
 
+  Scenario: Receiving blocks of data from a (fake) muse device
+    Given a Muse device sends a simulated stream of data in blocks of 8 samples
+      And the output is the screen
+    When the stream runs for 2 seconds
+    Then 512 samples are received
+      And 2 seconds have elapsed
+
+  Scenario: Receiving data from a (fake) muse device as fast as possible
+    Given a Muse device sends a simulated stream of data as fast as possible
+      And the output is the screen
+    When the stream runs for 60 seconds
+    Then 15360 samples are received
+      And 0 seconds have elapsed
+
+  Scenario: Streaming for part of a second ends with a shorter block
+    Given a Muse device sends a simulated stream of data as fast as possible
+      And the output is the screen
+    When the stream runs for 2.5 seconds
+    Then 640 samples are received
+
   @current
   Scenario: Receiving data and transforming device data
     Given a random eeg input stream of 20 HZ
@@ -27,6 +47,37 @@ Feature: Streaming to screen
     Then 40 samples are received
       And 2 seconds have elapsed
 
+  Scenario: Transformed blocks reach an output that only accepts single samples
+    Given a random eeg input stream of 20 HZ
+      And the constant transformer is applied
+      And the output only accepts single samples
+    When the stream runs for 2 seconds
+    Then 40 samples are received
+
+  Scenario: Receiving data and filtering device data
+    Given a Muse device sends a simulated stream of data
+      And the streaming filter transformer is applied
+      And the output is the screen
+    When the stream runs for 2 seconds
+    Then 512 samples are received
+
+  Scenario: A slow output does not hold up the stream
+    Given a random eeg input stream of 20 HZ
+      And a slow output is connected through a queue of 4 samples that drops the oldest
+      And the output is the screen
+    When the stream runs for 2 seconds
+    Then 40 samples are received
+      And 2 seconds have elapsed
+      And the slow output has dropped samples
+
+  Scenario: An output that fails does not stop the stream or the outputs next to it
+    Given a random eeg input stream of 20 HZ
+      And an output that fails on every sample is connected
+      And the output is the screen
+    When the stream runs for 2 seconds
+    Then 40 samples are received
+      And the failing output has 40 errors
+
   @downsample
   Scenario: Receiving data and downsampling device data
     Given a Muse device sends a simulated stream of data
@@ -34,6 +85,14 @@ Feature: Streaming to screen
       And the output is the screen
     When the stream runs for 2 seconds
     Then 2 samples are received
+
+  @downsample
+  Scenario: Downsampling device data to 32HZ
+    Given a Muse device sends a simulated stream of data in blocks of 12 samples
+      And the downsample transformer is applied at 32 HZ
+      And the output is the screen
+    When the stream runs for 2 seconds
+    Then 64 samples are received
     
   @PowerCoherence
   Scenario: Receiving data and analyzing for Power and Coherence data
@@ -41,7 +100,12 @@ Feature: Streaming to screen
       And the PowerCoherence transformer is applied
       And the output is the screen
     When the stream runs for 2 seconds
-    Then 7 samples are received
-
-
+    Then 8 samples are received
 
+  @PowerCoherence
+  Scenario: Analyzing for Power and Coherence data incrementally
+    Given a Muse device sends a simulated stream of data
+      And the incremental PowerCoherence transformer is applied every 1/16 seconds
+      And the output is the screen
+    When the stream runs for 2 seconds
+    Then 32 samples are received
@@ -0,0 +1,29 @@
+Feature: Streaming to other processes through a ring in shared memory
+
+  Scenario: Readers follow the writer without copying
+    Given a shared memory output writing a ring of 1024 samples
+      And 2 shared memory readers attached to it
+    When 2560 samples are written in blocks of 12
+    Then every reader receives every sample in order with its timestamp
+      And the frames the readers receive are views into the ring
+
+  Scenario: A reader that falls behind skips to the newest samples
+    Given a shared memory output writing a ring of 256 samples
+      And 1 shared memory reader attached to it
+    When 1000 samples are written before the reader runs
+    Then the reader receives the newest 256 samples
+      And the reader counts 744 dropped samples
+
+  Scenario: A copying reader drops samples the writer laps while they are copied
+    Given a shared memory output writing a ring of 256 samples
+      And 1 copying shared memory reader attached to it, that the writer laps on its first read
+    When 1000 samples are written before the reader runs
+    Then the reader receives the newest 256 samples
+      And the reader counts 1000 dropped samples
+
+  Scenario: A copying reader drops samples the writer is still writing over
+    Given a shared memory output writing a ring of 256 samples
+      And 1 copying shared memory reader attached to it, that the writer is lapping on its first read
+    When 1000 samples are written before the reader runs
+    Then the reader receives no samples
+      And the reader counts 1000 dropped samples
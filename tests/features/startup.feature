@@ -0,0 +1,17 @@
+Feature: Console scripts start quickly
+
+  Scenario Outline: <script> only imports what it uses
+    When the module behind the <script> script is imported in a fresh interpreter
+    Then it is imported in less than 750 ms
+      And muselsl, pandas, aiohttp, scipy.signal and eegstreamer.eeg_analysis have not been imported
+
+    Examples:
+      | script      |
+      | oscmonitor  |
+      | eegexample  |
+      | musemonitor |
+
+  Scenario: Graph stages are only imported when a graph uses them
+    When the module behind the eegstreamer script is imported in a fresh interpreter
+      And the stage OscOutputStreamer is resolved by name
+    Then muselsl, pandas, aiohttp, scipy.signal and eegstreamer.eeg_analysis have not been imported
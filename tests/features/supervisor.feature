@@ -0,0 +1,18 @@
+Feature: Running many headsets at once
+
+  @osc
+  Scenario: Every device runs its own pipeline in a worker process
+    Given 4 simulated Muse devices named alice, bob, carol and dave
+      And every device is recorded to its own csv file and sent via OSC on /{device}/eeg
+    When the supervisor runs them in 2 worker processes for 2 seconds
+    Then every device has finished with 512 samples sent
+      And the devices ran in 2 worker processes
+      And the csv file of every device has 513 lines
+      And 512 samples of every device are received via OSC on its own address
+
+  Scenario: The supervise command streams every device for the duration it is given
+    Given 2 simulated Muse devices named erin and frank
+      And every device is recorded to its own csv file
+    When eegstreamer supervise is run on them with --duration 2.5
+    Then the command reports every device finished
+      And the csv file of every device has 641 lines
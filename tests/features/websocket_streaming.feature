@@ -0,0 +1,29 @@
+Feature: Streaming to websocket dashboards
+
+  Scenario: Dashboards subscribe at their own rate and channels
+    Given a Muse device sends a simulated stream of data in blocks of 12 samples
+      And the output is broadcast over a websocket
+      And a dashboard named full subscribes
+      And a dashboard named frontal subscribes asking for decimate=4&channels=AF7,AF8
+    When the stream runs for 2 seconds
+    Then dashboard full has received 512 samples of TP9, AF7, AF8, TP10
+      And dashboard frontal has received 128 samples of AF7, AF8
+      And the websocket output has no senders left running
+
+  Scenario: A dashboard that can't be sent to is dropped
+    Given a Muse device sends a simulated stream of data in blocks of 12 samples
+      And the output is broadcast over a websocket
+      And a dashboard named full subscribes
+      And a dashboard named broken subscribes over a connection that fails to send
+    When the stream runs for 2 seconds
+    Then dashboard full has received 512 samples of TP9, AF7, AF8, TP10
+      And dashboard broken is closed and dropped after its first message fails
+
+  Scenario: Closing the output stops sending to a client that stopped reading
+    Given a Muse device sends a simulated stream of data in blocks of 12 samples
+      And the output is broadcast over a websocket
+      And a dashboard named full subscribes
+      And a dashboard named stuck subscribes over a connection that stalls
+    When the stream runs for 2 seconds
+    Then dashboard full has received 512 samples of TP9, AF7, AF8, TP10
+      And the websocket output has no senders left running
@@ -0,0 +1,178 @@
+import numpy as np
+from behave import *
+from behave.api.async_step import async_run_until_complete
+from scipy import signal
+from hamcrest import assert_that, equal_to, close_to, less_than
+
+from eegstreamer.data import EEGFrame
+from eegstreamer.eeg_analysis import analyzeEEG, EEGAnalyzer, DEVICE_ELECTRODES, EEG_BANDS
+from eegstreamer.filters import StreamingFilter, StreamingResampler, design_filter_bank
+from eegstreamer.outputs import EEGOutputStreamer
+from eegstreamer.spectral import SlidingWelch
+from eegstreamer.transforms import PowerCoherenceEEGTransformer, _snakecase
+
+
+@given(r"a window of (?P<duration>\d+) seconds of random eeg data with (?P<channel_count>\d+) channels")
+def step_impl(context, duration, channel_count):
+    context.sample_rate = 256
+    context.window_length = int(duration)
+    context.window = np.random.rand(context.sample_rate * int(duration), int(channel_count)) * 1000
+
+
+@when(r"the window is analyzed by analyzeEEG and by the analysis engine")
+def step_impl(context):
+    context.expected = analyzeEEG(data=context.window, device='muse', sample_rate=context.sample_rate)
+    analyzer = EEGAnalyzer(context.sample_rate, context.window_length)
+    context.actual = analyzer.analyze(context.window)
+
+
+@when(r"the window is analyzed as (?P<device>\w+) data by analyzeEEG and by the analysis engine")
+def step_impl(context, device):
+    context.expected = analyzeEEG(data=context.window, device=device, sample_rate=context.sample_rate)
+    analyzer = EEGAnalyzer(context.sample_rate, context.window_length, DEVICE_ELECTRODES[device])
+    context.actual = analyzer.analyze(context.window)
+
+
+class LastAnalysis(EEGOutputStreamer):
+
+    def __init__(self):
+        super().__init__()
+        self.analysis = None
+
+    async def receive(self, data):
+        self.analysis = data
+
+    def close(self):
+        pass
+
+
+@when(r"the window is streamed through the PowerCoherence transformer with its defaults")
+@async_run_until_complete
+async def step_impl(context):
+    context.expected = analyzeEEG(data=context.window, device='muse', sample_rate=context.sample_rate)
+    transformer = PowerCoherenceEEGTransformer(context.sample_rate)
+    last = LastAnalysis()
+    transformer.connect(last)
+    timestamps = 1_700_000_000_000_000_000 + np.arange(len(context.window)) * 3_906_250
+    await transformer.receive(EEGFrame(context.window, DEVICE_ELECTRODES['muse'], timestamps, context.sample_rate))
+    await transformer.close()
+    # by the last analysis the window is all data, none of the simulated EEG it started out with
+    context.actual = {key: last.analysis[_snakecase(key)] for key in context.expected}
+
+
+@then(r"both analyses have the same results")
+def step_impl(context):
+    assert_that(list(context.actual.keys()), equal_to(list(context.expected.keys())))
+    for key, expected in context.expected.items():
+        if isinstance(expected, str):
+            assert_that(context.actual[key], equal_to(expected), key)
+        else:
+            assert_that(context.actual[key], close_to(expected, 1e-9), key)
+
+
+@when(r"the window is filtered in blocks of (?P<block_size>\d+) samples and all at once")
+def step_impl(context, block_size):
+    sos = design_filter_bank(context.sample_rate, bandpass=(1, 40), notch=60)
+    block_size = int(block_size)
+    streaming_filter = StreamingFilter(sos)
+    context.actual = np.vstack([streaming_filter(context.window[i:i + block_size])
+                                for i in range(0, context.window.shape[0], block_size)])
+    zi = signal.sosfilt_zi(sos)[:, :, None] * context.window[0]
+    context.expected, _ = signal.sosfilt(sos, context.window, axis=0, zi=zi)
+
+
+@then(r"both filtered signals are the same")
+def step_impl(context):
+    assert_that(np.allclose(context.actual, context.expected), equal_to(True))
+
+
+@when(r"the window is streamed through a sliding estimator in blocks of (?P<block_size>\d+) samples")
+def step_impl(context, block_size):
+    block_size = int(block_size)
+    context.estimator = SlidingWelch(context.sample_rate, window_size=2 * context.sample_rate,
+                                     nperseg=context.sample_rate, step=64, channels=context.window.shape[1],
+                                     pairs=[(1, 2)])
+    for i in range(0, context.window.shape[0], block_size):
+        context.estimator.push(context.window[i:i + block_size])
+
+
+@then(r"the estimated spectra match scipy's welch and coherence")
+def step_impl(context):
+    # the estimate covers the last two seconds of the window
+    recent = context.window[-2 * context.sample_rate:]
+    params = dict(fs=context.sample_rate, nperseg=context.sample_rate, noverlap=context.sample_rate - 64,
+                  detrend=False)
+    _, psd = signal.welch(recent, axis=0, **params)
+    _, coherence = signal.coherence(recent[:, 1], recent[:, 2], **params)
+    assert_that(np.allclose(context.estimator.psd(), psd), equal_to(True), "psd")
+    assert_that(np.allclose(context.estimator.coherence()[:, 0], coherence), equal_to(True), "coherence")
+
+
+@given(r"a (?P<duration>\d+) second (?P<sample_rate>\d+) HZ signal of a (?P<low>\d+) HZ and a (?P<high>\d+) HZ sine wave on (?P<channel_count>\d+) channels")
+def step_impl(context, duration, sample_rate, low, high, channel_count):
+    context.sample_rate = int(sample_rate)
+    t = np.arange(int(duration) * context.sample_rate) / context.sample_rate
+    wave = 100 + np.sin(2 * np.pi * int(low) * t) + np.sin(2 * np.pi * int(high) * t)
+    context.window = np.repeat(wave[:, None], int(channel_count), axis=1)
+
+
+@when(r"the signal is resampled to (?P<sample_rate>\d+) HZ in blocks of (?P<block_size>\d+) samples")
+def step_impl(context, sample_rate, block_size):
+    context.resampled_rate = int(sample_rate)
+    down = context.sample_rate // context.resampled_rate
+    resampler = StreamingResampler(1, down)
+    blocks = [resampler(context.window[i:i + int(block_size)])[0]
+              for i in range(0, len(context.window), int(block_size))]
+    context.resampled = np.concatenate(blocks)
+    context.resampled_at_once = StreamingResampler(1, down)(context.window)[0]
+
+
+def _amplitude(signal_, frequency, sample_rate):
+    # least squares fit of a sine wave of any phase, leaving out the filter's start up
+    settled = signal_[2 * sample_rate:]
+    t = np.arange(len(settled)) / sample_rate
+    basis = np.column_stack([np.sin(2 * np.pi * frequency * t), np.cos(2 * np.pi * frequency * t), np.ones_like(t)])
+    coefficients = np.linalg.lstsq(basis, settled, rcond=None)[0]
+    return np.hypot(coefficients[0], coefficients[1])
+
+
+@then(r"the (?P<frequency>\d+) HZ wave comes through to within (?P<percent>\d+) percent")
+def step_impl(context, frequency, percent):
+    amplitude = _amplitude(context.resampled, int(frequency), context.resampled_rate)
+    assert_that(float(np.max(np.abs(amplitude - 1))), less_than(int(percent) / 100))
+
+
+@then(r"the (?P<frequency>\d+) HZ wave is at least (?P<db>\d+) dB down")
+def step_impl(context, frequency, db):
+    # above nyquist it folds back onto its alias
+    alias = abs(int(frequency) - round(int(frequency) / context.resampled_rate) * context.resampled_rate)
+    amplitude = _amplitude(context.resampled, alias, context.resampled_rate)
+    assert_that(float(np.max(amplitude)), less_than(10 ** (-int(db) / 20)))
+
+
+@then(r"resampling in blocks gives the same result as resampling all at once")
+def step_impl(context):
+    assert_that(np.allclose(context.resampled, context.resampled_at_once, rtol=0, atol=1e-9))
+
+
+@when(r"the connectivity of the window is worked out")
+def step_impl(context):
+    context.analyzer = EEGAnalyzer(context.sample_rate, context.window_length,
+                                   [f"channel{i}" for i in range(context.window.shape[1])])
+    context.connectivity = context.analyzer.connectivity(context.window)
+
+
+@then(r"the band power and coherence of every pair match scipy's cross spectra and coherence")
+def step_impl(context):
+    filtered = context.analyzer.filter(context.window)
+    params = dict(fs=context.sample_rate, nperseg=context.sample_rate, window='hann', detrend=False)
+    channel_count = context.window.shape[1]
+    for i in range(channel_count):
+        for j in range(channel_count):
+            freqs, cross = signal.csd(filtered[:, i], filtered[:, j], **params)
+            _, coherence = signal.coherence(filtered[:, i], filtered[:, j], **params)
+            for b, (low, high) in enumerate(EEG_BANDS.values()):
+                first, last = np.argmax(freqs > low) - 1, np.argmax(freqs > high) - 1
+                band_power = np.trapz(cross.real[first:last], freqs[first:last])
+                assert_that(context.connectivity.band_power[b, i, j], close_to(band_power, 1e-9 * abs(band_power)))
+                assert_that(context.connectivity.coherence[b, i, j], close_to(coherence[low:high].mean(), 1e-9))
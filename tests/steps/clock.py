@@ -0,0 +1,47 @@
+import numpy as np
+from behave import *
+from hamcrest import assert_that, close_to, less_than
+
+from eegstreamer.clock import ClockCorrector
+
+
+@given(r"a device clock running (?P<ppm>\d+) ppm slow whose blocks arrive with (?P<jitter>\d+) ms of jitter")
+def step_impl(context, ppm, jitter):
+    context.drift = int(ppm)
+    context.jitter = int(jitter) / 1000
+
+
+@when(r"(?P<minutes>\d+) minutes of blocks are fitted against the time they arrive")
+def step_impl(context, minutes):
+    rng = np.random.default_rng(7)
+    block_count = int(minutes) * 60 * 256 // 12
+    # the device time of the last sample in every block, and the host time it was taken at
+    device_times = 1000.0 + (np.arange(block_count) + 1) * 12 / 256
+    context.host_times = 1.7e9 + (device_times - 1000.0) * (1 + context.drift * 1e-6)
+    # bluetooth only ever adds to the time a block takes to arrive
+    arrivals = context.host_times + 0.005 + rng.exponential(context.jitter, block_count)
+
+    context.corrector = ClockCorrector()
+    context.corrected = np.empty(block_count)
+    for index in range(block_count):
+        context.corrector.update(device_times[index], arrivals[index])
+        context.corrected[index] = context.corrector(device_times[index])
+
+
+@then(r"the drift is estimated to within (?P<ppm>\d+) ppm")
+def step_impl(context, ppm):
+    assert_that(context.corrector.drift, close_to(context.drift, int(ppm)))
+
+
+@then(r"the corrected timestamps follow the host clock to within (?P<ms>\d+) ms apart from the transport delay")
+def step_impl(context, ms):
+    # once the fit has settled, leaving out the first minute
+    error = (context.corrected - context.host_times)[len(context.host_times) // 5:]
+    assert_that(float(np.abs(error - error.mean()).max()), less_than(int(ms) / 1000))
+
+
+@then(r"the corrected timestamps are late by no more than the fastest delivery, to within (?P<ms>\d+) ms")
+def step_impl(context, ms):
+    error = (context.corrected - context.host_times)[len(context.host_times) // 5:]
+    # every block takes at least 5 ms to arrive
+    assert_that(float(np.abs(error - 0.005).max()), less_than(int(ms) / 1000))
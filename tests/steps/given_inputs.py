@@ -1,10 +1,50 @@
+import json
+import threading
+import time
 from pathlib import Path
 
+import numpy as np
 from behave import *
+from behave.api.async_step import async_run_until_complete
 import os.path
 
+from eegstreamer.__benchmark__ import run_benchmarks
 from eegstreamer.inputs import RandomEEGInputStream, FakeEEGDeviceInputStreamer, FileEEGInputStreamer, \
-    JSONFileInputStreamer, CSVFileInputStreamer
+    JSONFileInputStreamer, CSVFileInputStreamer, BinaryFileInputStreamer, MuseInputStreamer
+
+
+class SimulatedMuseRadio:
+    """stands in for muselsl's Muse, calling back with (5 x 12) blocks from its own thread like the bgapi backend"""
+
+    def __init__(self, callback_eeg, block_count: int, interval: float = 0.001):
+        self.callback_eeg = callback_eeg
+        self.block_count = block_count
+        self.interval = interval
+        self.last_timestamp = time.time()
+        self.first_timestamp = None
+        self.callback_durations = []
+
+    def connect(self):
+        return True
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        self.first_timestamp = time.time()
+        for index in range(self.block_count):
+            timestamps = self.first_timestamp + (np.arange(12) + index * 12) / 256
+            started = time.perf_counter()
+            self.callback_eeg(np.random.rand(5, 12), timestamps)
+            self.callback_durations.append(time.perf_counter() - started)
+            self.last_timestamp = time.time()
+            time.sleep(self.interval)
+
+    def stop(self):
+        pass
+
+    def disconnect(self):
+        pass
 
 
 # @given("the input file {eeg_filename}")
@@ -28,6 +68,29 @@ def step_impl(context):
     context.upstream = context.start_stream
 
 
+@given(r"a Muse device sends a simulated stream of data in blocks of (?P<block_size>\d+) samples")
+def step_impl(context, block_size):
+    context.start_stream = FakeEEGDeviceInputStreamer(device='muse', block_size=int(block_size))
+    context.upstream = context.start_stream
+
+
+@given(r"a Muse device sends a simulated stream of data as fast as possible")
+def step_impl(context):
+    context.start_stream = FakeEEGDeviceInputStreamer(device='muse', block_size=256, speed=None)
+    context.upstream = context.start_stream
+
+
+@given(r"a simulated Muse radio sends (?P<block_count>\d+) bluetooth blocks from its own thread(?: with room for (?P<max_pending>\d+) blocks)?(?P<raw> without clock correction)?")
+def step_impl(context, block_count, max_pending, raw):
+    params = {'max_pending': int(max_pending)} if max_pending else {}
+    if raw:
+        params['correct_clock'] = False
+    context.start_stream = MuseInputStreamer(None, None, None, disconnect_delay=0.5, **params)
+    context.radio = SimulatedMuseRadio(context.start_stream.muse.callback_eeg, int(block_count))
+    context.start_stream.muse = context.radio
+    context.upstream = context.start_stream
+
+
 @given(r"an input (?P<file_type>json|csv) file having a name of (?P<filename>.+?)")
 def step_impl(context, file_type, filename):
     path = Path(__file__).parent.parent
@@ -38,6 +101,20 @@ def step_impl(context, file_type, filename):
         context.start_stream = CSVFileInputStreamer(fp)
     context.upstream = context.start_stream
 
+
+@given(r"a (?P<file_type>json|csv|binary) recording named (?P<filename>.+?) is replayed as fast as possible from (?P<start>\d+) seconds? in")
+def step_impl(context, file_type, filename, start):
+    path = Path(__file__).parent.parent
+    fp = os.path.join(path, 'fixtures', filename)
+    params = dict(speed=None, start=int(start))
+    if file_type == 'json':
+        context.start_stream = JSONFileInputStreamer(fp, **params)
+    elif file_type == 'binary':
+        context.start_stream = BinaryFileInputStreamer(fp, **params)
+    else:
+        context.start_stream = CSVFileInputStreamer(fp, **params)
+    context.upstream = context.start_stream
+
 # @when("the file is opened")
 # def step_impl(context):
 #     context.file_handle = open(context.file_name, 'r')
@@ -47,3 +124,47 @@ def step_impl(context, file_type, filename):
 # def step_impl(context):
 #     EEGFileInputStreamer(context.file_handle)
 
+
+
+@given(r"a quick run of the (?P<suite>analysis|transforms|inputs|outputs) benchmarks")
+@async_run_until_complete
+async def step_impl(context, suite):
+    context.benchmark = await run_benchmarks((suite, ), quick=True)
+
+
+@given(r"a (?P<file_type>json|csv) recording of (?P<count>\d+) samples stamped in milliseconds since it started"
+       r" is replayed as fast as possible with timestamps in (?P<unit>s|ms|us|ns)")
+def step_impl(context, file_type, count, unit):
+    channels = ["TP9", "AF7", "AF8", "TP10"]
+    context.samples = np.random.rand(int(count), len(channels)) * 1000
+    context.timestamps = np.arange(int(count)) * 4
+    context.filename = os.path.join(context.tmp_path, f'relative.{file_type}')
+    with open(context.filename, 'w') as file:
+        if file_type == 'csv':
+            file.write(','.join(['timestamp', *channels]) + "\n")
+        for timestamp, sample in zip(context.timestamps.tolist(), context.samples.tolist()):
+            if file_type == 'csv':
+                file.write(','.join(map(str, [timestamp, *sample])) + "\n")
+            else:
+                file.write(json.dumps({'timestamp': timestamp, 'data': dict(zip(channels, sample), packet=sample)})
+                           + "\n")
+    streamer = JSONFileInputStreamer if file_type == 'json' else CSVFileInputStreamer
+    context.start_stream = streamer(context.filename, speed=None, timestamp_unit=unit)
+    context.upstream = context.start_stream
+
+
+@given(r"a json recording of (?P<count>\d+) samples where every other line has its keys in another order")
+def step_impl(context, count):
+    channels = ["TP9", "AF7", "AF8", "TP10"]
+    context.samples = np.random.rand(int(count), len(channels)) * 1000
+    context.timestamps = 1_692_056_512_803 + np.arange(int(count)) * 4
+    context.filename = os.path.join(context.tmp_path, 'json_layouts.eeg')
+    with open(context.filename, 'w') as file:
+        for index, (timestamp, sample) in enumerate(zip(context.timestamps.tolist(), context.samples.tolist())):
+            data = dict(zip(channels, sample), packet=sample)
+            if index % 2:
+                # the packet first and the channels reversed, with the timestamp last
+                data = dict(reversed(list(data.items())))
+                file.write(json.dumps({'data': data, 'timestamp': timestamp}) + "\n")
+            else:
+                file.write(json.dumps({'timestamp': timestamp, 'data': data}) + "\n")
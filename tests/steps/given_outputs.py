@@ -1,15 +1,60 @@
+import asyncio
+import json
 import os
+
+import numpy as np
+from aiohttp import ClientSession, WSMsgType
 from behave import *
+from behave.api.async_step import async_run_until_complete
 
+from eegstreamer.data import EEGData, EEGFrame
+from eegstreamer.encoders import decode_sample_block
+from eegstreamer.metrics import MetricsHttpEndpoint
 from eegstreamer.outputs import JSONFileOutputStreamer, ScreenEEGOutputStreamer, OscOutputStreamer, \
-    CSVFileOutputStreamer
+    CSVFileOutputStreamer, BinaryFileOutputStreamer, EEGOutputStreamer, HttpPostEEGOutputStreamer, \
+    WebsocketEEGOutputStreamer, WebsocketSubscriber
+
+
+class SampleCountingOutputStreamer(EEGOutputStreamer):
+    """an output written the old way, only ever expecting single samples"""
+
+    def __init__(self):
+        super().__init__()
+        self.samples = 0
+
+    def sample_count(self):
+        return self.samples
+
+    async def receive(self, data: EEGData) -> None:
+        assert isinstance(data, EEGData)
+        self.samples += 1
+
+    def close(self):
+        pass
+
+
+class SlowOutputStreamer(SampleCountingOutputStreamer):
+    """an output that takes far longer than the sample period to handle a sample"""
 
+    async def receive(self, data: EEGData) -> None:
+        await asyncio.sleep(0.2)
+        await super().receive(data)
 
-@given(r"the output (?P<file_type>json|csv) file has a name of (?P<filename>.+?)")
+
+class FailingOutputStreamer(SampleCountingOutputStreamer):
+    """an output that raises on every sample"""
+
+    async def receive(self, data: EEGData) -> None:
+        raise RuntimeError("the output is broken")
+
+
+@given(r"the output (?P<file_type>json|csv|binary) file has a name of (?P<filename>.+?)")
 def step_impl(context, file_type, filename):
     context.filename = os.path.join(context.tmp_path, filename)
     if file_type == 'json':
         context.output_stream = JSONFileOutputStreamer(context.filename)
+    elif file_type == 'binary':
+        context.output_stream = BinaryFileOutputStreamer(context.filename)
     else:
         context.output_stream = CSVFileOutputStreamer(context.filename)
     context.upstream.connect(context.output_stream)
@@ -30,3 +75,165 @@ def step_impl(context, address):
         }
     context.output_stream = OscOutputStreamer(**params)
     context.upstream.connect(context.output_stream)
+
+
+@given(r"the output is sent via OSC in bundles")
+def step_impl(context):
+    context.output_stream = OscOutputStreamer(bundle=True)
+    context.upstream.connect(context.output_stream)
+
+
+@given(r"the output is posted over http in batches of (?P<batch_size>\d+) samples")
+def step_impl(context, batch_size):
+    context.output_stream = HttpPostEEGOutputStreamer("http://127.0.0.1:8089/samples", batch_size=int(batch_size),
+                                                      backoff=0.05)
+    context.upstream.connect(context.output_stream)
+
+
+@given(r"the endpoint fails the first (?P<failure_count>\d+) requests")
+def step_impl(context, failure_count):
+    context.http_failures = int(failure_count)
+
+
+@given(r"the output is broadcast over a websocket")
+@async_run_until_complete
+async def step_impl(context):
+    context.output_stream = WebsocketEEGOutputStreamer(port=8766)
+    await context.output_stream.start()
+    context.upstream.connect(context.output_stream)
+    context.dashboards = {}
+
+    # the task sending to every client, to check none outlive the output
+    context.senders = []
+    add = context.output_stream._add
+
+    def add_and_record(subscriber):
+        add(subscriber)
+        context.senders.append(context.output_stream._senders[subscriber])
+
+    context.output_stream._add = add_and_record
+
+
+@given(r"a dashboard named (?P<name>\w+) subscribes(?: asking for (?P<query>.+))?")
+@async_run_until_complete
+async def step_impl(context, name, query):
+    session = ClientSession()
+    socket = await session.ws_connect(f"ws://127.0.0.1:8766/eeg?{query or ''}")
+    dashboard = {'samples': 0, 'channels': None}
+
+    async def listen():
+        async for message in socket:
+            if message.type == WSMsgType.TEXT:
+                dashboard['channels'] = json.loads(message.data)['channels']
+            elif message.type == WSMsgType.BINARY:
+                timestamps, samples, _ = decode_sample_block(message.data)
+                dashboard['samples'] += samples.shape[0]
+        await session.close()
+
+    dashboard['listener'] = asyncio.get_event_loop().create_task(listen())
+    context.dashboards[name] = dashboard
+
+
+class BrokenWebsocket:
+    """a client connection that has gone away without closing, every send fails"""
+
+    def __init__(self):
+        self.attempts = 0
+        self.closed = False
+
+    async def send_str(self, message: str) -> None:
+        self.attempts += 1
+        raise ConnectionResetError("Cannot write to closing transport")
+
+    async def send_bytes(self, message: bytes) -> None:
+        self.attempts += 1
+        raise ConnectionResetError("Cannot write to closing transport")
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+class StalledWebsocket(BrokenWebsocket):
+    """a client connection that has stopped reading, a send never finishes"""
+
+    async def send_str(self, message: str) -> None:
+        self.attempts += 1
+        await asyncio.Event().wait()
+
+    async def send_bytes(self, message: bytes) -> None:
+        self.attempts += 1
+        await asyncio.Event().wait()
+
+
+@given(r"a dashboard named (?P<name>\w+) subscribes over a connection that (?P<connection>fails to send|stalls)")
+@async_run_until_complete
+async def step_impl(context, name, connection):
+    subscriber = WebsocketSubscriber(BrokenWebsocket() if connection == 'fails to send' else StalledWebsocket())
+    context.output_stream._add(subscriber)
+    context.dashboards[name] = {'subscriber': subscriber}
+
+
+class FrameRecordingOutputStreamer(EEGOutputStreamer):
+    """an output keeping the timestamps of every frame, taking `delay` seconds for each"""
+
+    accepts_frames = True
+
+    def __init__(self, delay: float):
+        super().__init__()
+        self.delay = delay
+        self.timestamps = []
+
+    def sample_count(self):
+        return sum(len(timestamps) for timestamps in self.timestamps)
+
+    async def receive(self, data) -> None:
+        await asyncio.sleep(self.delay)
+        self.timestamps.append(data.timestamps if isinstance(data, EEGFrame) else np.array([data._timestamp]))
+
+    def close(self):
+        pass
+
+
+@given(r"the output takes (?P<delay>\d+) ms for every frame")
+def step_impl(context, delay):
+    context.output_stream = FrameRecordingOutputStreamer(int(delay) / 1000)
+    context.upstream.connect(context.output_stream)
+
+
+@given(r"the timestamps sent by the input are recorded")
+def step_impl(context):
+    context.input_recorder = FrameRecordingOutputStreamer(0)
+    context.start_stream.connect(context.input_recorder)
+
+
+@given(r"the output only accepts single samples")
+def step_impl(context):
+    context.output_stream = SampleCountingOutputStreamer()
+    context.upstream.connect(context.output_stream)
+
+
+@given(r"a slow output is connected through a queue of (?P<queue_size>\d+) samples that drops the (?P<policy>oldest|newest)")
+def step_impl(context, queue_size, policy):
+    context.slow_stream = SlowOutputStreamer()
+    context.upstream.connect(context.slow_stream, queue_size=int(queue_size), overflow=f"drop-{policy}")
+
+
+@given(r"an output that fails on every sample is connected")
+def step_impl(context):
+    context.failing_stream = FailingOutputStreamer()
+    context.upstream.connect(context.failing_stream)
+
+
+@given(r"the output (?P<file_type>json|csv) file named (?P<filename>.+?) is only flushed every (?P<interval>\d+) seconds")
+def step_impl(context, file_type, filename, interval):
+    context.filename = os.path.join(context.tmp_path, filename)
+    output_type = JSONFileOutputStreamer if file_type == 'json' else CSVFileOutputStreamer
+    context.output_stream = output_type(context.filename, flush_size=1 << 30, flush_interval=int(interval))
+    context.upstream.connect(context.output_stream)
+
+
+@given(r"the metrics are served over http")
+@async_run_until_complete
+async def step_impl(context):
+    context.metrics_endpoint = MetricsHttpEndpoint(port=9100)
+    await context.metrics_endpoint.start()
@@ -1,5 +1,6 @@
 from behave import *
-from eegstreamer.transforms import ConstantFactorEEGTransformer, DownSampleEEGTransformer, PowerCoherenceEEGTransformer
+from eegstreamer.transforms import ConstantFactorEEGTransformer, DownSampleEEGTransformer, PowerCoherenceEEGTransformer, \
+    StreamingFilterTransformer
 
 
 @given(r"the constant transformer is applied")
@@ -14,8 +15,33 @@ def step_impl(context):
     context.upstream.connect(transformer)
     context.upstream = transformer
 
+@given(r"the downsample transformer is applied at (?P<sample_rate>\d+)\s*HZ")
+def step_impl(context, sample_rate):
+    transformer = DownSampleEEGTransformer(sample_rate=int(sample_rate))
+    context.upstream.connect(transformer)
+    context.upstream = transformer
+
 @given(r"the PowerCoherence transformer is applied")
 def step_impl(context):
     transformer = PowerCoherenceEEGTransformer()
     context.upstream.connect(transformer)
     context.upstream = transformer
+
+@given(r"the incremental PowerCoherence transformer is applied every 1/(?P<hops>\d+) seconds")
+def step_impl(context, hops):
+    transformer = PowerCoherenceEEGTransformer(incremental=True, hop=1 / int(hops))
+    context.upstream.connect(transformer)
+    context.upstream = transformer
+
+@given(r"the streaming filter transformer is applied")
+def step_impl(context):
+    transformer = StreamingFilterTransformer(bandpass=(1, 40), notch=60)
+    context.upstream.connect(transformer)
+    context.upstream = transformer
+
+@given(r"the PowerCoherence transformer is applied in a (?P<executor>thread|process) pool")
+def step_impl(context, executor):
+    transformer = PowerCoherenceEEGTransformer(executor=executor)
+    context.upstream.connect(transformer)
+    context.upstream = transformer
+    context.transformer = transformer
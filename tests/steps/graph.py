@@ -0,0 +1,86 @@
+import json
+import os
+import subprocess
+import sys
+
+from behave import *
+from behave.api.async_step import async_run_until_complete
+from hamcrest import assert_that, equal_to, calling, raises, same_instance
+
+from eegstreamer.graph import Graph, GraphConfigError
+from eegstreamer.recording import BinaryRecording
+
+
+@given(r"a graph description")
+def step_impl(context):
+    context.graph_config = json.loads(context.text)
+    # file outputs write to the tmp directory of the run
+    for stage in context.graph_config['stages'].values():
+        params = stage.get('params', {})
+        if 'filename' in params:
+            params['filename'] = os.path.join(context.tmp_path, params['filename'])
+
+
+@when(r"the graph runs for (?P<duration>\d+) seconds")
+@async_run_until_complete
+async def step_impl(context, duration):
+    context.graph = Graph(context.graph_config)
+    await context.graph.run(int(duration))
+
+
+@when(r"eegstreamer run is given the graph with (?P<arguments>.+)")
+def step_impl(context, arguments):
+    graph_file = os.path.join(context.tmp_path, 'cli_graph.json')
+    with open(graph_file, 'w') as file:
+        json.dump(context.graph_config, file)
+    context.command = subprocess.run([sys.executable, '-m', 'eegstreamer.__cli__', 'run', graph_file,
+                                      *arguments.split()], capture_output=True, text=True)
+
+
+@then(r"the command exits with (?P<code>\d+)")
+def step_impl(context, code):
+    assert_that(context.command.returncode, equal_to(int(code)), context.command.stderr)
+
+
+@then(r"the file (?P<filename>\S+) has (?P<count>\d+) lines")
+def step_impl(context, filename, count):
+    with open(os.path.join(context.tmp_path, filename)) as file:
+        assert_that(len(file.readlines()), equal_to(int(count)))
+
+
+@then(r"the graph has (?P<count>\d+) stages")
+def step_impl(context, count):
+    assert_that(len(context.graph.nodes), equal_to(int(count)))
+
+
+@then(r"stage (?P<name>\w+) is shared with stage (?P<other>\w+)")
+def step_impl(context, name, other):
+    assert_that(context.graph.stage(name), same_instance(context.graph.stage(other)))
+
+
+@then(r"no stage has a queued output still running")
+def step_impl(context):
+    for node in context.graph.nodes:
+        for branch in getattr(node.stage, 'branches', ()):
+            assert_that(branch.task, equal_to(None), f"the task of a branch of {node.name}")
+
+
+@then(r"the graph output (?P<name>\w+) has written (?P<count>\d+) lines")
+def step_impl(context, name, count):
+    with open(context.graph.stage(name).filename) as file:
+        assert_that(len(file.readlines()), equal_to(int(count)))
+
+
+@then(r"the graph output (?P<name>\w+) has recorded (?P<count>\d+) samples at (?P<sample_rate>\d+) Hz")
+def step_impl(context, name, count, sample_rate):
+    recording = BinaryRecording(context.graph.stage(name).filename)
+    try:
+        assert_that(len(recording), equal_to(int(count)), "samples")
+        assert_that(recording.sample_rate, equal_to(int(sample_rate)), "sample rate")
+    finally:
+        recording.close()
+
+
+@then(r"the graph is refused because (?P<reason>.+)")
+def step_impl(context, reason):
+    assert_that(calling(Graph).with_args(context.graph_config), raises(GraphConfigError, reason))
@@ -0,0 +1,107 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+from behave import *
+from behave.api.async_step import async_run_until_complete
+from hamcrest import assert_that, equal_to, less_than
+
+from eegstreamer.data import EEGFrame
+from eegstreamer.inputs import BinaryFileInputStreamer
+from eegstreamer.offline import analyze_recording, read_recording
+from eegstreamer.outputs import BinaryFileOutputStreamer, CSVFileOutputStreamer, EEGOutputStreamer
+from eegstreamer.transforms import PowerCoherenceEEGTransformer
+
+SAMPLE_RATE = 256
+CHANNELS = ('TP9', 'AF7', 'AF8', 'TP10')
+
+
+class AnalysisCollector(EEGOutputStreamer):
+
+    def __init__(self):
+        super().__init__()
+        self.analyses = []
+
+    async def receive(self, data):
+        self.analyses.append(data)
+
+    def close(self):
+        pass
+
+
+@given(r"a (?P<duration>\d+) second (?P<format>csv|binary) recording of eeg data named (?P<filename>\S+)")
+@async_run_until_complete
+async def step_impl(context, duration, format, filename):
+    rng = np.random.default_rng(3)
+    t = np.arange(int(duration) * SAMPLE_RATE) / SAMPLE_RATE
+    samples = np.stack([20 * np.sin(2 * np.pi * f * t) + rng.normal(0, 10, t.shape) for f in (6, 10, 10.5, 22)], 1)
+    timestamps = 1_700_000_000_000_000_000 + (t * 1e9).astype(np.int64)
+
+    context.recording_file = os.path.join(context.tmp_path, filename)
+    output = CSVFileOutputStreamer if format == 'csv' else BinaryFileOutputStreamer
+    output = output(context.recording_file)
+    for start in range(0, t.shape[0], 64):
+        await output.receive(EEGFrame(samples[start:start + 64] + 800, CHANNELS, timestamps[start:start + 64],
+                                      SAMPLE_RATE))
+    await output.close()
+
+
+@when(r"the recording is analyzed offline(?P<streaming> with the streaming filter)?")
+def step_impl(context, streaming):
+    context.features = analyze_recording(read_recording(context.recording_file), streaming_filter=bool(streaming))
+
+
+@when(r"the recording is replayed through the PowerCoherence transformer(?P<streaming> with the streaming filter)?")
+@async_run_until_complete
+async def step_impl(context, streaming):
+    replay = BinaryFileInputStreamer(context.recording_file, speed=None)
+    transformer = PowerCoherenceEEGTransformer(SAMPLE_RATE, streaming_filter=bool(streaming))
+    context.collector = AnalysisCollector()
+    replay.connect(transformer)
+    transformer.connect(context.collector)
+    await replay.start()
+    await transformer.close()
+    await replay.close()
+
+
+@then(r"there are features for (?P<count>\d+) windows, one every (?P<hop>\d+) samples")
+def step_impl(context, count, hop):
+    recording = read_recording(context.recording_file)
+    assert_that(len(context.features), equal_to(int(count)))
+    # stamped with the newest sample of every window
+    ends = np.arange(5 * SAMPLE_RATE, len(recording.timestamps) + 1, int(hop))
+    assert_that(np.array_equal(context.features.index.to_numpy(), recording.timestamps[ends - 1]), equal_to(True))
+
+
+@then(r"the features match the transformer's once it has run for (?P<seconds>\d+) seconds")
+def step_impl(context, seconds):
+    streamed = pd.DataFrame([{key: value for key, value in analysis.items() if key != 'packet'}
+                             for analysis in context.collector.analyses],
+                            index=[analysis._timestamp for analysis in context.collector.analyses])
+    settled = context.features.index >= context.features.index[0] + int(seconds) * 1_000_000_000
+    offline = context.features[settled]
+    streamed = streamed.loc[offline.index, offline.columns]
+    for column in offline.columns:
+        if offline[column].dtype == object:
+            assert_that(list(offline[column]), equal_to(list(streamed[column])))
+        else:
+            error = np.abs(offline[column].to_numpy() - streamed[column].to_numpy().astype(np.float64))
+            assert_that(float(error.max()), less_than(1e-6))
+
+
+@when(r"eegstreamer analyze is run on the recording with an output of (?P<filename>\S+)")
+def step_impl(context, filename):
+    context.features_file = os.path.join(context.tmp_path, filename)
+    context.analyze = subprocess.run([sys.executable, '-m', 'eegstreamer.__cli__', 'analyze', context.recording_file,
+                                      '--output', context.features_file], capture_output=True, text=True)
+
+
+@then(r"the feature table has (?P<count>\d+) rows keyed by timestamp")
+def step_impl(context, count):
+    assert_that(context.analyze.returncode, equal_to(0))
+    table = pd.read_csv(context.features_file, index_col='timestamp')
+    assert_that(len(table), equal_to(int(count)))
+    assert_that('delta__power' in table.columns, equal_to(True))
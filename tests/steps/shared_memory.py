@@ -0,0 +1,152 @@
+import asyncio
+import os
+
+import numpy as np
+from behave import *
+from behave.api.async_step import async_run_until_complete
+from hamcrest import assert_that, equal_to, is_not
+
+from eegstreamer.data import EEGFrame
+from eegstreamer.inputs import SharedMemoryInputStreamer
+from eegstreamer.outputs import EEGOutputStreamer, SharedMemoryOutputStreamer
+
+CHANNELS = ('TP9', 'AF7', 'AF8', 'TP10')
+
+
+class FrameCollector(EEGOutputStreamer):
+
+    accepts_frames = True
+
+    def __init__(self):
+        super().__init__()
+        self.timestamps = []
+        self.samples = []
+        self.views = []
+
+    async def receive(self, data):
+        self.views.append(not data.samples.flags.owndata)
+        self.timestamps.append(data.timestamps.copy())
+        self.samples.append(data.samples.copy())
+
+    def close(self):
+        pass
+
+
+def _samples(start: int, count: int) -> tuple:
+    index = np.arange(start, start + count)
+    return 1_700_000_000_000_000_000 + index * 3_906_250, index[:, None] + np.arange(len(CHANNELS)) / 10
+
+
+def _block(start: int, count: int) -> EEGFrame:
+    timestamps, samples = _samples(start, count)
+    return EEGFrame(samples, CHANNELS, timestamps, 256)
+
+
+@given(r"a shared memory output writing a ring of (?P<capacity>\d+) samples")
+@async_run_until_complete
+async def step_impl(context, capacity):
+    context.ring_name = f"eegstreamer-test-{os.getpid()}"
+    context.writer = SharedMemoryOutputStreamer(context.ring_name, capacity=int(capacity))
+    # the ring is created by the first block
+    await context.writer.receive(_block(0, 12))
+    context.written = 12
+
+
+@given(r"(?P<count>\d+) shared memory readers? attached to it")
+@async_run_until_complete
+async def step_impl(context, count):
+    context.readers = []
+    context.collectors = []
+    for _ in range(int(count)):
+        reader = SharedMemoryInputStreamer(context.ring_name, poll_interval=0.001, attach_timeout=1)
+        collector = FrameCollector()
+        reader.connect(collector)
+        await reader.attach()
+        context.readers.append(reader)
+        context.collectors.append(collector)
+
+
+@given(r"1 copying shared memory reader attached to it, that the writer (?P<lap>laps|is lapping) on its first read")
+@async_run_until_complete
+async def step_impl(context, lap):
+    reader = SharedMemoryInputStreamer(context.ring_name, poll_interval=0.001, attach_timeout=1, copy=True)
+    collector = FrameCollector()
+    reader.connect(collector)
+    await reader.attach()
+    context.readers = [reader]
+    context.collectors = [collector]
+
+    ring = reader.ring
+    read = ring.read
+
+    def read_while_lapped(position, count):
+        # a whole ring is written between taking the views and copying them
+        ring.read = read
+        timestamps, samples = read(position, count)
+        ring.write(*_samples(context.written, ring.capacity))
+        if lap == 'is lapping':
+            # the slots are overwritten but the block is not published yet
+            ring._counters[1] = context.written
+        else:
+            context.written += ring.capacity
+        return timestamps, samples
+
+    ring.read = read_while_lapped
+
+
+@when(r"(?P<count>\d+) samples are written in blocks of (?P<block_size>\d+)")
+@async_run_until_complete
+async def step_impl(context, count, block_size):
+    context.first = context.written
+    context.written += int(count)
+
+    async def write():
+        for start in range(context.first, context.written, int(block_size)):
+            await context.writer.receive(_block(start, min(int(block_size), context.written - start)))
+            await asyncio.sleep(0.001)
+        await context.writer.close()
+
+    await asyncio.gather(write(), *(reader.start() for reader in context.readers))
+    for reader in context.readers:
+        await reader.close()
+
+
+@when(r"(?P<count>\d+) samples are written before the reader runs")
+@async_run_until_complete
+async def step_impl(context, count):
+    await context.writer.receive(_block(context.written, int(count)))
+    context.written += int(count)
+    await context.writer.close()
+    await context.readers[0].start()
+    await context.readers[0].close()
+
+
+@then(r"every reader receives every sample in order with its timestamp")
+def step_impl(context):
+    expected = _block(context.first, context.written - context.first)
+    for collector in context.collectors:
+        assert_that(np.array_equal(np.concatenate(collector.samples), expected.samples), equal_to(True))
+        assert_that(np.array_equal(np.concatenate(collector.timestamps), expected.timestamps), equal_to(True))
+
+
+@then(r"the frames the readers receive are views into the ring")
+def step_impl(context):
+    for collector in context.collectors:
+        assert_that(all(collector.views), equal_to(True))
+        assert_that(len(collector.views), is_not(equal_to(0)))
+
+
+@then(r"the reader receives the newest (?P<count>\d+) samples")
+def step_impl(context, count):
+    expected = _block(context.written - int(count), int(count))
+    assert_that(np.array_equal(np.concatenate(context.collectors[0].samples), expected.samples), equal_to(True))
+
+
+@then(r"the reader receives no samples")
+def step_impl(context):
+    assert_that(context.collectors[0].samples, equal_to([]))
+
+
+@then(r"the reader counts (?P<count>\d+) dropped samples")
+def step_impl(context, count):
+    assert_that(context.readers[0].dropped_samples, equal_to(int(count)))
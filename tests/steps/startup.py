@@ -0,0 +1,56 @@
+import json
+import subprocess
+import sys
+from importlib.metadata import entry_points
+
+from behave import *
+from hamcrest import assert_that, empty, less_than
+
+# prints the modules that were imported, -X importtime reports how long each one took on stderr
+# ( only for import statements, importlib.import_module isn't timed )
+_PROBE = '''
+import json, sys
+import {module}
+for name in {resolve!r}:
+    from eegstreamer import registry
+    registry.resolve(name)
+print(json.dumps(sorted(sys.modules)))
+'''
+
+
+def _probe(context):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                             _PROBE.format(module=context.module, resolve=context.resolved)],
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    context.modules = set(json.loads(result.stdout))
+    # import time: self [us] | cumulative [us] | package
+    for line in result.stderr.splitlines():
+        fields = [field.strip() for field in line.split('|')]
+        if len(fields) == 3 and fields[2] == context.module:
+            context.import_time = int(fields[1]) / 1e6
+
+
+@when(r"the module behind the (?P<script>\w+) script is imported in a fresh interpreter")
+def step_impl(context, script):
+    entry_point, = entry_points(group='console_scripts', name=script)
+    context.module = entry_point.module
+    context.resolved = []
+    _probe(context)
+
+
+@when(r"the stage (?P<name>\w+) is resolved by name")
+def step_impl(context, name):
+    context.resolved.append(name)
+    _probe(context)
+
+
+@then(r"it is imported in less than (?P<budget>\d+) ms")
+def step_impl(context, budget):
+    assert_that(context.import_time, less_than(int(budget) / 1000))
+
+
+@then(r"(?P<names>.+) have not been imported")
+def step_impl(context, names):
+    names = [name.strip() for name in names.replace(' and ', ', ').split(',')]
+    assert_that(sorted(name for name in names if name in context.modules), empty())
@@ -0,0 +1,92 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+from behave import *
+from behave.api.async_step import async_run_until_complete
+from hamcrest import assert_that, equal_to
+
+from eegstreamer.supervisor import Supervisor, FINISHED
+
+
+@given(r"(?P<count>\d+) simulated Muse devices named (?P<names>.+)")
+def step_impl(context, count, names):
+    context.devices = [{'name': name.strip(), 'type': 'FakeEEGDeviceInputStreamer',
+                        'params': {'device': 'muse', 'block_size': 12}}
+                       for name in names.replace(' and ', ',').split(',')]
+    assert_that(len(context.devices), equal_to(int(count)))
+
+
+@given(r"every device is recorded to its own csv file and sent via OSC on (?P<address>\S+)")
+def step_impl(context, address):
+    context.pipeline = {
+        'raw': {'type': 'CSVFileOutputStreamer', 'from': 'device',
+                'params': {'filename': os.path.join(context.tmp_path, 'supervised_{device}.csv')}},
+        # one datagram a sample, four devices of per channel messages overrun the test server
+        'osc': {'type': 'OscOutputStreamer', 'from': 'device',
+                'params': {'address': address, 'multi_channel': False}},
+    }
+
+
+@given(r"every device is recorded to its own csv file")
+def step_impl(context):
+    context.pipeline = {
+        'raw': {'type': 'CSVFileOutputStreamer', 'from': 'device',
+                'params': {'filename': os.path.join(context.tmp_path, 'supervised_{device}.csv')}},
+    }
+
+
+@when(r"the supervisor runs them in (?P<workers>\d+) worker processes for (?P<duration>\d+(?:\.\d+)?) seconds")
+@async_run_until_complete
+async def step_impl(context, workers, duration):
+    context.supervisor = Supervisor(context.devices, context.pipeline, workers=int(workers))
+    # the supervisor blocks, the OSC server of the scenario keeps running on this loop meanwhile
+    context.health = await asyncio.get_running_loop().run_in_executor(None, context.supervisor.run, float(duration))
+    await asyncio.sleep(0.1)
+
+
+@when(r"eegstreamer supervise is run on them with (?P<arguments>.+)")
+def step_impl(context, arguments):
+    config_file = os.path.join(context.tmp_path, 'supervise.json')
+    with open(config_file, 'w') as file:
+        json.dump({'devices': context.devices, 'pipeline': context.pipeline}, file)
+    context.command = subprocess.run([sys.executable, '-m', 'eegstreamer.__cli__', 'supervise', config_file,
+                                      *arguments.split()], capture_output=True, text=True)
+
+
+@then(r"the command reports every device finished")
+def step_impl(context):
+    assert_that(context.command.returncode, equal_to(0), context.command.stderr)
+    # the final report, a line per device after the blank line
+    report = context.command.stdout.rstrip().split('\n\n')[-1].splitlines()
+    assert_that(sorted(line.split()[:2] for line in report),
+                equal_to(sorted([device['name'], FINISHED] for device in context.devices)))
+
+
+@then(r"every device has finished with (?P<count>\d+) samples sent")
+def step_impl(context, count):
+    for device in context.devices:
+        health = context.health[device['name']]
+        assert_that(health['state'], equal_to(FINISHED), device['name'])
+        assert_that(health['samples'], equal_to(int(count)), device['name'])
+
+
+@then(r"the devices ran in (?P<workers>\d+) worker processes")
+def step_impl(context, workers):
+    assert_that(len({health['pid'] for health in context.health.values()}), equal_to(int(workers)))
+
+
+@then(r"the csv file of every device has (?P<count>\d+) lines")
+def step_impl(context, count):
+    for device in context.devices:
+        with open(os.path.join(context.tmp_path, f"supervised_{device['name']}.csv")) as file:
+            assert_that(len(file.readlines()), equal_to(int(count)), device['name'])
+
+
+@then(r"(?P<count>\d+) samples of every device are received via OSC on its own address")
+def step_impl(context, count):
+    for device in context.devices:
+        address = f"/{device['name']}/eeg"
+        assert_that(len(context.osc_address.get(address, [])), equal_to(int(count)), address)
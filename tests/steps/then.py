@@ -1,11 +1,22 @@
+import asyncio
+import csv
+import json
 import time
 from math import floor
 
+import numpy as np
+
+from aiohttp import ClientSession
 from behave import *
 from behave.api.async_step import async_run_until_complete
-from hamcrest import assert_that, equal_to, is_ as has_, has_key
+from hamcrest import assert_that, equal_to, is_ as has_, has_key, greater_than, less_than_or_equal_to, has_length, \
+    calling, raises
 
 from tests.matchers import channel_count_of, duration_of, has_address
+from eegstreamer import metrics
+from eegstreamer.__benchmark__ import compare
+from eegstreamer.recording import BinaryRecording
+from eegstreamer.transforms import PowerCoherenceEEGTransformer
 
 
 @then(r"(?P<sample_count>\d+) samples are received")
@@ -13,6 +24,34 @@ def step_impl(context, sample_count: str):
     assert_that(context.output_stream.sample_count(), equal_to(int(sample_count)), "samples")
 
 
+@then(r"the transformer has finished its analyses")
+@async_run_until_complete
+async def step_impl(context):
+    await context.transformer.close()
+    assert_that(context.transformer.dropped_windows, equal_to(0), "dropped windows")
+
+
+@then(r"the PowerCoherence transformer can't be made with the executor (?P<executor>\w+)")
+def step_impl(context, executor):
+    assert_that(calling(PowerCoherenceEEGTransformer).with_args(executor=executor),
+                raises(ValueError, f"unknown executor '{executor}'"))
+
+
+@then(r"the slow output has dropped samples")
+def step_impl(context):
+    branch = context.start_stream.branches[context.start_stream.outputs.index(context.slow_stream)]
+    context.start_stream.cancel_branches()
+    assert_that(branch.dropped, greater_than(0), "dropped samples")
+    assert_that(branch.dropped + branch.delivered + branch.depth, less_than_or_equal_to(40), "samples")
+
+
+@then(r"the failing output has (?P<count>\d+) errors")
+def step_impl(context, count):
+    branch = context.start_stream.branches[context.start_stream.outputs.index(context.failing_stream)]
+    assert_that(branch.errors, equal_to(int(count)), "errors")
+    assert_that(branch.delivered, equal_to(0), "delivered")
+
+
 @then(r"the file has (?P<line_count>\d+) lines")
 @async_run_until_complete
 async def step_impl(context, line_count):
@@ -27,6 +66,8 @@ async def step_impl(context, line_count):
 @then(r"(?P<sample_count>\d+) samples are received via OSC(?: on (?P<address>.+?) address)?")
 @async_run_until_complete
 async def step_impl(context, sample_count, address):
+    # let the server read whatever datagrams are still waiting on its socket
+    await asyncio.sleep(0.1)
     if address:
         assert_that(context.osc_address, has_address(address))
         assert_that(len(context.osc_address[address]), equal_to(int(sample_count)))
@@ -58,3 +99,165 @@ async def step_impl(context, run_time, units):
 
     actual = (time.time_ns() - context.start_time) / correction
     assert_that(floor(actual), has_(duration_of(int(run_time))))
+
+
+@then(r"the recording has (?P<sample_count>\d+) samples of (?P<channel_count>\d+) channels")
+@async_run_until_complete
+async def step_impl(context, sample_count, channel_count):
+    await context.output_stream.close()
+    recording = BinaryRecording(context.filename)
+    assert_that(len(recording), equal_to(int(sample_count)))
+    assert_that(len(recording.channels), equal_to(int(channel_count)))
+
+
+@then(r"the csv header is (?P<columns>.+)")
+def step_impl(context, columns):
+    with open(context.filename) as file:
+        header = next(csv.reader(file))
+    assert_that(header, equal_to([column.strip() for column in columns.split(",")]))
+
+
+@then(r"at most (?P<datagram_count>\d+) datagrams were sent")
+@async_run_until_complete
+async def step_impl(context, datagram_count):
+    assert_that(context.output_stream.datagrams_sent, less_than_or_equal_to(int(datagram_count)))
+
+
+@then(r"(?P<sample_count>\d+) samples are posted to the endpoint in at most (?P<request_count>\d+) requests")
+@async_run_until_complete
+async def step_impl(context, sample_count, request_count):
+    await context.output_stream.close()
+    assert_that(len(context.http_samples), equal_to(int(sample_count)))
+    assert_that(context.http_requests, less_than_or_equal_to(int(request_count)))
+
+
+@then(r"dashboard (?P<name>\w+) is closed and dropped after its first message fails")
+def step_impl(context, name):
+    subscriber = context.dashboards[name]['subscriber']
+    assert_that(subscriber.socket.attempts, equal_to(1), "send attempts")
+    assert_that(subscriber.socket.closed, equal_to(True), "socket closed")
+    assert_that(subscriber.stats()['closed'], equal_to(True), "subscriber closed")
+    assert_that(subscriber in context.output_stream.subscribers, equal_to(False), "still subscribed")
+
+
+@then(r"the websocket output has no senders left running")
+def step_impl(context):
+    assert_that(context.output_stream._senders, equal_to({}))
+    assert_that(all(subscriber_task.done() for subscriber_task in context.senders), equal_to(True))
+
+
+@then(r"dashboard (?P<name>\w+) has received (?P<sample_count>\d+) samples of (?P<channels>.+)")
+@async_run_until_complete
+async def step_impl(context, name, sample_count, channels):
+    await context.output_stream.close()
+    dashboard = context.dashboards[name]
+    await dashboard['listener']
+    assert_that(dashboard['samples'], equal_to(int(sample_count)))
+    assert_that(dashboard['channels'], equal_to([channel.strip() for channel in channels.split(",")]))
+
+
+@then(r"the metrics count (?P<sample_count>\d+) samples through every stage")
+def step_impl(context, sample_count):
+    sample_count = int(sample_count)
+    stage = context.start_stream
+    assert_that(metrics.stage_metrics(stage).samples_out.total, equal_to(sample_count), "input")
+    while getattr(stage, "outputs", None):
+        stage = stage.outputs[0]
+        stage_metrics = metrics.stage_metrics(stage)
+        assert_that(stage_metrics.samples_in.total, equal_to(sample_count), stage_metrics.name)
+        assert_that(stage_metrics.processing.count, greater_than(0), stage_metrics.name)
+        if hasattr(stage, 'outputs'):
+            assert_that(stage_metrics.samples_out.total, equal_to(sample_count), stage_metrics.name)
+
+
+@then(r"the latency of the output has been measured")
+def step_impl(context):
+    latency = metrics.stage_metrics(context.output_stream).latency
+    assert_that(latency.count, greater_than(0))
+    assert_that(latency.percentile(99), less_than_or_equal_to(1.0))
+
+
+@then(r"the metrics endpoint reports the analysis time of the transformer")
+@async_run_until_complete
+async def step_impl(context):
+    transformer = context.start_stream.outputs[0]
+    async with ClientSession() as session:
+        async with session.get("http://127.0.0.1:9100/metrics") as response:
+            snapshot = await response.json()
+    await context.metrics_endpoint.close()
+    stage = snapshot['stages'][metrics.stage_metrics(transformer).name]
+    assert_that(stage['analysis']['count'], equal_to(transformer.num_analyses))
+    assert_that(stage['branches'][0]['delivered'], equal_to(transformer.num_analyses))
+
+
+@then(r"the benchmarks show no regression against themselves")
+def step_impl(context):
+    assert_that(context.benchmark['results'], has_length(greater_than(0)))
+    assert_that(compare(context.benchmark, context.benchmark), equal_to([]))
+
+
+@then(r"every benchmark is a regression against a baseline twice as fast")
+def step_impl(context):
+    baseline = json.loads(json.dumps(context.benchmark))
+    for result in baseline['results'].values():
+        result['value'] = result['value'] / 2 if result['better'] == 'lower' else result['value'] * 2
+    assert_that(compare(context.benchmark, baseline), has_length(len(baseline['results'])))
+
+
+@then(r"every bluetooth block reaches the output with its device timestamps")
+def step_impl(context):
+    radio = context.radio
+    timestamps = np.concatenate(context.output_stream.timestamps)
+    expected = ((radio.first_timestamp + np.arange(radio.block_count * 12) / 256) * 1e9).astype(np.int64)
+    assert_that(context.start_stream.dropped_blocks, equal_to(0), "dropped blocks")
+    assert_that(len(timestamps), equal_to(len(expected)), "samples")
+    assert_that(int(np.abs(timestamps - expected).max()), less_than_or_equal_to(1000), "timestamp error in ns")
+
+
+@then(r"the bluetooth thread never waited on the pipeline")
+def step_impl(context):
+    # a frame takes the output at least 5 ms, handing a block over takes microseconds
+    assert_that(max(context.radio.callback_durations), less_than_or_equal_to(0.004), "longest callback")
+
+
+@then(r"the blocks that reached the output and the dropped blocks add up to (?P<block_count>\d+)")
+def step_impl(context, block_count):
+    stream = context.start_stream
+    assert_that(stream.dropped_blocks, greater_than(0), "dropped blocks")
+    assert_that(context.output_stream.sample_count() // 12 + stream.dropped_blocks, equal_to(int(block_count)))
+
+
+@then(r"every analysis is stamped with the time of the newest sample in its window")
+def step_impl(context):
+    sent = np.concatenate(context.input_recorder.timestamps)
+    analyses = np.concatenate(context.output_stream.timestamps)
+    hop = context.upstream.short_buffer_size
+    assert_that(len(analyses), equal_to(len(sent) // hop), "analyses")
+    assert_that(analyses.tolist(), equal_to(sent[hop - 1::hop].tolist()))
+
+
+@then(r"the file has the timestamps of the recording from (?P<start>\d+) seconds? in")
+@async_run_until_complete
+async def step_impl(context, start):
+    await context.output_stream.close()
+    recording = context.start_stream.recording
+    expected = (recording.timestamps[int(start) * int(recording.sample_rate):] // 1000000).tolist()
+    with open(context.filename) as file:
+        timestamps = [json.loads(line)['timestamp'] for line in file]
+    assert_that(timestamps, equal_to(expected))
+
+
+@then(r"the input sends every sample with its timestamp in nanoseconds")
+def step_impl(context):
+    timestamps = np.concatenate(context.input_recorder.timestamps)
+    assert_that(timestamps.tolist(), equal_to((context.timestamps * 1_000_000).tolist()), "timestamps")
+
+
+@then(r"every sample is read with its timestamp")
+def step_impl(context):
+    timestamps = np.concatenate([timestamps for timestamps, _ in context.chunks])
+    samples = np.concatenate([samples for _, samples in context.chunks])
+    # millisecond timestamps scaled to nanoseconds, through a float
+    error = np.abs(timestamps - context.timestamps * 1_000_000)
+    assert_that(int(error.max()), less_than_or_equal_to(1000), "timestamps")
+    assert_that(np.allclose(samples, context.samples, rtol=1e-15), equal_to(True), "samples")
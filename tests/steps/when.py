@@ -1,11 +1,30 @@
 import time
 
+from eegstreamer import DataStreamInterrupted
+from eegstreamer.inputs import JSONFileInputStreamer
+
 from behave import *
 from behave.api.async_step import async_run_until_complete
 
 
-@when(r"the stream runs for (?P<duration>\d+)\s*seconds")
+@when(r"the stream runs for (?P<duration>\d+(?:\.\d+)?)\s*seconds")
 @async_run_until_complete
 async def step_impl(context, duration):
     context.start_time = time.time_ns()
-    await context.start_stream.start(duration=int(duration))
+    await context.start_stream.start(duration=float(duration))
+
+
+@when(r"the Muse stream runs until the radio goes quiet")
+@async_run_until_complete
+async def step_impl(context):
+    try:
+        await context.start_stream.start()
+    except DataStreamInterrupted:
+        pass
+
+
+@when(r"the recording is read in chunks of (?P<chunk_size>\d+) lines")
+def step_impl(context, chunk_size):
+    replay = JSONFileInputStreamer(context.filename, speed=None, chunk_size=int(chunk_size))
+    context.chunks = list(replay.read_chunks())
+    replay.file_handle.close()